@@ -0,0 +1,53 @@
+"""Benchmark: per-station geopy.geodesic loop vs the batched distance engine.
+
+    python benchmarks/bench_distance.py [--sizes 1000 10000 100000]
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+from geopy.distance import geodesic
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from pso_common.distance import distances_km
+
+CENTER = (31.5204, 74.3587)  # Lahore
+RADIUS_KM = 50
+
+def random_points(n, seed=0):
+    """Points scattered over a box slightly larger than the search circle."""
+    rng = np.random.default_rng(seed)
+    lats = CENTER[0] + rng.uniform(-0.6, 0.6, n)
+    lons = CENTER[1] + rng.uniform(-0.7, 0.7, n)
+    return lats, lons
+
+def time_geodesic_loop(lats, lons):
+    start = time.perf_counter()
+    inside = sum(
+        1 for lat, lon in zip(lats, lons)
+        if geodesic(CENTER, (lat, lon)).kilometers <= RADIUS_KM
+    )
+    return time.perf_counter() - start, inside
+
+def time_batched(lats, lons):
+    start = time.perf_counter()
+    inside = int((distances_km(CENTER[0], CENTER[1], lats, lons, radius_km=RADIUS_KM) <= RADIUS_KM).sum())
+    return time.perf_counter() - start, inside
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    args = parser.parse_args(argv)
+
+    print(f"{'points':>8} {'geodesic loop':>14} {'batched':>10} {'speedup':>8}  in-radius")
+    for n in args.sizes:
+        lats, lons = random_points(n)
+        loop_s, loop_in = time_geodesic_loop(lats, lons)
+        batch_s, batch_in = time_batched(lats, lons)
+        match = "same" if loop_in == batch_in else f"MISMATCH {loop_in} vs {batch_in}"
+        print(f"{n:>8} {loop_s * 1000:>12.1f}ms {batch_s * 1000:>8.2f}ms {loop_s / batch_s:>7.0f}x  {match}")
+
+if __name__ == "__main__":
+    main()
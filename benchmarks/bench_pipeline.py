@@ -0,0 +1,410 @@
+"""Benchmark: every stage of the station pipeline, with regression thresholds.
+
+    python benchmarks/bench_pipeline.py run             # compare with the baseline; exit 1 on regression
+    python benchmarks/bench_pipeline.py run --save      # time all stages, store them as the baseline
+    python benchmarks/bench_pipeline.py record          # save Overpass fixtures (from OVERPASS_MIRRORS)
+    python benchmarks/bench_pipeline.py extract FILE    # write the offline extract the fixtures come from
+
+Recorded responses for a small and medium radius are committed in
+benchmarks/fixtures/ with a baseline in benchmarks/baselines.json; the huge
+radius is recorded locally (`record --cases huge`) and skipped when absent.
+A synthetic 100k-station dataset needs no fixture. Each stage is timed on its
+own (best of --repeat runs) and its peak traced memory measured in a separate
+run. `run` exits 2 when a committed fixture or the baseline is missing, so the
+gate cannot pass without comparing anything.
+"""
+import argparse
+import gzip
+import io
+import json
+import platform
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+import folium
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from pso_common.dedupe import merge_duplicates
+from pso_common.fuel_stations import build_fuel_query, locate_elements, parse_station, search_bbox, within_radius
+from pso_common.land_use import landuse_areas
+from pso_common.logos import load_logo_pack
+from pso_common.map_layers import CLUSTER_THRESHOLD, add_filterable_stations, add_station_list
+from pso_common.overpass_stream import iter_elements
+from pso_common.station_table import StationTable
+from pso_common.suitability import landuse_bbox_query
+
+FIXTURES_DIR = Path(__file__).resolve().parent / "fixtures"
+BASELINE_PATH = Path(__file__).resolve().parent / "baselines.json"
+
+# Recorded cases: (lat, lon, radius km)
+FIXTURE_CASES = {
+    "small": (31.5204, 74.3587, 2),     # Lahore
+    "medium": (31.5204, 74.3587, 10),   # Lahore
+    "huge": (24.8607, 67.0011, 50),     # Karachi
+}
+# Cases whose fixtures are committed; the others are too large and run only when recorded locally
+COMMITTED_CASES = ("small", "medium")
+
+# Offline extract the committed fixtures are recorded from (see `extract`)
+EXTRACT_CENTER = (31.5204, 74.3587, 12)
+EXTRACT_STATIONS = 450
+EXTRACT_POLYGONS = 3_000
+EXTRACT_RELATIONS = 40
+SYNTHETIC_CASE = "synthetic_100k"
+SYNTHETIC_CENTER = (31.5204, 74.3587, 60)
+SYNTHETIC_STATIONS = 100_000
+SYNTHETIC_POLYGONS = 5_000
+
+# Default allowed slowdown (percent) and the absolute noise floor below which it is ignored
+DEFAULT_THRESHOLD = 20.0
+NOISE_FLOOR_S = 0.005
+NOISE_FLOOR_MB = 1.0
+
+# Extra timed runs for a stage that looks slower than its baseline, before it counts as a regression
+DEFAULT_CONFIRM = 5
+
+def fixture_path(case, layer):
+    return FIXTURES_DIR / f"{case}_{layer}.json.gz"
+
+# -----------------------------
+# Fixtures
+# -----------------------------
+
+def record(args):
+    from pso_common.overpass_client import get_client
+
+    FIXTURES_DIR.mkdir(parents=True, exist_ok=True)
+    for case, (lat, lon, radius_km) in FIXTURE_CASES.items():
+        if args.cases and case not in args.cases:
+            continue
+        bbox = search_bbox(lat, lon, radius_km)
+        for layer, query in (("fuel", build_fuel_query([bbox])), ("landuse", landuse_bbox_query(*bbox))):
+            start = time.perf_counter()
+            body = get_client().fetch(query)
+            fixture_path(case, layer).write_bytes(gzip.compress(body, mtime=0))
+            print(f"{case:>8} {layer:<8} {len(body) / 1e6:6.1f} MB in {time.perf_counter() - start:.1f}s")
+
+def extract(args):
+    """Write an Overpass JSON extract of OSM-shaped fuel stations and land use around Lahore.
+
+    Serve it with `python -m pso_common.overpass_server --extract FILE` and point
+    `record` at the stand-in to regenerate the committed fixtures offline.
+    """
+    rng = np.random.default_rng(args.seed)
+    lat0, lon0, radius_km = EXTRACT_CENTER
+    m_lat = 111_320.0
+    m_lon = m_lat * np.cos(np.radians(lat0))
+    ids = iter(range(1, 10**9))
+    elements = []
+
+    def point():
+        return (lat0 + rng.uniform(-1, 1) * radius_km * 1000 / m_lat,
+                lon0 + rng.uniform(-1, 1) * radius_km * 1000 / m_lon)
+
+    def ring(lat, lon, size_m, vertices):
+        """Closed, roughly circular ring of `vertices` points."""
+        angles = np.sort(rng.uniform(0, 2 * np.pi, vertices))
+        radii = size_m * rng.uniform(0.6, 1.0, vertices)
+        coords = [{"lat": round(lat + r * np.sin(a) / m_lat, 7), "lon": round(lon + r * np.cos(a) / m_lon, 7)}
+                  for a, r in zip(angles, radii)]
+        return coords + coords[:1]
+
+    def way(tags, geometry):
+        nodes = [next(ids) for _ in geometry[:-1]]
+        return {"type": "way", "id": next(ids), "nodes": nodes + nodes[:1], "geometry": geometry, "tags": tags}
+
+    brands = ["PSO", "Shell", "Total Parco", "Attock", "GO", "Hascol", "Byco", ""]
+    urdu = {"PSO": "پی ایس او", "Shell": "شیل", "Attock": "اٹک"}
+    areas = ["Model Town", "Gulberg", "Johar Town", "DHA", "Township", "Shadman", "Iqbal Town", "Ferozepur Road"]
+    for i in range(EXTRACT_STATIONS):
+        lat, lon = point()
+        brand = brands[i % len(brands)]
+        area = areas[int(rng.integers(len(areas)))]
+        tags = {"amenity": "fuel" if i % 25 else "gas_station"}
+        if brand:
+            tags["brand"] = brand
+        if i % 9 == 0 and brand in urdu:
+            tags.update({"name": f"{urdu[brand]} پیٹرول پمپ", "name:en": f"{brand} {area}"})
+        elif i % 13:
+            tags["name"] = f"{brand or 'Al Madina'} Petrol Pump {area}"
+        if i % 2:
+            tags["addr:street"] = f"{area} Main Boulevard"
+        for fuel, every in (("fuel:diesel", 2), ("fuel:octane_95", 3), ("fuel:cng", 5), ("fuel:lpg", 11)):
+            if i % every == 0:
+                tags[fuel] = "yes"
+        if i % 4 == 0:
+            tags["phone"] = f"+92 42 {3500_0000 + i}"
+        if i % 6 == 0:
+            tags["opening_hours"] = "24/7"
+        if i % 3 == 0:
+            elements.append(way(tags, ring(lat, lon, rng.uniform(15, 40), 5)))
+            if i % 12 == 0:
+                # Also mapped as a pump node on the forecourt
+                elements.append({"type": "node", "id": next(ids), "lat": lat + 0.0001, "lon": lon, "tags": tags})
+        else:
+            elements.append({"type": "node", "id": next(ids), "lat": lat, "lon": lon, "tags": tags})
+
+    classes = ["residential"] * 5 + ["commercial", "retail", "industrial", "farmland", "farmland",
+                                     "grass", "cemetery", "recreation_ground", "construction"]
+    for i in range(EXTRACT_POLYGONS):
+        lat, lon = point()
+        landuse = classes[int(rng.integers(len(classes)))]
+        size = rng.uniform(200, 700) if landuse in ("residential", "farmland") else rng.uniform(40, 250)
+        elements.append(way({"landuse": landuse}, ring(lat, lon, size, int(rng.integers(6, 25)))))
+    for i in range(EXTRACT_RELATIONS):
+        lat, lon = point()
+        members = []
+        for _ in range(int(rng.integers(2, 5))):
+            part = ring(lat + rng.uniform(-1, 1) * 800 / m_lat, lon + rng.uniform(-1, 1) * 800 / m_lon,
+                        rng.uniform(150, 500), int(rng.integers(8, 20)))
+            members.append({"type": "way", "ref": next(ids), "role": "outer", "geometry": part})
+        elements.append({"type": "relation", "id": next(ids), "members": members,
+                         "tags": {"type": "multipolygon", "landuse": classes[i % len(classes)]}})
+
+    body = json.dumps({"version": 0.6, "generator": "bench_pipeline.py extract", "elements": elements})
+    with gzip.open(args.path, "wt", encoding="utf-8") as f:
+        f.write(body)
+    print(f"Wrote {len(elements)} elements to {args.path}")
+
+def synthetic_fuel(n=SYNTHETIC_STATIONS, seed=0):
+    """Overpass-shaped fuel response with ~10% node/way duplicate pairs."""
+    rng = np.random.default_rng(seed)
+    lat0, lon0, radius_km = SYNTHETIC_CENTER
+    lats = lat0 + rng.uniform(-1, 1, n) * radius_km / 111.0
+    lons = lon0 + rng.uniform(-1, 1, n) * radius_km / (111.0 * np.cos(np.radians(lat0)))
+    brands = ["PSO", "Shell", "Total Parco", "Attock", "GO", "Hascol", ""]
+    elements = []
+    for i in range(n):
+        brand = brands[i % len(brands)]
+        tags = {"amenity": "fuel", "name": f"{brand or 'Station'} {i % 977}", "addr:street": f"Road {i % 313}"}
+        if brand:
+            tags["brand"] = brand
+        if i % 3 == 0:
+            tags["fuel:diesel"] = "yes"
+        elements.append({"type": "node", "id": i, "lat": float(lats[i]), "lon": float(lons[i]), "tags": tags})
+        if i % 10 == 0:
+            # Same station mapped as a building outline a few metres away
+            center = {"lat": float(lats[i]) + 0.0002, "lon": float(lons[i]) - 0.0001}
+            elements.append({"type": "way", "id": n + i, "center": center, "tags": dict(tags, phone="042")})
+    return json.dumps({"elements": elements}).encode("utf-8")
+
+def synthetic_landuse(n=SYNTHETIC_POLYGONS, seed=0):
+    """Overpass-shaped landuse response of square polygons around the synthetic center."""
+    rng = np.random.default_rng(seed)
+    lat0, lon0, radius_km = SYNTHETIC_CENTER
+    classes = ["residential", "commercial", "industrial", "retail", "farmland"]
+    elements = []
+    for i in range(n):
+        lat = lat0 + rng.uniform(-1, 1) * radius_km / 111.0
+        lon = lon0 + rng.uniform(-1, 1) * radius_km / 95.0
+        size = rng.uniform(0.001, 0.01)
+        ring = [(lat, lon), (lat, lon + size), (lat + size, lon + size), (lat + size, lon), (lat, lon)]
+        elements.append({"type": "way", "id": i, "tags": {"landuse": classes[i % len(classes)]},
+                         "geometry": [{"lat": a, "lon": b} for a, b in ring]})
+    return json.dumps({"elements": elements}).encode("utf-8")
+
+def load_cases(synthetic_only=False):
+    """({case: (lat, lon, radius km, fuel body, landuse body or None)}, [committed cases without a fixture])."""
+    cases, missing = {}, []
+    for case, (lat, lon, radius_km) in ({} if synthetic_only else FIXTURE_CASES).items():
+        fuel = fixture_path(case, "fuel")
+        if not fuel.exists():
+            if case in COMMITTED_CASES:
+                missing.append(case)
+            continue
+        landuse = fixture_path(case, "landuse")
+        cases[case] = (lat, lon, radius_km, gzip.decompress(fuel.read_bytes()),
+                       gzip.decompress(landuse.read_bytes()) if landuse.exists() else None)
+    lat, lon, radius_km = SYNTHETIC_CENTER
+    cases[SYNTHETIC_CASE] = (lat, lon, radius_km, synthetic_fuel(), synthetic_landuse())
+    return cases, missing
+
+# -----------------------------
+# Stages
+# -----------------------------
+
+def build_stages(lat, lon, radius_km, fuel_body, landuse_body):
+    """[(name, fn)] where each fn takes the previous stage's output."""
+    def parse(_):
+        return list(iter_elements(io.BytesIO(fuel_body)))
+
+    def distance(elements):
+        return list(within_radius(locate_elements(elements), lat, lon, radius_km))
+
+    def normalize(located):
+        records = (parse_station(tags, a, b, d) for tags, a, b, d in located)
+        return [r for r in records if r]
+
+    def dedupe(records):
+        return merge_duplicates(records)
+
+    def filter_sort(records):
+        table = StationTable.from_records(records)
+        top = next(iter(table.brand_counts()), None)  # Most common brand
+        return table.filter(brand=top, max_distance=radius_km / 2).sort("name")
+
+    def build_map(table):
+        # Same layers as the fuel finder's render_station_map
+        m = folium.Map(location=[lat, lon], zoom_start=12)
+        layer = add_filterable_stations(m, table.to_records(), load_logo_pack(), float(radius_km),
+                                        cluster=len(table) > CLUSTER_THRESHOLD)
+        add_station_list(m, layer, height=420)
+        return len(m.get_root().render())
+
+    stages = [("parse", parse), ("distance", distance), ("normalize", normalize),
+              ("dedupe", dedupe), ("filter", filter_sort), ("map", build_map)]
+    if landuse_body is not None:
+        def land_use(_):
+            elements = list(iter_elements(io.BytesIO(landuse_body)))
+            return landuse_areas(elements, lat, lon, radius_km * 1000)
+        stages.append(("land_use", land_use))
+    return stages
+
+def best_time(fn, data, repeat):
+    """(best seconds over `repeat` runs, last output)."""
+    best = float("inf")
+    output = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        output = fn(data)
+        best = min(best, time.perf_counter() - start)
+    return best, output
+
+def measure(fn, data, repeat):
+    """(best seconds, peak traced MB, output) for one stage."""
+    best, output = best_time(fn, data, repeat)
+    tracemalloc.start()
+    fn(data)
+    peak = tracemalloc.get_traced_memory()[1] / 1e6
+    tracemalloc.stop()
+    return best, peak, output
+
+def calibrate(repeat=5):
+    """Best time of a fixed JSON and NumPy workload, used to scale a baseline taken on another machine."""
+    payload = json.dumps([{"id": i, "lat": i * 1e-4, "tags": {"name": f"Station {i}"}} for i in range(20_000)])
+    values = np.random.default_rng(0).random(500_000)
+
+    def workload(_):
+        json.loads(payload)
+        np.sort(values)
+
+    return best_time(workload, None, repeat)[0]
+
+# -----------------------------
+# Run and compare
+# -----------------------------
+
+def too_slow(seconds, base_seconds, threshold):
+    return seconds > base_seconds * (1 + threshold / 100) and seconds - base_seconds > NOISE_FLOOR_S
+
+def compare(current, baseline, threshold):
+    """List of regression messages against a baseline (seconds already scaled to this machine)."""
+    regressions = []
+    for case, stages in current.items():
+        for stage, result in stages.items():
+            base = baseline.get(case, {}).get(stage)
+            if base is None:
+                continue
+            limit = 1 + threshold / 100
+            if too_slow(result["seconds"], base["seconds"], threshold):
+                regressions.append(f"{case}/{stage}: {result['seconds'] * 1000:.1f} ms vs "
+                                   f"{base['seconds'] * 1000:.1f} ms baseline")
+            if result["peak_mb"] > base["peak_mb"] * limit and result["peak_mb"] - base["peak_mb"] > NOISE_FLOOR_MB:
+                regressions.append(f"{case}/{stage}: {result['peak_mb']:.1f} MB vs "
+                                   f"{base['peak_mb']:.1f} MB baseline")
+    return regressions
+
+def run(args):
+    calibration = calibrate()
+    baseline = {}
+    if args.baseline.exists():
+        saved = json.loads(args.baseline.read_text(encoding="utf-8"))
+        # Baseline times scaled up when this machine runs the calibration workload slower; never
+        # tightened, since the calibration is itself noisy and a gate must not fail on noise
+        scale = max(1.0, calibration / saved["calibration_s"]) if saved.get("calibration_s") else 1.0
+        baseline = {case: {stage: dict(result, seconds=result["seconds"] * scale) for stage, result in stages.items()}
+                    for case, stages in saved["results"].items()}
+        print(f"Baseline from {saved.get('machine', '?')} / Python {saved.get('python', '?')}, "
+              f"times scaled x{scale:.2f} for this machine")
+
+    cases, missing = load_cases(args.synthetic_only)
+    missing = [case for case in missing if not args.cases or case in args.cases]
+    for case in missing:
+        print(f"MISSING FIXTURE {case}: {fixture_path(case, 'fuel')} (run `record`, or pass --synthetic-only)")
+    results = {}
+    print(f"{'case':<16} {'stage':<10} {'time':>10} {'peak':>9} {'vs baseline':>12}")
+    for case, (lat, lon, radius_km, fuel_body, landuse_body) in cases.items():
+        if args.cases and case not in args.cases:
+            continue
+        results[case] = {}
+        data = None
+        for stage, fn in build_stages(lat, lon, radius_km, fuel_body, landuse_body):
+            seconds, peak_mb, output = measure(fn, data, args.repeat)
+            base = baseline.get(case, {}).get(stage)
+            if base and not args.save and too_slow(seconds, base["seconds"], args.threshold):
+                # Confirm with more runs, corrected for any change in machine speed since calibrating;
+                # the best time only drops, so a real slowdown stays
+                confirmed = best_time(fn, data, args.confirm)[0]
+                seconds = min(seconds, confirmed * min(1.0, calibration / calibrate()))
+            results[case][stage] = {"seconds": round(seconds, 6), "peak_mb": round(peak_mb, 2)}
+            change = f"{(seconds / base['seconds'] - 1) * 100:+.0f}%" if base and base["seconds"] else ""
+            print(f"{case:<16} {stage:<10} {seconds * 1000:>8.1f}ms {peak_mb:>7.1f}MB {change:>12}")
+            if stage != "land_use":
+                data = output
+
+    if args.save:
+        args.baseline.write_text(json.dumps({
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "calibration_s": round(calibration, 6),
+            "results": results,
+        }, indent=2) + "\n", encoding="utf-8")
+        print(f"Saved baseline to {args.baseline}")
+        return 0
+
+    regressions = compare(results, baseline, args.threshold)
+    for message in regressions:
+        print(f"REGRESSION {message}")
+    unchecked = [case for case in results if case not in baseline]
+    if not baseline:
+        print(f"NO BASELINE at {args.baseline}; run with --save to record one")
+    elif unchecked:
+        print(f"NO BASELINE for {', '.join(unchecked)}; run with --save to record them")
+    if regressions:
+        return 1
+    return 2 if missing or unchecked else 0
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    rec = commands.add_parser("record", help="Save Overpass responses for the fixture cases")
+    rec.add_argument("--cases", nargs="+", help="Only record these cases")
+    rec.set_defaults(func=record)
+
+    ext = commands.add_parser("extract", help="Write the offline extract the committed fixtures are recorded from")
+    ext.add_argument("path", type=Path, help="Output file (.json.gz)")
+    ext.add_argument("--seed", type=int, default=0)
+    ext.set_defaults(func=extract)
+
+    bench = commands.add_parser("run", help="Time every stage and compare with the baseline")
+    bench.add_argument("--repeat", type=int, default=3, help="Timed runs per stage (best is kept)")
+    bench.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                       help="Allowed slowdown / memory growth in percent")
+    bench.add_argument("--confirm", type=int, default=DEFAULT_CONFIRM,
+                       help="Extra timed runs for a stage that looks slower than the baseline")
+    bench.add_argument("--baseline", type=Path, default=BASELINE_PATH)
+    bench.add_argument("--save", action="store_true", help="Store this run as the new baseline")
+    bench.add_argument("--cases", nargs="+", help="Only run these cases")
+    bench.add_argument("--synthetic-only", action="store_true",
+                       help="Skip the recorded cases (for machines without fixtures)")
+    bench.set_defaults(func=run)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+if __name__ == "__main__":
+    sys.exit(main())
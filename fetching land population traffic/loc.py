@@ -2,11 +2,33 @@ import streamlit as st
 import folium
 from streamlit_folium import st_folium
 import requests
-from geopy.distance import geodesic
 from datetime import datetime
 import pandas as pd
-import time
+import json
 import logging
+import math
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from pso_common.overpass_cache import get_cache, query_key
+from pso_common.overpass_client import get_client as get_overpass_client
+from pso_common.revalidate import format_age, refresh_in_background
+from pso_common.dedupe import merge_duplicates
+from pso_common.distance import distances_km
+from pso_common.land_use import format_area, landuse_areas, population_from_areas
+from pso_common.population import load_population, population_available
+from pso_common.traffic import load_traffic_index, traffic_available
+from pso_common.cities import PAKISTAN_CITIES
+from pso_common.fuel_stations import LIVE_BACKEND, LOCAL_BACKEND, load_fuel_stations, search_bbox
+from pso_common.station_index import index_available
+from pso_common.suitability import PSO_SPACING_M, landuse_bbox_query, score_city
+from pso_common.tiles import element_coords
+from pso_common.brands import brand_style, match_brand
+from pso_common.logos import add_logo_css, has_logo, logo_icon
+from pso_common.station_table import StationTable
+from pso_common.urdu import translate as translate_urdu
+from pso_common.perf import end_run, span, span_rows, start_run
 
 # -----------------------------
 # Page Configuration
@@ -102,65 +124,8 @@ st.markdown(f"""
 # -----------------------------
 
 def translate_urdu_to_english(text):
-    """Translate common Urdu terms to English."""
-    urdu_to_english = {
-        # Common place names and terms
-        'کراچی': 'Karachi',
-        'لاہور': 'Lahore',
-        'اسلام آباد': 'Islamabad',
-        'فیصل آباد': 'Faisalabad',
-        'ملتان': 'Multan',
-        'حیدرآباد': 'Hyderabad',
-        'راولپنڈی': 'Rawalpindi',
-        'پشاور': 'Peshawar',
-        'کوئٹہ': 'Quetta',
-        'سکھر': 'Sukkur',
-        
-        # Fuel station terms
-        'پیٹرول پمپ': 'Petrol Pump',
-        'ایندھن اسٹیشن': 'Fuel Station',
-        'گیس اسٹیشن': 'Gas Station',
-        'پی ایس او': 'PSO',
-        'شیل': 'Shell',
-        'ٹوٹل': 'Total',
-        'ایٹک': 'Attock',
-        'حسکول': 'Hascol',
-        
-        # Land use terms
-        'رہائشی علاقہ': 'Residential Area',
-        'تجارتی علاقہ': 'Commercial Area',
-        'صنعتی علاقہ': 'Industrial Area',
-        'زرعی زمین': 'Agricultural Land',
-        'پارک': 'Park',
-        'اسپتال': 'Hospital',
-        'اسکول': 'School',
-        'مسجد': 'Mosque',
-        'بازار': 'Market',
-        'مال': 'Mall',
-        
-        # General terms
-        'شمال': 'North',
-        'جنوب': 'South',
-        'مشرق': 'East',
-        'مغرب': 'West',
-        'فاصلہ': 'Distance',
-        'کلومیٹر': 'Kilometer',
-        'میٹر': 'Meter',
-        'سڑک': 'Road',
-        'گلی': 'Street',
-        'محلہ': 'Neighborhood'
-    }
-    
-    # Clean and translate text
-    if not text or not isinstance(text, str):
-        return text
-    
-    # Replace Urdu text with English
-    translated = text
-    for urdu, english in urdu_to_english.items():
-        translated = translated.replace(urdu, english)
-    
-    return translated
+    """Translate common Urdu terms to English (single-pass gazetteer lookup)."""
+    return translate_urdu(text)
 
 def format_location_name(name):
     """Format location names for better presentation."""
@@ -211,51 +176,55 @@ def create_info_card(title, content, icon="ℹ️", color=PSO_GREEN):
 # -----------------------------
 
 def safe_api_call(func, *args, **kwargs):
-    """Safely call API with error handling and retries."""
-    max_retries = 3
-    for attempt in range(max_retries):
-        try:
-            return func(*args, **kwargs)
-        except requests.exceptions.RequestException as e:
-            if attempt < max_retries - 1:
-                time.sleep(2 ** attempt)  # Exponential backoff
-                continue
-            else:
-                st.error(f"API call failed after {max_retries} attempts: {str(e)}")
-                return None
-        except Exception as e:
-            st.error(f"Unexpected error: {str(e)}")
-            return None
-
-def overpass_query(query):
-    """Query Overpass API with error handling."""
-    url = "https://overpass-api.de/api/interpreter"
+    """Safely call API with error handling (retries and mirror failover live in the Overpass client)."""
     try:
-        response = requests.post(
-            url, 
-            data=query, 
-            headers={"Content-Type": "text/plain"},
-            timeout=30
-        )
-        response.raise_for_status()
-        return response.json()
-    except requests.exceptions.Timeout:
-        st.error("API request timed out. Please try again.")
-        return None
-    except requests.exceptions.HTTPError as e:
-        st.error(f"HTTP error occurred: {e}")
+        return func(*args, **kwargs)
+    except requests.exceptions.RequestException as e:
+        st.error(f"API call failed: {str(e)}")
         return None
     except Exception as e:
-        st.error(f"Error querying Overpass API: {str(e)}")
+        st.error(f"Unexpected error: {str(e)}")
+        return None
+
+def refresh_query(query):
+    """Re-download a query and store it in the cache (run in the background)."""
+    get_cache().put(query, get_overpass_client().fetch(query))
+
+def serve_stale(query):
+    """Last good response for a query while Overpass is down, refreshing it in the background."""
+    stale = get_cache().get_stale_json(query)
+    if stale is None:
         return None
+    data, age = stale
+    refresh_in_background(query_key(query), lambda: refresh_query(query))
+    st.warning(f"⏳ Overpass is unavailable — data is {format_age(age)} old. Refreshing in the background.")
+    return data
 
-def calculate_distance_km(coord1, coord2):
-    """Calculate distance between two coordinates in kilometers."""
+def overpass_query(query):
+    """Query Overpass API with error handling, falling back to the last good response."""
+    cache = get_cache()
+    cached = cache.get_json(query)
+    if cached is not None:
+        return cached
     try:
-        return round(geodesic(coord1, coord2).km, 3)
+        body = get_overpass_client().fetch(query)
+        data = json.loads(body)
+        cache.put(query, body)
+        return data
+    except requests.exceptions.RequestException as e:
+        stale = serve_stale(query)
+        if stale is not None:
+            return stale
+        if isinstance(e, requests.exceptions.Timeout):
+            st.error("API request timed out. Please try again.")
+        elif isinstance(e, requests.exceptions.HTTPError):
+            st.error(f"HTTP error occurred: {e}")
+        else:
+            st.error(f"Error querying Overpass API: {str(e)}")
+        return None
     except Exception as e:
-        st.error(f"Error calculating distance: {str(e)}")
-        return 0
+        st.error(f"Error querying Overpass API: {str(e)}")
+        return None
 
 def validate_coordinates(lat, lon):
     """Validate latitude and longitude values."""
@@ -269,23 +238,9 @@ def validate_coordinates(lat, lon):
 # Fuel Brand Configuration
 # -----------------------------
 
-FUEL_BRAND_ICONS = {
-    "PSO": {"emoji": "🟢", "color": "green"},
-    "Shell": {"emoji": "🐚", "color": "yellow"},
-    "Total": {"emoji": "🔴", "color": "red"},
-    "Attock": {"emoji": "🟠", "color": "orange"},
-    "Hascol": {"emoji": "🔵", "color": "blue"},
-    "GO": {"emoji": "🟣", "color": "purple"},
-    "Byco": {"emoji": "🟤", "color": "brown"},
-    "Unknown": {"emoji": "⛽", "color": "gray"}
-}
-
 def get_brand_info(brand):
     """Get brand icon and color information."""
-    for key in FUEL_BRAND_ICONS:
-        if key.lower() in brand.lower():
-            return FUEL_BRAND_ICONS[key]
-    return FUEL_BRAND_ICONS["Unknown"]
+    return brand_style(brand)
 
 # -----------------------------
 # Sidebar Configuration
@@ -367,7 +322,7 @@ st.sidebar.markdown(
 def find_fuel_stations(lat, lon, radius):
     """Find fuel stations within specified radius."""
     if not is_valid:
-        return []
+        return StationTable.from_records([])
     
     query = f"""
     [out:json][timeout:30];
@@ -380,17 +335,36 @@ def find_fuel_stations(lat, lon, radius):
     
     data = safe_api_call(overpass_query, query)
     if not data:
-        return []
+        return StationTable.from_records([])
+    
+    elements = data.get("elements", [])
+    with span("fuel.parse", elements=len(elements)):
+        return parse_fuel_elements(elements, lat, lon, radius)
+
+def parse_fuel_elements(elements, lat, lon, radius):
+    """Turn fuel station elements into a StationTable sorted by distance."""
+    # Handle both nodes and ways
+    located = []
+    for el in elements:
+        coords = element_coords(el)
+        if coords:
+            located.append((el, coords[0], coords[1]))
+    
+    # Distances for all elements in one batch
+    radius_km = radius / 1000
+    element_distances = distances_km(
+        lat, lon,
+        [p[1] for p in located], [p[2] for p in located],
+        radius_km=radius_km,
+    )
     
     stations = []
-    for el in data.get("elements", []):
+    for (el, element_lat, element_lon), distance in zip(located, element_distances):
         try:
-            # Handle both nodes and ways
-            if "lat" in el and "lon" in el:
-                element_lat, element_lon = el["lat"], el["lon"]
-            elif "center" in el:
-                element_lat, element_lon = el["center"]["lat"], el["center"]["lon"]
-            else:
+            distance = round(float(distance), 3)
+            
+            # Only include stations within the radius
+            if distance > radius_km:
                 continue
                 
             tags = el.get("tags", {})
@@ -407,30 +381,24 @@ def find_fuel_stations(lat, lon, radius):
             if brand == "Unknown" and operator:
                 brand = operator
             
-            coord = (element_lat, element_lon)
-            distance = calculate_distance_km((lat, lon), coord)
-            
-            # Only include stations within the radius
-            if distance <= radius / 1000:
-                stations.append({
-                    "name": name,
-                    "lat": element_lat,
-                    "lon": element_lon,
-                    "distance": distance,
-                    "brand": brand,
-                    "operator": operator,
-                    "raw_name": raw_name,  # Keep original for reference
-                    "address": tags.get("addr:full", tags.get("addr:street", ""))
-                })
+            stations.append({
+                "name": name,
+                "lat": element_lat,
+                "lon": element_lon,
+                "distance": distance,
+                "brand": brand,
+                "operator": operator,
+                "raw_name": raw_name,  # Keep original for reference
+                "address": tags.get("addr:full", tags.get("addr:street", ""))
+            })
         except Exception as e:
             continue  # Skip problematic entries
     
-    # Sort by distance
-    stations.sort(key=lambda x: x["distance"])
-    return stations
+    # Merge node/way duplicates, then a columnar table sorted by distance
+    return StationTable.from_records(merge_duplicates(stations)).sort("distance")
 
 def get_land_use(lat, lon, radius):
-    """Analyze land use within specified radius."""
+    """Land use area (m²) per class within specified radius."""
     if not is_valid:
         return {}
     
@@ -440,28 +408,67 @@ def get_land_use(lat, lon, radius):
       way["landuse"](around:{radius},{lat},{lon});
       relation["landuse"](around:{radius},{lat},{lon});
     );
-    out body;
+    out geom;
     """
     
     data = safe_api_call(overpass_query, query)
     if not data:
         return {}
     
-    land_counts = {}
+    elements = data.get("elements", [])
+    with span("landuse.areas", elements=len(elements)):
+        return landuse_areas(elements, lat, lon, radius)
+
+def analyze_site(lat, lon, radius):
+    """Fuel stations and land use from one combined Overpass query."""
+    if not is_valid:
+        return StationTable.from_records([]), {}
+    
+    # `out geom` gives land use polygons; fuel ways are placed at their bounds' center
+    query = f"""
+    [out:json][timeout:30];
+    (
+      node["amenity"="fuel"](around:{radius},{lat},{lon});
+      way["amenity"="fuel"](around:{radius},{lat},{lon});
+      way["landuse"](around:{radius},{lat},{lon});
+      relation["landuse"](around:{radius},{lat},{lon});
+    );
+    out geom;
+    """
+    
+    data = safe_api_call(overpass_query, query)
+    if not data:
+        return StationTable.from_records([]), {}
+    
+    # Split the elements in one pass
+    fuel_elements = []
+    land_elements = []
     for el in data.get("elements", []):
-        try:
-            landuse = el.get("tags", {}).get("landuse")
-            if landuse:
-                land_counts[landuse] = land_counts.get(landuse, 0) + 1
-        except Exception:
-            continue
+        tags = el.get("tags", {})
+        if tags.get("landuse"):
+            land_elements.append(el)
+        if tags.get("amenity") == "fuel":
+            fuel_elements.append(el)
     
-    return land_counts
+    return (
+        parse_fuel_elements(fuel_elements, lat, lon, radius),
+        landuse_areas(land_elements, lat, lon, radius),
+    )
 
-def simulate_traffic():
-    """Simulate traffic based on current time."""
+def simulate_traffic(lat=None, lon=None):
+    """Traffic level from the road-network index and time of day, or from the clock alone."""
     try:
         hour = datetime.now().hour
+        if lat is not None and traffic_available():
+            score, exposure = load_traffic_index().traffic_level(lat, lon, hour)
+            if score is not None:
+                detail = f"Road exposure {exposure['score']:.0f}/100, {exposure['major_km']:.1f} km to a major road"
+                if score >= 50:
+                    return "🔴 Heavy", detail
+                elif score >= 25:
+                    return "🟡 Moderate", detail
+                else:
+                    return "🟢 Light", detail
         if 7 <= hour <= 9 or 17 <= hour <= 19:
             return "🔴 Heavy", "Peak hours traffic"
         elif 10 <= hour <= 16:
@@ -471,23 +478,49 @@ def simulate_traffic():
     except Exception:
         return "🔘 Unknown", "Unable to determine"
 
-def estimate_population(land_data):
-    """Estimate population based on land use data."""
+def estimate_population(land_data, lat=None, lon=None, radius=None):
+    """Estimate population from the gridded dataset if installed, else from land use area (m² per class)."""
+    if lat is not None and population_available():
+        return int(load_population().population_within(lat, lon, radius / 1000))
     try:
-        residential = land_data.get("residential", 0)
-        commercial = land_data.get("commercial", 0)
-        industrial = land_data.get("industrial", 0)
-        
-        # Improved population estimation
-        base_population = residential * 150  # Assume 150 people per residential unit
-        commercial_factor = commercial * 50   # Commercial areas attract people
-        industrial_factor = industrial * 30   # Industrial areas have workers
-        
-        total_estimate = base_population + commercial_factor + industrial_factor
-        return max(total_estimate, 0)
+        return max(int(population_from_areas(land_data)), 0)
     except Exception:
         return 0
 
+def scan_city_grid(city, half_size_km, cell_m):
+    """Score a candidate grid over a whole city from one bulk load of stations and land use."""
+    city_lat, city_lon = PAKISTAN_CITIES[city]
+    # Stations just outside the grid still compete with (or cover) its edge cells
+    reach_km = half_size_km * math.sqrt(2) + PSO_SPACING_M / 1000
+    backend = LOCAL_BACKEND if index_available() else LIVE_BACKEND
+    try:
+        stations = load_fuel_stations(city_lat, city_lon, reach_km, backend)
+    except requests.exceptions.RequestException as e:
+        st.error(f"Failed to load fuel stations: {e}")
+        return None
+    
+    south, west, north, east = search_bbox(city_lat, city_lon, half_size_km)
+    data = safe_api_call(overpass_query, landuse_bbox_query(south, west, north, east))
+    landuse_elements = data.get("elements", []) if data else []
+    return score_city(city_lat, city_lon, half_size_km, cell_m, stations, landuse_elements)
+
+def create_suitability_map(grid):
+    """Map with the suitability heatmap and the best candidate sites."""
+    scan_map = folium.Map(location=[grid.latitude, grid.longitude], zoom_start=12, tiles="OpenStreetMap")
+    folium.raster_layers.ImageOverlay(
+        image=grid.rgba(),
+        bounds=grid.bounds,
+        mercator_project=True,
+        name="Suitability",
+    ).add_to(scan_map)
+    for rank, site in enumerate(grid.top_sites(10), start=1):
+        folium.Marker(
+            location=[site["lat"], site["lon"]],
+            tooltip=f"#{rank} · score {site['score']}",
+            icon=folium.Icon(color="green", icon="star"),
+        ).add_to(scan_map)
+    return scan_map
+
 # -----------------------------
 # Map Creation
 # -----------------------------
@@ -500,6 +533,7 @@ def create_map(lat, lon, radius):
         zoom_start=15, 
         tiles="OpenStreetMap"
     )
+    add_logo_css(my_map)
     
     # Add main location marker
     folium.Marker(
@@ -525,18 +559,24 @@ def create_map(lat, lon, radius):
 # Main Application Logic
 # -----------------------------
 
+# Collect this run's stage timings for the performance panel
+start_run()
+
 # Initialize session state
 if "fuel_stations" not in st.session_state:
-    st.session_state.fuel_stations = []
+    st.session_state.fuel_stations = StationTable.from_records([])
 if "land_data" not in st.session_state:
     st.session_state.land_data = {}
+if "suitability" not in st.session_state:
+    st.session_state.suitability = None
 
 # Create main map
 if is_valid:
-    main_map = create_map(lat, lon, radius)
+    with span("map.build", elements=len(st.session_state.fuel_stations)):
+        main_map = create_map(lat, lon, radius)
     
     # Action buttons
-    col1, col2, col3 = st.columns(3)
+    col1, col2, col3, col4 = st.columns(4)
     
     with col1:
         if st.button("🔍 Search Location", type="primary"):
@@ -544,18 +584,32 @@ if is_valid:
     
     with col2:
         if st.button("⛽ Find Fuel Stations", type="secondary"):
-            with st.spinner("Searching for fuel stations..."):
+            with st.spinner("Searching for fuel stations..."), span("app.find_fuel") as s:
                 stations = find_fuel_stations(lat, lon, radius)
+                s.add(elements=len(stations))
                 st.session_state.fuel_stations = stations
                 st.success(f"Found {len(stations)} fuel stations within {radius}m")
     
     with col3:
         if st.button("🏘️ Analyze Land Use", type="secondary"):
-            with st.spinner("Analyzing land use..."):
+            with st.spinner("Analyzing land use..."), span("app.land_use") as s:
                 land_data = get_land_use(lat, lon, radius)
+                s.add(elements=len(land_data))
                 st.session_state.land_data = land_data
                 st.success("Land use analysis completed")
     
+    with col4:
+        if st.button("🧭 Analyze Site", type="primary"):
+            with st.spinner("Analyzing fuel stations and land use..."), span("app.analyze_site") as s:
+                stations, land_data = analyze_site(lat, lon, radius)
+                s.add(elements=len(stations))
+                st.session_state.fuel_stations = stations
+                st.session_state.land_data = land_data
+                st.success(
+                    f"Found {len(stations)} fuel stations and {len(land_data)} land use categories within {radius}m "
+                    f"(est. population {estimate_population(land_data, lat, lon, radius):,})"
+                )
+    
     # Display results
     if st.session_state.fuel_stations:
         st.subheader("⛽ Fuel Stations Analysis")
@@ -565,7 +619,7 @@ if is_valid:
             st.markdown("### 🎯 Nearest Fuel Stations")
             
             cols = st.columns(min(3, len(st.session_state.fuel_stations)))
-            for i, station in enumerate(st.session_state.fuel_stations[:3]):
+            for i, station in enumerate(st.session_state.fuel_stations.top_k(3)):
                 with cols[i]:
                     brand_info = get_brand_info(station["brand"])
                     address_info = f"<br><small>📍 {station['address']}</small>" if station.get('address') else ""
@@ -604,11 +658,18 @@ if is_valid:
             </div>
             """
             
+            # Bundled brand logo when available, colored pin otherwise
+            brand_key = match_brand(station["brand"]).lower()
+            if has_logo(brand_key):
+                icon = logo_icon(brand_key, size=30)
+            else:
+                icon = folium.Icon(color=brand_info["color"], icon="tint")
+            
             folium.Marker(
                 location=[station["lat"], station["lon"]],
                 popup=folium.Popup(popup_content, max_width=300),
                 tooltip=f"{brand_info['emoji']} {station['name']} ({station['distance']}km)",
-                icon=folium.Icon(color=brand_info["color"], icon="tint")
+                icon=icon
             ).add_to(main_map)
         
         # Create enhanced DataFrame for display
@@ -642,7 +703,7 @@ if is_valid:
         
         with col2:
             if st.session_state.fuel_stations:
-                closest = min(st.session_state.fuel_stations, key=lambda x: x["distance"])
+                closest = st.session_state.fuel_stations.top_k(1).record(0)
                 st.markdown(create_info_card(
                     "Nearest Station",
                     f"<div style='text-align: center;'><h3 style='color: {PSO_BLUE}; margin: 0;'>{closest['distance']} km</h3><p style='margin: 0.5rem 0;'>{closest['name']}</p></div>",
@@ -651,7 +712,7 @@ if is_valid:
                 ), unsafe_allow_html=True)
         
         with col3:
-            brands = set(s["brand"] for s in st.session_state.fuel_stations)
+            brands = st.session_state.fuel_stations.unique_brands()
             st.markdown(create_info_card(
                 "Unique Brands",
                 f"<h2 style='text-align: center; color: {PSO_YELLOW}; margin: 0;'>{len(brands)}</h2>",
@@ -660,7 +721,7 @@ if is_valid:
             ), unsafe_allow_html=True)
         
         with col4:
-            avg_distance = sum(s["distance"] for s in st.session_state.fuel_stations) / len(st.session_state.fuel_stations)
+            avg_distance = float(st.session_state.fuel_stations.distance.mean())
             st.markdown(create_info_card(
                 "Average Distance",
                 f"<h2 style='text-align: center; color: {PSO_GREEN}; margin: 0;'>{avg_distance:.2f} km</h2>",
@@ -671,14 +732,11 @@ if is_valid:
         # Brand distribution
         if len(brands) > 1:
             st.markdown("### 🎯 Brand Distribution")
-            brand_counts = {}
-            for station in st.session_state.fuel_stations:
-                brand = station["brand"]
-                brand_counts[brand] = brand_counts.get(brand, 0) + 1
+            brand_counts = st.session_state.fuel_stations.brand_counts()
             
             brand_df = pd.DataFrame([
                 {"Brand": f"{get_brand_info(brand)['emoji']} {brand}", "Count": count}
-                for brand, count in sorted(brand_counts.items(), key=lambda x: x[1], reverse=True)
+                for brand, count in brand_counts.items()
             ])
             
             col1, col2 = st.columns(2)
@@ -687,7 +745,7 @@ if is_valid:
             with col2:
                 # Create a simple text-based chart
                 chart_content = ""
-                for brand, count in sorted(brand_counts.items(), key=lambda x: x[1], reverse=True):
+                for brand, count in brand_counts.items():
                     emoji = get_brand_info(brand)['emoji']
                     percentage = (count / len(st.session_state.fuel_stations)) * 100
                     bar = "█" * int(percentage / 5)  # Scale bar
@@ -707,7 +765,7 @@ if is_valid:
             # Create enhanced land use cards
             st.markdown("### 🏗️ Land Use Distribution")
             
-            # Sort land use by count
+            # Sort land use by area
             sorted_land_use = sorted(st.session_state.land_data.items(), key=lambda x: x[1], reverse=True)
             
             # Display top land use types as cards
@@ -729,7 +787,7 @@ if is_valid:
                     'religious': '🕌'
                 }
                 
-                for i, (land_type, count) in enumerate(sorted_land_use[:4]):
+                for i, (land_type, area) in enumerate(sorted_land_use[:4]):
                     with cols[i]:
                         icon = land_use_icons.get(land_type, '🏗️')
                         formatted_name = translate_urdu_to_english(land_type.replace('_', ' ').title())
@@ -737,7 +795,7 @@ if is_valid:
                         card_content = f"""
                         <div style="text-align: center;">
                             <div style="font-size: 3rem; margin-bottom: 0.5rem;">{icon}</div>
-                            <h3 style="margin: 0.5rem 0; color: {PSO_GREEN};">{count}</h3>
+                            <h3 style="margin: 0.5rem 0; color: {PSO_GREEN};">{format_area(area)}</h3>
                             <p style="margin: 0; font-weight: 500;">{formatted_name}</p>
                         </div>
                         """
@@ -753,7 +811,7 @@ if is_valid:
             df_land = pd.DataFrame([
                 {
                     "🏗️ Land Use Type": f"{land_use_icons.get(k, '🏗️')} {translate_urdu_to_english(k.replace('_', ' ').title())}",
-                    "📊 Count": v,
+                    "📐 Area (m²)": round(v),
                     "📈 Percentage": f"{(v / sum(st.session_state.land_data.values()) * 100):.1f}%"
                 }
                 for k, v in sorted_land_use
@@ -767,11 +825,12 @@ if is_valid:
             
             with col2:
                 # Enhanced statistics
-                pop_estimate = estimate_population(st.session_state.land_data)
+                pop_estimate = estimate_population(st.session_state.land_data, lat, lon, radius)
+                pop_source = "gridded population data" if population_available() else "land use analysis"
                 
                 st.markdown(create_info_card(
                     "Population Estimate",
-                    f"<h2 style='text-align: center; color: {PSO_BLUE}; margin: 0;'>{pop_estimate:,}</h2><p style='text-align: center; margin: 0.5rem 0;'>Based on land use analysis</p>",
+                    f"<h2 style='text-align: center; color: {PSO_BLUE}; margin: 0;'>{pop_estimate:,}</h2><p style='text-align: center; margin: 0.5rem 0;'>Based on {pop_source}</p>",
                     "👥",
                     PSO_BLUE
                 ), unsafe_allow_html=True)
@@ -811,7 +870,7 @@ if is_valid:
     
     # Enhanced traffic simulation
     st.subheader("🚦 Traffic Analysis")
-    traffic_status, traffic_desc = simulate_traffic()
+    traffic_status, traffic_desc = simulate_traffic(lat, lon)
     
     col1, col2 = st.columns(2)
     with col1:
@@ -852,18 +911,51 @@ if is_valid:
     
     # Display map
     st.subheader("🗺️ Interactive Map")
-    st_data = st_folium(main_map, width=1000, height=600, returned_objects=["last_clicked"])
+    with span("map.render", elements=len(st.session_state.fuel_stations)):
+        st_data = st_folium(main_map, width=1000, height=600, returned_objects=["last_clicked"])
     
     # Handle map clicks
     if st_data["last_clicked"]:
         clicked_lat = st_data["last_clicked"]["lat"]
         clicked_lon = st_data["last_clicked"]["lng"]
         st.info(f"Clicked coordinates: {clicked_lat:.6f}, {clicked_lon:.6f}")
+    
+    # Site suitability scan
+    st.subheader("🧭 Site Suitability Scan")
+    with st.expander("Score every cell of a city grid", expanded=st.session_state.suitability is not None):
+        scan_col1, scan_col2, scan_col3 = st.columns(3)
+        with scan_col1:
+            scan_city = st.selectbox("City", list(PAKISTAN_CITIES), index=list(PAKISTAN_CITIES).index("Lahore"))
+        with scan_col2:
+            scan_half_km = st.number_input("Scan half-width (km)", min_value=1, max_value=25, value=8)
+        with scan_col3:
+            scan_cell_m = st.number_input("Cell size (m)", min_value=100, max_value=2000, value=250, step=50)
+        
+        if st.button("🗺️ Scan City", type="secondary"):
+            with st.spinner(f"Scoring {scan_city} grid..."), span("app.scan_city"):
+                st.session_state.suitability = scan_city_grid(scan_city, scan_half_km, scan_cell_m)
+        
+        grid = st.session_state.suitability
+        if grid is not None:
+            rows, cols = grid.shape
+            st.caption(f"{rows * cols:,} cells of {grid.cell_m} m · green = better site")
+            with span("scan.render", elements=rows * cols):
+                st_folium(create_suitability_map(grid), width=1000, height=500, returned_objects=[])
+            st.markdown("### 🏆 Top Candidate Sites")
+            st.dataframe(pd.DataFrame(grid.top_sites(10)), use_container_width=True)
 
 else:
     st.error("Please enter valid coordinates to continue.")
     st.stop()
 
+# Performance panel
+perf_rows = span_rows(end_run())
+if st.sidebar.checkbox("⏱️ Show performance panel"):
+    st.sidebar.subheader("⏱️ Performance")
+    st.sidebar.dataframe(pd.DataFrame(perf_rows), use_container_width=True, hide_index=True)
+    st.sidebar.caption("This run's stages with p50/p95 over recent runs. "
+                       "Set PSO_PERF_LOG / PSO_METRICS_FILE / PSO_METRICS_PORT to export them.")
+
 # Footer
 st.markdown("---")
 st.markdown(
@@ -0,0 +1 @@
+"""Shared helpers for the PSO mini projects (fuel finder and land use finder)."""
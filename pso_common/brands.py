@@ -0,0 +1,72 @@
+"""Fuel brand classification shared by both apps.
+
+Every alias from the brand table (pso_common/data/brands.json, or the file in
+PSO_BRANDS_PATH) is compiled into one regular expression, so a station name is
+scanned once no matter how many brands exist. Aliases only match whole words,
+and when several brands appear the one listed first in the table wins.
+"""
+import json
+import os
+import re
+from functools import lru_cache
+from pathlib import Path
+
+DEFAULT_BRANDS_PATH = os.environ.get(
+    "PSO_BRANDS_PATH",
+    str(Path(__file__).resolve().parent / "data" / "brands.json"),
+)
+
+class BrandMatcher:
+    """Single-regex brand matcher built from a brand table."""
+
+    def __init__(self, table):
+        self.brands = list(table["brands"])
+        self.generic_name = table["generic"]["name"]
+        self.unknown = table["unknown"]
+        self.styles = {b["name"]: {"emoji": b["emoji"], "color": b["color"]} for b in self.brands}
+        self.styles[self.unknown["name"]] = {"emoji": self.unknown["emoji"], "color": self.unknown["color"]}
+
+        # Alias -> (priority, brand); generic terms rank after every real brand
+        self.aliases = {}
+        entries = [(b["name"], b["aliases"]) for b in self.brands]
+        entries.append((self.generic_name, table["generic"]["aliases"]))
+        for priority, (name, aliases) in enumerate(entries):
+            for alias in aliases:
+                self.aliases.setdefault(self._normalize(alias), (priority, name))
+
+        # Longest aliases first so "total parco" is preferred over "total"
+        alternation = "|".join(re.escape(a) for a in sorted(self.aliases, key=len, reverse=True))
+        self.pattern = re.compile(rf"(?<!\w)(?:{alternation})(?!\w)")
+        self.match = lru_cache(maxsize=8192)(self._match)
+
+    @staticmethod
+    def _normalize(text):
+        return re.sub(r"\s+", " ", text.lower()).strip()
+
+    def _match(self, text):
+        best = None
+        for found in self.pattern.finditer(self._normalize(text)):
+            candidate = self.aliases[found.group(0)]
+            if best is None or candidate[0] < best[0]:
+                best = candidate
+        return best[1] if best else self.unknown["name"]
+
+    def style(self, brand):
+        """Emoji/color for a canonical brand name (Unknown style otherwise)."""
+        return self.styles.get(brand, self.styles[self.unknown["name"]])
+
+@lru_cache(maxsize=None)
+def get_matcher(path=DEFAULT_BRANDS_PATH):
+    """Load the brand table and compile it once per process."""
+    with open(path, encoding="utf-8") as f:
+        return BrandMatcher(json.load(f))
+
+def match_brand(text):
+    """Canonical brand for a raw name/brand/operator string, or 'Unknown'."""
+    if not text or not isinstance(text, str):
+        return get_matcher().unknown["name"]
+    return get_matcher().match(text)
+
+def brand_style(text):
+    """Emoji and map marker color for a raw or canonical brand string."""
+    return get_matcher().style(match_brand(text))
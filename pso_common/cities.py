@@ -0,0 +1,57 @@
+"""Pakistani cities and their center coordinates, shared by the fuel finder and batch tools."""
+
+PAKISTAN_CITIES = {
+    # Major Cities
+    "Lahore": (31.5204, 74.3587),
+    "Karachi": (24.8607, 67.0011),
+    "Islamabad": (33.6844, 73.0479),
+    "Rawalpindi": (33.5651, 73.0169),
+    "Faisalabad": (31.4504, 73.1350),
+    "Peshawar": (34.0151, 71.5249),
+    "Quetta": (30.1798, 66.9750),
+    "Multan": (30.1575, 71.5249),
+    "Hyderabad": (25.3960, 68.3578),
+    "Sialkot": (32.4945, 74.5229),
+    
+    # Additional Important Cities
+    "Gujranwala": (32.1877, 74.1945),
+    "Sargodha": (32.0836, 72.6711),
+    "Bahawalpur": (29.4000, 71.6833),
+    "Sukkur": (27.7036, 68.8480),
+    "Larkana": (27.5590, 68.2123),
+    "Sheikhupura": (31.7167, 73.9667),
+    "Jhang": (31.2681, 72.3317),
+    "Gujrat": (32.5740, 74.0776),
+    "Kasur": (31.1177, 74.4500),
+    "Rahim Yar Khan": (28.4202, 70.2952),
+    "Sahiwal": (30.6682, 73.1114),
+    "Okara": (30.8081, 73.4444),
+    "Wah Cantonment": (33.7948, 72.7348),
+    "Dera Ghazi Khan": (30.0561, 70.6403),
+    "Mirpur Khas": (25.5273, 69.0139),
+    "Chiniot": (31.7200, 72.9800),
+    "Kamoke": (31.9744, 74.2247),
+    "Mandi Bahauddin": (32.5861, 73.4917),
+    "Jhelum": (32.9425, 73.7257),
+    "Sadiqabad": (28.3089, 70.1286),
+    "Jacobabad": (28.2820, 68.4375),
+    "Shikarpur": (27.9556, 68.6389),
+    "Khanewal": (30.3017, 71.9319),
+    "Hafizabad": (32.0669, 73.6881),
+    "Kohat": (33.5919, 71.4392),
+    "Mardan": (34.1983, 72.0406),
+    "Mingora": (34.7797, 72.3608),
+    "Nawabshah": (26.2442, 68.4100),
+    "Abbottabad": (34.1463, 73.2119),
+    "Muzaffargarh": (30.0769, 71.1928),
+    "Muridke": (31.8000, 74.2667),
+    "Pakpattan": (30.3436, 73.3831),
+    "Tando Allahyar": (25.4667, 68.7167),
+    "Jaranwala": (31.3333, 73.4167),
+    "Chishtian": (29.7969, 72.8644),
+    "Daska": (32.3269, 74.3506),
+    "Mianwali": (32.5831, 71.5439),
+    "Attock": (33.7669, 72.3700),
+    "Vehari": (30.0453, 72.3489),
+    "Ferozewala": (31.7831, 74.0731)
+}
@@ -0,0 +1,125 @@
+"""Near-duplicate station merging shared by both apps.
+
+A fuel station is often mapped twice: as a node and as a way (whose `out
+center` point lies a few metres away), or as two nodes by different mappers.
+Stations are bucketed into a grid of cells one merge distance across, so each
+station is only compared with the stations already kept in its own and the
+eight neighbouring cells; the pass is linear in the number of stations.
+
+Two stations are merged when they are within the merge distance, their brands
+agree (same canonical brand, or one is unbranded) and their names agree (one
+name's words include all of the other's, or one is unnamed). The record with the
+most filled-in fields wins; the loser only fills the winner's gaps.
+"""
+import math
+import os
+import re
+
+from pso_common.brands import get_matcher, match_brand
+
+DEFAULT_MERGE_DISTANCE_M = float(os.environ.get("PSO_DEDUPE_DISTANCE_M", 50))
+
+_M_PER_DEG_LAT = 110_540.0
+_M_PER_DEG_LON = 111_320.0
+
+# Placeholder values the parsers use for a missing field
+MISSING_VALUES = {
+    "", "N/A", "Unknown", "Unknown Location", "Unnamed Location",
+    "Unnamed Station", "Unnamed Fuel Station", "Address not available",
+}
+
+def _missing(value):
+    if isinstance(value, str):
+        return value.strip() in MISSING_VALUES
+    return value is None or value == []
+
+def _name_words(record):
+    name = record.get("name")
+    if _missing(name):
+        return frozenset()
+    return frozenset(re.findall(r"\w+", name.lower()))
+
+def _canonical_brand(record):
+    """Canonical brand, or None when the record carries no brand information."""
+    matcher = get_matcher()
+    brand = match_brand(record.get("brand") or record.get("name"))
+    return None if brand in (matcher.unknown["name"], matcher.generic_name) else brand
+
+def brands_agree(a, b):
+    """Same canonical brand, or at least one side unbranded."""
+    return a is None or b is None or a == b
+
+def names_agree(a, b):
+    """Word sets where one contains the other (including equal), or at least one side unnamed."""
+    return not a or not b or a <= b or b <= a
+
+def _richness(record):
+    """Number of filled-in fields, counting each fuel type."""
+    return sum(len(value) if isinstance(value, list) else 1 for value in record.values() if not _missing(value))
+
+def merge_records(a, b):
+    """Merge two records of the same station: the richer one wins, the other fills its gaps."""
+    winner, loser = (a, b) if _richness(a) >= _richness(b) else (b, a)
+    merged = dict(winner)
+    for key, value in loser.items():
+        if isinstance(value, list) and isinstance(merged.get(key), list):
+            merged[key] = merged[key] + [item for item in value if item not in merged[key]]
+        elif _missing(merged.get(key)) and not _missing(value):
+            merged[key] = value
+    return merged
+
+def _metres(a, b):
+    """Equirectangular distance between two records in metres (exact enough below ~1 km)."""
+    dy = (a["lat"] - b["lat"]) * _M_PER_DEG_LAT
+    dx = (a["lon"] - b["lon"]) * _M_PER_DEG_LON * math.cos(math.radians((a["lat"] + b["lat"]) / 2))
+    return math.hypot(dx, dy)
+
+def merge_duplicates(records, distance_m=DEFAULT_MERGE_DISTANCE_M, require_name=True):
+    """Station records with near-duplicates merged, in first-seen order.
+
+    `require_name=False` merges any brand-compatible stations within `distance_m`.
+    """
+    records = list(records)
+    if not records:
+        return []
+    # Cells are `distance_m` tall and at least that wide up to the highest latitude present
+    max_lat = min(max(abs(r["lat"]) for r in records), 89.0)
+    cell_lat = distance_m / _M_PER_DEG_LAT
+    cell_lon = distance_m / (_M_PER_DEG_LON * math.cos(math.radians(max_lat)))
+
+    def cell(record):
+        return math.floor(record["lat"] / cell_lat), math.floor(record["lon"] / cell_lon)
+
+    kept = []      # Merged records
+    keys = []      # (canonical brand, name words) of each kept record
+    cells = {}     # Grid cell -> indices into kept
+    for record in records:
+        brand, words = _canonical_brand(record), _name_words(record)
+        row, col = cell(record)
+        match = None
+        for neighbour in ((row + dr, col + dc) for dr in (-1, 0, 1) for dc in (-1, 0, 1)):
+            for i in cells.get(neighbour, ()):
+                other_brand, other_words = keys[i]
+                if (brands_agree(brand, other_brand)
+                        and (not require_name or names_agree(words, other_words))
+                        and _metres(record, kept[i]) <= distance_m):
+                    match = i
+                    break
+            if match is not None:
+                break
+
+        if match is None:
+            cells.setdefault((row, col), []).append(len(kept))
+            kept.append(record)
+            keys.append((brand, words))
+        else:
+            old_cell = cell(kept[match])
+            kept[match] = merge_records(kept[match], record)
+            # The merged station is known by whichever brand and name it now carries
+            keys[match] = (keys[match][0] or brand, _name_words(kept[match]))
+            new_cell = cell(kept[match])
+            if new_cell != old_cell:
+                # The winner's coordinates moved it; index it where later duplicates will look
+                cells[old_cell].remove(match)
+                cells.setdefault(new_cell, []).append(match)
+    return kept
@@ -0,0 +1,67 @@
+"""Batched distance calculations for station lists.
+
+Distances for every candidate are computed in one NumPy call with Lambert's
+ellipsoidal formula on WGS-84, which stays within a metre of the geodesic for
+search-sized distances, so every distance shown matches `geopy.geodesic` to
+display precision. Points whose distance lies within a small margin of the
+search radius are still re-measured with `geopy.geodesic` to decide exactly
+whether they are in.
+"""
+import numpy as np
+from geopy.distance import geodesic
+
+EARTH_RADIUS_KM = 6371.0088
+
+# WGS-84 semi-major axis (km) and flattening
+WGS84_A_KM = 6378.137
+WGS84_F = 1 / 298.257223563
+
+# Relative error bound of the batched formula, used to pick boundary points
+BOUNDARY_TOLERANCE = 1e-4
+
+def haversine_km(lat, lon, lats, lons):
+    """Great-circle distance in km from one point to arrays of points."""
+    lat1 = np.radians(lat)
+    lat2 = np.radians(np.asarray(lats, dtype=np.float64))
+    dlat = lat2 - lat1
+    dlon = np.radians(np.asarray(lons, dtype=np.float64)) - np.radians(lon)
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlon / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+def ellipsoidal_km(lat, lon, lats, lons):
+    """WGS-84 distance in km from one point to arrays of points (Andoyer-Lambert)."""
+    beta1 = np.arctan((1 - WGS84_F) * np.tan(np.radians(lat)))
+    beta2 = np.arctan((1 - WGS84_F) * np.tan(np.radians(np.asarray(lats, dtype=np.float64))))
+    dlon = np.radians(np.asarray(lons, dtype=np.float64)) - np.radians(lon)
+    h = np.sin((beta2 - beta1) / 2) ** 2 + np.cos(beta1) * np.cos(beta2) * np.sin(dlon / 2) ** 2
+    sigma = 2 * np.arcsin(np.sqrt(np.clip(h, 0.0, 1.0)))
+    p, q = (beta1 + beta2) / 2, (beta2 - beta1) / 2
+    with np.errstate(divide="ignore", invalid="ignore"):
+        x = (sigma - np.sin(sigma)) * np.sin(p) ** 2 * np.cos(q) ** 2 / np.cos(sigma / 2) ** 2
+        y = (sigma + np.sin(sigma)) * np.cos(p) ** 2 * np.sin(q) ** 2 / np.sin(sigma / 2) ** 2
+        distances = WGS84_A_KM * (sigma - WGS84_F / 2 * (x + y))
+    return np.where(sigma > 0, distances, 0.0)
+
+def distances_km(lat, lon, lats, lons, radius_km=None):
+    """Distances in km from one point to many, exact near the radius boundary.
+
+    Without `radius_km` the batched ellipsoidal distances are returned. With it,
+    points that are ambiguously close to the boundary get an exact geodesic
+    distance, so `distances <= radius_km` matches a per-point geodesic filter.
+    """
+    lats = np.asarray(lats, dtype=np.float64)
+    lons = np.asarray(lons, dtype=np.float64)
+    distances = ellipsoidal_km(lat, lon, lats, lons)
+    if radius_km is None or not len(distances):
+        return distances
+
+    margin = radius_km * BOUNDARY_TOLERANCE
+    boundary = np.flatnonzero(np.abs(distances - radius_km) <= margin)
+    for i in boundary:
+        distances[i] = geodesic((lat, lon), (lats[i], lons[i])).kilometers
+    return distances
+
+def within_radius(lat, lon, lats, lons, radius_km):
+    """(mask, distances) for points within `radius_km` of a point."""
+    distances = distances_km(lat, lon, lats, lons, radius_km)
+    return distances <= radius_km, distances
@@ -0,0 +1,218 @@
+"""Fuel finder data pipeline: fetch -> parse -> enrich.
+
+Moved out of the fuel finder's main.py so it has no Streamlit dependency. The
+app wraps `load_fuel_stations` in `st.cache_data`; headless tools call it
+directly.
+
+Every stage is a generator over the one before it (elements are parsed from
+the response stream as they arrive), so only the final station records are
+ever held in full; near-duplicates are merged over those records.
+"""
+import logging
+import math
+import re
+from itertools import islice
+
+from pso_common.brands import match_brand
+from pso_common.dedupe import merge_duplicates
+from pso_common.distance import distances_km
+from pso_common.overpass_client import get_client
+from pso_common.perf import Span, span
+from pso_common.station_index import load_index
+from pso_common.tiles import element_coords, fetch_tiled
+
+logger = logging.getLogger(__name__)
+
+# Backend names accepted by load_fuel_stations
+LIVE_BACKEND = "live"
+LOCAL_BACKEND = "local"
+
+# Stations measured per vectorized distance call
+DISTANCE_BATCH = 4096
+
+# --- Text helpers ---
+def is_english(text):
+    """Check if text contains primarily English characters"""
+    if not text:
+        return False
+    # Allow English letters, numbers, spaces, and common punctuation
+    return bool(re.match(r'^[\x00-\x7F\s.,()\-\'"0-9A-Za-z/&]+$', text))
+
+def clean_text(text):
+    """Clean and normalize text"""
+    if not text:
+        return ""
+    # Remove extra whitespace and normalize
+    return re.sub(r'\s+', ' ', text.strip())
+
+def extract_brand_from_name(name):
+    """Extract brand from station name using the shared brand matcher"""
+    if not name:
+        return "Unknown"
+    return match_brand(name)
+
+# --- Fetch ---
+def build_fuel_query(bboxes):
+    """Build one Overpass query covering a list of (south, west, north, east) boxes"""
+    statements = []
+    for south, west, north, east in bboxes:
+        for element_type in ("node", "way"):
+            for amenity in ("fuel", "gas_station", "petrol_station"):
+                statements.append(f'{element_type}["amenity"="{amenity}"]({south},{west},{north},{east});')
+    body = "\n      ".join(statements)
+    return f"""
+    [out:json][timeout:30];
+    (
+      {body}
+    );
+    out center;
+    """
+
+def fetch_overpass_elements(query):
+    """Stream a query's elements from the Overpass mirrors; raises if every mirror fails or is tripped"""
+    return get_client().iter_elements(query)
+
+def search_bbox(latitude, longitude, radius_km):
+    """Bounding box (south, west, north, east) around a search circle"""
+    # Convert radius from km to degrees (longitude degrees shrink with latitude)
+    lat_deg = radius_km / 111.0
+    lon_deg = radius_km / (111.0 * max(math.cos(math.radians(latitude)), 0.01))
+    return (latitude - lat_deg, longitude - lon_deg, latitude + lat_deg, longitude + lon_deg)
+
+def get_overpass_data(latitude, longitude, radius_km, on_stale=None):
+    """Fetch fuel station data from Overpass API, downloading only uncached tiles.
+
+    While Overpass is down, expired tiles are served and `on_stale(age_seconds)` is called.
+    """
+    south, west, north, east = search_bbox(latitude, longitude, radius_km)
+    return fetch_tiled(
+        south, west, north, east,
+        build_query=build_fuel_query,
+        fetch=fetch_overpass_elements,
+        layer="fuel",
+        on_stale=on_stale,
+    )
+
+def get_local_data(latitude, longitude, radius_km):
+    """Fetch fuel station data from the offline station index (same shape as get_overpass_data)"""
+    return load_index().query_radius(latitude, longitude, radius_km)
+
+# --- Parse and enrich ---
+def parse_station(tags, lat, lon, distance):
+    """Build a station record from OSM tags, or None if it has no English name/brand"""
+    # Extract name with priority: name:en > name (if English) > brand > operator
+    name = (
+        tags.get("name:en") or
+        (tags.get("name") if is_english(tags.get("name", "")) else None) or
+        (tags.get("brand") if is_english(tags.get("brand", "")) else None) or
+        (tags.get("operator") if is_english(tags.get("operator", "")) else None) or
+        "Unnamed Station"
+    )
+
+    # Extract brand with priority: brand:en > brand (if English) > extract from name
+    brand = (
+        tags.get("brand:en") or
+        (tags.get("brand") if is_english(tags.get("brand", "")) else None) or
+        extract_brand_from_name(name)
+    )
+
+    # Extract address with multiple fallbacks
+    address = (
+        tags.get("addr:full:en") or
+        tags.get("addr:street:en") or
+        (tags.get("addr:full") if is_english(tags.get("addr:full", "")) else None) or
+        (tags.get("addr:street") if is_english(tags.get("addr:street", "")) else None) or
+        tags.get("addr:city") or
+        "Address not available"
+    )
+
+    # Additional information
+    phone = tags.get("phone", "N/A")
+    website = tags.get("website", "N/A")
+    opening_hours = tags.get("opening_hours", "N/A")
+    fuel_types = []
+
+    # Check for fuel types
+    if tags.get("fuel:diesel") == "yes":
+        fuel_types.append("Diesel")
+    if tags.get("fuel:octane_91") == "yes":
+        fuel_types.append("Octane 91")
+    if tags.get("fuel:octane_95") == "yes":
+        fuel_types.append("Octane 95")
+    if tags.get("fuel:octane_97") == "yes":
+        fuel_types.append("Octane 97")
+    if tags.get("fuel:lpg") == "yes":
+        fuel_types.append("LPG")
+    if tags.get("fuel:cng") == "yes":
+        fuel_types.append("CNG")
+
+    # Only include if name and brand are in English
+    if not (is_english(name) and is_english(brand)):
+        return None
+    return {
+        "name": clean_text(name),
+        "brand": clean_text(brand),
+        "address": clean_text(address),
+        "lat": lat,
+        "lon": lon,
+        "distance": distance,
+        "phone": phone,
+        "website": website,
+        "opening_hours": opening_hours,
+        "fuel_types": fuel_types
+    }
+
+def locate_elements(raw_fuel_stations):
+    """Yield (tags, lat, lon) for elements that have a location"""
+    # Handle both nodes and ways
+    for station in raw_fuel_stations:
+        coords = element_coords(station)
+        if not coords or not coords[0] or not coords[1]:
+            continue
+        yield station.get("tags", {}), coords[0], coords[1]
+
+def within_radius(located, latitude, longitude, radius_km):
+    """Yield (tags, lat, lon, distance) for located elements inside the search circle"""
+    located = iter(located)
+    while True:
+        batch = list(islice(located, DISTANCE_BATCH))
+        if not batch:
+            return
+        # Distances for a batch in one call (ellipsoidal; exact geodesic near the boundary)
+        batch_distances = distances_km(
+            latitude, longitude,
+            [lat for _, lat, _ in batch], [lon for _, _, lon in batch],
+            radius_km=radius_km,
+        )
+        for (tags, lat, lon), distance in zip(batch, batch_distances):
+            # Check if within actual radius (more accurate than bounding box)
+            distance = round(float(distance), 2)
+            if distance <= radius_km:
+                yield tags, lat, lon, distance
+
+def iter_fuel_stations(raw_fuel_stations, latitude, longitude, radius_km):
+    """Yield station records within the radius, in input order"""
+    located = locate_elements(raw_fuel_stations)
+    nearby = Span("fuel.distance").wrap(within_radius(located, latitude, longitude, radius_km))
+    records = (parse_station(tags, lat, lon, distance) for tags, lat, lon, distance in nearby)
+    for record in Span("fuel.normalize").wrap(records):
+        if record:
+            yield record
+
+def parse_fuel_stations(raw_fuel_stations, latitude, longitude, radius_km):
+    """Turn raw Overpass elements into station records within the radius, sorted by distance"""
+    # Node/way pairs and double-mapped nodes collapse into one record
+    with span("fuel.dedupe") as s:
+        fuel_stations = merge_duplicates(iter_fuel_stations(raw_fuel_stations, latitude, longitude, radius_km))
+        s.add(elements=len(fuel_stations))
+    with span("fuel.sort", elements=len(fuel_stations)):
+        fuel_stations.sort(key=lambda x: x["distance"] if x["distance"] else float('inf'))
+    return fuel_stations
+
+def load_fuel_stations(latitude, longitude, radius_km, backend=LIVE_BACKEND, on_stale=None):
+    """Full pipeline: fetch raw elements from a backend and parse them into station records"""
+    if backend == LOCAL_BACKEND:
+        raw_fuel_stations = get_local_data(latitude, longitude, radius_km)
+    else:
+        raw_fuel_stations = get_overpass_data(latitude, longitude, radius_km, on_stale=on_stale)
+    return parse_fuel_stations(raw_fuel_stations, latitude, longitude, radius_km)
@@ -0,0 +1,109 @@
+"""Brand logo asset pack.
+
+The logos shipped in `fetching land population traffic/assets/logos/` are
+resized and optimized once into `pso_common/data/logo_pack.json` (brand ->
+PNG data URI):
+
+    python -m pso_common.logos build
+
+The apps load the pack once per process and embed it in the map page, so
+markers need no external image requests. Per-marker icons reference a CSS class
+instead of repeating the image data.
+"""
+import argparse
+import base64
+import io
+import json
+import sys
+from functools import lru_cache
+from pathlib import Path
+
+import folium
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+LOGO_DIR = REPO_ROOT / "fetching land population traffic" / "assets" / "logos"
+PACK_PATH = Path(__file__).resolve().parent / "data" / "logo_pack.json"
+
+# Logos are drawn at 30px; keep 2x pixels for high-DPI screens
+PACK_SIZE = 60
+
+# -----------------------------
+# Build step
+# -----------------------------
+
+def encode_logo(path, size=PACK_SIZE):
+    """Fit a logo into a transparent size x size square and return PNG bytes."""
+    from PIL import Image
+
+    image = Image.open(path).convert("RGBA")
+    image.thumbnail((size, size), Image.LANCZOS)
+    canvas = Image.new("RGBA", (size, size), (0, 0, 0, 0))
+    canvas.paste(image, ((size - image.width) // 2, (size - image.height) // 2), image)
+
+    # Palette PNGs are several times smaller and look the same at marker size
+    canvas = canvas.quantize(colors=128, method=Image.FASTOCTREE)
+    buffer = io.BytesIO()
+    canvas.save(buffer, format="PNG", optimize=True)
+    return buffer.getvalue()
+
+def build_pack(logo_dir=LOGO_DIR, out_path=PACK_PATH, size=PACK_SIZE):
+    """Encode every <brand>.png in `logo_dir` into the JSON pack."""
+    pack = {}
+    for path in sorted(Path(logo_dir).glob("*.png")):
+        pack[path.stem.lower()] = "data:image/png;base64," + base64.b64encode(encode_logo(path, size)).decode("ascii")
+    Path(out_path).write_text(json.dumps(pack, indent=1) + "\n", encoding="utf-8")
+    load_logo_pack.cache_clear()
+    return pack
+
+# -----------------------------
+# Runtime
+# -----------------------------
+
+@lru_cache(maxsize=None)
+def load_logo_pack(path=PACK_PATH):
+    """Brand key -> data URI, loaded once per process."""
+    if Path(path).exists():
+        return json.loads(Path(path).read_text(encoding="utf-8"))
+    # Pack not built: embed the original files unmodified
+    return {
+        p.stem.lower(): "data:image/png;base64," + base64.b64encode(p.read_bytes()).decode("ascii")
+        for p in sorted(LOGO_DIR.glob("*.png"))
+    }
+
+@lru_cache(maxsize=None)
+def logo_css(path=PACK_PATH):
+    """One stylesheet with a background-image class per brand."""
+    rules = [".pso-logo{background-size:contain;background-repeat:no-repeat;background-position:center;}"]
+    for brand, uri in load_logo_pack(path).items():
+        rules.append(f".pso-logo-{brand}{{background-image:url({uri});}}")
+    return "<style>" + "".join(rules) + "</style>"
+
+def add_logo_css(folium_map):
+    """Embed the logo stylesheet once in a folium map page."""
+    folium_map.get_root().header.add_child(folium.Element(logo_css()))
+
+def has_logo(brand):
+    """True if the pack has a logo for this brand."""
+    return str(brand).lower() in load_logo_pack()
+
+def logo_icon(brand, size=30):
+    """Marker icon that draws a brand logo from the embedded stylesheet."""
+    return folium.DivIcon(
+        html=f'<div class="pso-logo pso-logo-{str(brand).lower()}" style="width:{size}px;height:{size}px;"></div>',
+        icon_size=(size, size),
+        icon_anchor=(size // 2, size // 2),
+    )
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build the brand logo asset pack")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="Resize and encode assets/logos/*.png")
+    build.add_argument("--size", type=int, default=PACK_SIZE, help="Square size in pixels")
+    args = parser.parse_args(argv)
+
+    pack = build_pack(size=args.size)
+    total = sum(len(uri) for uri in pack.values())
+    print(f"Packed {len(pack)} logos into {PACK_PATH} ({total / 1024:.1f} KB of data URIs)")
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,307 @@
+"""Folium layers for drawing many stations cheaply.
+
+Instead of one `folium.Marker` (with its own icon and popup HTML) per station,
+all stations go into a single client-side clustered layer. Only the raw
+properties are shipped; icons and popups are built in the browser.
+
+`FilterableStationLayer` also ships a filter control (brand, distance, fuel
+types) that shows and hides the markers in the browser, so the map is built
+once per dataset and filtering never goes back to Python. A `StationList`
+under the map follows the same filters.
+"""
+import json
+import os
+
+from folium import MacroElement
+from folium.plugins import FastMarkerCluster
+from folium.template import Template
+
+from pso_common.station_table import FUEL_TYPES
+
+# Above this many stations the fuel finder switches to the clustered layer
+CLUSTER_THRESHOLD = int(os.environ.get("FUEL_CLUSTER_THRESHOLD", 150))
+
+# Properties copied into each feature
+STATION_PROPERTIES = ("name", "brand", "distance", "address", "fuel_types", "phone", "opening_hours", "website")
+
+_CALLBACK = """
+(function () {
+    var icons = %(icons)s;
+    var iconSize = %(icon_size)d;
+    function esc(value) {
+        return String(value === null || value === undefined ? "" : value)
+            .replace(/&/g, "&amp;").replace(/</g, "&lt;").replace(/>/g, "&gt;")
+            .replace(/"/g, "&quot;");
+    }
+    function popupHtml(p) {
+        var fuel = p.fuel_types && p.fuel_types.length ? p.fuel_types.join(", ") : "Not specified";
+        return '<div style="width: 250px;">' +
+            '<h4>' + esc(p.name) + '</h4>' +
+            '<p><strong>Brand:</strong> ' + esc(p.brand) + '</p>' +
+            '<p><strong>Distance:</strong> ' + esc(p.distance) + ' km</p>' +
+            '<p><strong>Address:</strong> ' + esc(p.address) + '</p>' +
+            '<p><strong>Fuel Types:</strong> ' + esc(fuel) + '</p>' +
+            '<p><strong>Phone:</strong> ' + esc(p.phone) + '</p>' +
+            '<p><strong>Hours:</strong> ' + esc(p.opening_hours) + '</p>' +
+            '</div>';
+    }
+    return function (row) {
+        var p = row[2];
+        var url = icons[String(p.brand).toLowerCase()];
+        var icon = url
+            ? L.icon({iconUrl: url, iconSize: [iconSize, iconSize]})
+            : L.AwesomeMarkers.icon({icon: "tint", markerColor: "green", prefix: "glyphicon"});
+        var marker = L.marker(new L.LatLng(row[0], row[1]), {icon: icon});
+        marker.bindPopup(function () { return popupHtml(p); }, {maxWidth: 300});
+        return marker;
+    };
+})()
+"""
+
+def station_rows(stations):
+    """[lat, lon, properties] rows for the clustered layer."""
+    return [
+        [s["lat"], s["lon"], {key: s.get(key) for key in STATION_PROPERTIES}]
+        for s in stations
+    ]
+
+class FilterableStationLayer(FastMarkerCluster):
+    """Stations with an in-map control filtering them by brand, distance and fuel type in the browser.
+
+    With `cluster=False` the markers go into a plain feature group instead of a cluster.
+    """
+
+    _template = Template(
+        """
+        {% macro script(this, kwargs) %}
+            var {{ this.get_name() }} = (function(){
+                {{ this.callback }}
+
+                var data = {{ this.data|tojson }};
+                var filters = {{ this.filters|tojson }};
+                {%- if this.cluster %}
+                var layer = L.markerClusterGroup({{ this.options|tojavascript }});
+                {%- else %}
+                var layer = L.featureGroup();
+                {%- endif %}
+                var markers = data.map(function (row) { return callback(row); });
+                // Rows passing the filters, and listeners called with them after every change
+                layer.allRows = data;
+                layer.visibleRows = data;
+                layer.onFilter = [];
+
+                function matches(p, brand, maxDistance, fuels) {
+                    if (brand && p.brand !== brand) return false;
+                    // Unknown distances are kept, as StationTable.filter does
+                    if (p.distance !== null && p.distance > maxDistance) return false;
+                    for (var i = 0; i < fuels.length; i++) {
+                        if (!p.fuel_types || p.fuel_types.indexOf(fuels[i]) < 0) return false;
+                    }
+                    return true;
+                }
+
+                function element(tag, parent, text) {
+                    var node = document.createElement(tag);
+                    if (text !== undefined) node.textContent = text;
+                    parent.appendChild(node);
+                    return node;
+                }
+
+                var control = L.control({position: "topright"});
+                control.onAdd = function () {
+                    var div = L.DomUtil.create("div", "leaflet-bar pso-station-filter");
+                    div.style.cssText = "background: #fff; color: #333; padding: 6px 8px; font: 12px sans-serif; max-width: 200px;";
+                    element("strong", div, "Filter stations");
+
+                    var brandRow = element("div", div);
+                    var brand = element("select", brandRow);
+                    brand.style.width = "100%";
+                    element("option", brand, "All brands").value = "";
+                    filters.brands.forEach(function (name) { element("option", brand, name).value = name; });
+
+                    var distanceRow = element("div", div, "Max distance: ");
+                    var distanceLabel = element("span", distanceRow);
+                    var distance = element("input", element("div", div));
+                    distance.type = "range";
+                    distance.min = filters.min_distance;
+                    distance.max = filters.max_distance;
+                    distance.step = filters.distance_step;
+                    distance.value = filters.max_distance;
+                    distance.style.width = "100%";
+
+                    var fuels = filters.fuel_types.map(function (name) {
+                        var label = element("label", element("div", div));
+                        var box = element("input", label);
+                        box.type = "checkbox";
+                        box.value = name;
+                        label.appendChild(document.createTextNode(" " + name));
+                        return box;
+                    });
+                    var count = element("div", div);
+
+                    function apply() {
+                        var maxDistance = parseFloat(distance.value);
+                        var required = fuels.filter(function (box) { return box.checked; })
+                                            .map(function (box) { return box.value; });
+                        var visible = [], rows = [];
+                        data.forEach(function (row, i) {
+                            if (matches(row[2], brand.value, maxDistance, required)) {
+                                visible.push(markers[i]);
+                                rows.push(row);
+                            }
+                        });
+                        layer.clearLayers();
+                        if (layer.addLayers) {
+                            layer.addLayers(visible);
+                        } else {
+                            visible.forEach(function (marker) { layer.addLayer(marker); });
+                        }
+                        distanceLabel.textContent = maxDistance.toFixed(1) + " km";
+                        count.textContent = visible.length + " of " + markers.length + " stations";
+                        layer.visibleRows = rows;
+                        layer.onFilter.forEach(function (listener) { listener(rows); });
+                    }
+
+                    // Coalesce slider drags into one refilter per frame
+                    var pending = false;
+                    function schedule() {
+                        if (pending) return;
+                        pending = true;
+                        L.Util.requestAnimFrame(function () { pending = false; apply(); });
+                    }
+                    div.addEventListener("input", schedule);
+                    div.addEventListener("change", schedule);
+                    L.DomEvent.disableClickPropagation(div);
+                    L.DomEvent.disableScrollPropagation(div);
+                    apply();
+                    return div;
+                };
+
+                layer.addTo({{ this._parent.get_name() }});
+                control.addTo({{ this._parent.get_name() }});
+                return layer;
+            })();
+        {% endmacro %}"""
+    )
+
+    def __init__(self, stations, icon_urls, max_distance, cluster=True, icon_size=30,
+                 distance_step=0.5, name="Fuel Stations", **kwargs):
+        callback = _CALLBACK % {"icons": json.dumps(icon_urls), "icon_size": icon_size}
+        super().__init__(station_rows(stations), callback=callback.strip(), name=name, **kwargs)
+        self._name = "FilterableStationLayer"
+        self.cluster = cluster
+        brands = {s.get("brand") for s in stations} - {None, "", "Unknown"}
+        fuel_types = {fuel for s in stations for fuel in s.get("fuel_types") or ()}
+        self.filters = {
+            "brands": sorted(brands, key=str.lower),
+            "fuel_types": [fuel for fuel in FUEL_TYPES if fuel in fuel_types],
+            "min_distance": min(distance_step, max_distance),
+            "max_distance": max_distance,
+            "distance_step": distance_step,
+        }
+
+def add_filterable_stations(folium_map, stations, icon_urls, max_distance, cluster=True, icon_size=30):
+    """Add all stations to `folium_map` with a browser-side brand / distance / fuel filter control."""
+    layer = FilterableStationLayer(stations, icon_urls, max_distance, cluster=cluster, icon_size=icon_size)
+    layer.add_to(folium_map)
+    return layer
+
+class StationList(MacroElement):
+    """Sortable station details list below the map, showing the rows its layer's filters let through."""
+
+    _template = Template(
+        """
+        {% macro html(this, kwargs) %}
+            <div id="{{ this.get_name() }}" class="pso-station-list"
+                 style="font: 14px sans-serif; padding: 8px 4px; max-height: {{ this.height }}px; overflow-y: auto;"></div>
+        {% endmacro %}
+
+        {% macro script(this, kwargs) %}
+            (function () {
+                var layer = {{ this.layer.get_name() }};
+                var total = layer.allRows.length;
+                var root = document.getElementById({{ this.get_name()|tojson }});
+                var state = {rows: layer.visibleRows, sort: "distance", mode: "Compact"};
+
+                function esc(value) {
+                    return String(value === null || value === undefined ? "" : value)
+                        .replace(/&/g, "&amp;").replace(/</g, "&lt;").replace(/>/g, "&gt;")
+                        .replace(/"/g, "&quot;");
+                }
+                function key(row) {
+                    var p = row[2];
+                    if (state.sort === "distance") return p.distance === null ? Infinity : p.distance;
+                    return String(p[state.sort]).toLowerCase();
+                }
+                function compare(a, b) {
+                    var x = key(a), y = key(b);
+                    return x < y ? -1 : x > y ? 1 : 0;
+                }
+                function item(row, i) {
+                    var p = row[2];
+                    var distance = p.distance === null ? "N/A" : p.distance;
+                    var fuel = p.fuel_types && p.fuel_types.length ? p.fuel_types.join(", ") : "Not specified";
+                    if (state.mode === "Compact") {
+                        return '<p><b>' + (i + 1) + '. ' + esc(p.name) + '</b> (' + esc(p.brand) + ')<br>' +
+                            '📍 ' + esc(p.address) + ' • 📏 ' + esc(distance) + ' km</p>';
+                    }
+                    var url = "https://www.google.com/maps/dir/?api=1&destination=" + row[0] + "," + row[1];
+                    return '<div style="border-bottom: 1px solid #ddd; padding: 6px 0;">' +
+                        '<b>' + (i + 1) + '. ' + esc(p.name) + '</b><br>' +
+                        '🏢 Brand: ' + esc(p.brand) + '<br>' +
+                        '📍 Address: ' + esc(p.address) + '<br>' +
+                        '📏 Distance: ' + esc(distance) + ' km<br>' +
+                        '⛽ Fuel Types: ' + esc(fuel) + '<br>' +
+                        '📞 Phone: ' + esc(p.phone) + '<br>' +
+                        '🕒 Hours: ' + esc(p.opening_hours) + '<br>' +
+                        (p.website && p.website !== "N/A" ? '🌐 Website: ' + esc(p.website) + '<br>' : '') +
+                        '<a href="' + url + '" target="_blank" rel="noopener">📍 Directions</a></div>';
+                }
+
+                root.innerHTML =
+                    '<h3 style="margin: 4px 0;"></h3>' +
+                    '<div style="margin-bottom: 6px;">Display: ' +
+                    '<label><input type="radio" name="mode" value="Compact" checked> Compact</label> ' +
+                    '<label><input type="radio" name="mode" value="Detailed"> Detailed</label>' +
+                    ' &nbsp; Sort by: <select><option value="distance">Distance</option>' +
+                    '<option value="name">Name</option><option value="brand">Brand</option></select></div>' +
+                    '<div></div>';
+                var title = root.children[0], items = root.children[2];
+
+                function draw() {
+                    var rows = state.rows.slice().sort(compare);
+                    title.textContent = "📋 Fuel Station Details (" + rows.length + " of " + total + " stations)";
+                    items.innerHTML = rows.length
+                        ? rows.map(item).join("")
+                        : "<p>No fuel stations match your current filters.</p>";
+                }
+                root.querySelector("select").addEventListener("change", function (e) {
+                    state.sort = e.target.value;
+                    draw();
+                });
+                root.querySelectorAll("input[name=mode]").forEach(function (radio) {
+                    radio.addEventListener("change", function (e) {
+                        state.mode = e.target.value;
+                        draw();
+                    });
+                });
+                layer.onFilter.push(function (rows) {
+                    state.rows = rows;
+                    draw();
+                });
+                draw();
+            })();
+        {% endmacro %}"""
+    )
+
+    def __init__(self, layer, height=400):
+        super().__init__()
+        self._name = "StationList"
+        self.layer = layer
+        self.height = height
+
+def add_station_list(folium_map, layer, height=400):
+    """Add a details list below `folium_map` that follows `layer`'s filters."""
+    station_list = StationList(layer, height=height)
+    station_list.add_to(folium_map)
+    return station_list
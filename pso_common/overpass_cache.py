@@ -0,0 +1,183 @@
+"""Persistent on-disk cache for Overpass API responses.
+
+Responses are stored zlib-compressed in a small SQLite database, keyed by the
+normalized query text. Each query type (fuel, landuse, ...) has its own TTL and
+the database is kept under a byte budget by evicting least recently used rows.
+"""
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import zlib
+from functools import lru_cache
+from pathlib import Path
+
+# -----------------------------
+# Configuration
+# -----------------------------
+
+DEFAULT_CACHE_PATH = os.environ.get(
+    "OVERPASS_CACHE_PATH",
+    str(Path.home() / ".cache" / "pso" / "overpass.sqlite"),
+)
+DEFAULT_MAX_BYTES = int(os.environ.get("OVERPASS_CACHE_MAX_BYTES", 256 * 1024 * 1024))
+
+# Seconds a response stays fresh, per query type
+QUERY_TTLS = {
+    "fuel": 24 * 3600,       # Stations change rarely
+    "landuse": 7 * 24 * 3600,  # Land use changes even more rarely
+    "default": 6 * 3600,
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    query_type TEXT NOT NULL,
+    payload BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    created REAL NOT NULL,
+    accessed REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed);
+"""
+
+# -----------------------------
+# Query helpers
+# -----------------------------
+
+def normalize_query(query):
+    """Collapse whitespace so equivalent queries share one cache key."""
+    text = re.sub(r"\s+", " ", query or "").strip()
+    return re.sub(r"\s*([;(){}\[\],])\s*", r"\1", text)
+
+def classify_query(query):
+    """Guess the query type used to pick a TTL (combined queries get the shorter fuel TTL)."""
+    if '"amenity"' in query and ("fuel" in query or "gas_station" in query):
+        return "fuel"
+    if '"landuse"' in query:
+        return "landuse"
+    return "default"
+
+def query_key(query):
+    """Stable cache key for a query."""
+    return hashlib.sha256(normalize_query(query).encode("utf-8")).hexdigest()
+
+# -----------------------------
+# Cache
+# -----------------------------
+
+class OverpassCache:
+    """SQLite-backed response cache with per-type TTL and LRU size bound."""
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_bytes=DEFAULT_MAX_BYTES, ttls=None):
+        self.path = str(path)
+        self.max_bytes = max_bytes
+        self.ttls = dict(QUERY_TTLS, **(ttls or {}))
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        if self.path != ":memory:":
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.executescript(SCHEMA)
+
+    def ttl_for(self, query_type):
+        """TTL in seconds for a query type."""
+        return self.ttls.get(query_type, self.ttls["default"])
+
+    def get(self, query):
+        """Return the raw cached response bytes, or None on miss/expiry."""
+        key = query_key(query)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT query_type, payload, created FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or now - row[2] > self.ttl_for(row[0]):
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.hits += 1
+        return zlib.decompress(row[1])
+
+    def get_json(self, query):
+        """Return the cached response decoded as JSON, or None."""
+        payload = self.get(query)
+        return json.loads(payload) if payload is not None else None
+
+    def get_stale(self, query):
+        """Return (raw bytes, age in seconds) for a query even if expired, or None.
+
+        Used to keep serving the last good response while Overpass is down;
+        does not count as a hit or miss.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT payload, created FROM responses WHERE key = ?", (query_key(query),)
+            ).fetchone()
+        if row is None:
+            return None
+        return zlib.decompress(row[0]), time.time() - row[1]
+
+    def get_stale_json(self, query):
+        """Like get_stale, with the payload decoded as JSON."""
+        entry = self.get_stale(query)
+        return (json.loads(entry[0]), entry[1]) if entry is not None else None
+
+    def put(self, query, payload, query_type=None):
+        """Store raw response bytes (or a JSON-serializable object) for a query."""
+        if not isinstance(payload, (bytes, bytearray)):
+            payload = json.dumps(payload).encode("utf-8")
+        blob = zlib.compress(bytes(payload), 6)
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)",
+                (query_key(query), query_type or classify_query(query), blob, len(blob), now, now),
+            )
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        """Drop least recently used rows until the cache fits its byte budget."""
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        rows = self._conn.execute("SELECT key, size FROM responses ORDER BY accessed ASC")
+        doomed = []
+        for key, size in rows:
+            if total <= self.max_bytes:
+                break
+            doomed.append((key,))
+            total -= size
+        self._conn.executemany("DELETE FROM responses WHERE key = ?", doomed)
+
+    def clear(self):
+        """Remove every cached response."""
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+
+    def stats(self):
+        """Hit/miss counters for this process plus on-disk size."""
+        with self._lock:
+            entries, size = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses"
+            ).fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": entries,
+            "bytes": size,
+        }
+
+@lru_cache(maxsize=None)
+def get_cache():
+    """Process-wide cache instance (survives Streamlit reruns)."""
+    return OverpassCache()
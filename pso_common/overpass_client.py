@@ -0,0 +1,336 @@
+"""Shared Overpass API client.
+
+One pooled keep-alive session (gzip responses) for both apps, talking to a list
+of Overpass mirrors. A query goes to the currently fastest mirror; if it has not
+answered within the hedge budget a second mirror gets the same query and
+whichever answers first wins. A mirror that fails is replaced by the next one
+straight away.
+
+Each mirror has a circuit breaker: after a few consecutive failures it is not
+called again until a cooldown has passed, and when every breaker is open
+`fetch` raises `CircuitOpenError` at once instead of waiting on timeouts. Only
+server errors (5xx), timeouts and connection errors count as failures. A
+rejected query (other 4xx) is raised as `QueryError` without trying another
+mirror, and a rate-limited mirror (429) is skipped for its Retry-After while
+the query moves on to the next one.
+
+Mirrors come from `OVERPASS_MIRRORS` (comma separated), the hedge budget in
+seconds from `OVERPASS_HEDGE_AFTER`, the breaker cooldown in seconds from
+`OVERPASS_BREAKER_COOLDOWN`.
+
+`iter_elements` streams a response: the body is spooled to a temporary file
+(in memory while small) and its elements are parsed one at a time.
+"""
+import asyncio
+import email.utils
+import io
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from functools import lru_cache
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from pso_common.overpass_stream import StreamDecodeError, iter_elements
+from pso_common.perf import Span, span
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MIRRORS = (
+    "https://overpass-api.de/api/interpreter",
+    "https://overpass.kumi.systems/api/interpreter",
+    "https://overpass.private.coffee/api/interpreter",
+)
+DEFAULT_HEDGE_AFTER = 3.0
+DEFAULT_TIMEOUT = 30
+
+# Never have more than this many mirrors working on one query at once
+MAX_IN_FLIGHT = 2
+
+# Consecutive failures that open a mirror's breaker, and how long it stays open
+BREAKER_FAILURES = 3
+DEFAULT_BREAKER_COOLDOWN = 60.0
+
+# Wait on a 429 without a usable Retry-After, and the longest wait honoured
+DEFAULT_RETRY_AFTER = 30.0
+MAX_RETRY_AFTER = 600.0
+
+# Streamed bodies larger than this are spooled to disk instead of memory
+SPOOL_MAX_BYTES = 1024 * 1024
+STREAM_CHUNK_BYTES = 64 * 1024
+
+# Weight of the newest sample in each mirror's latency average
+_EWMA_ALPHA = 0.3
+
+def configured_mirrors():
+    """Mirror URLs from OVERPASS_MIRRORS, or the defaults."""
+    value = os.environ.get("OVERPASS_MIRRORS", "")
+    mirrors = [url.strip() for url in value.split(",") if url.strip()]
+    return tuple(mirrors) or DEFAULT_MIRRORS
+
+def _decode(body):
+    """JSON body, with decode errors raised as requests errors like `Response.json()` does."""
+    try:
+        return json.loads(body)
+    except ValueError as e:
+        raise requests.exceptions.InvalidJSONError(f"Overpass returned invalid JSON: {e}") from e
+
+def _retry_after(response):
+    """Seconds from a Retry-After header (delay or HTTP date), within [0, MAX_RETRY_AFTER]."""
+    value = response.headers.get("Retry-After", "").strip()
+    try:
+        seconds = float(value)
+    except ValueError:
+        try:
+            seconds = email.utils.parsedate_to_datetime(value).timestamp() - time.time()
+        except (TypeError, ValueError):
+            seconds = DEFAULT_RETRY_AFTER
+    return min(max(seconds, 0.0), MAX_RETRY_AFTER)
+
+def _discard(future):
+    """Close the spooled body of a hedged request that lost."""
+    if not future.cancelled() and future.exception() is None:
+        _, body = future.result()
+        if hasattr(body, "close"):
+            body.close()
+
+def _abandon(cancelled, futures):
+    """Stop in-flight requests that are no longer needed and release their bodies."""
+    cancelled.set()
+    for future in futures:
+        if not future.cancel():
+            future.add_done_callback(_discard)
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """Every mirror's circuit breaker is open; no request was sent."""
+
+class QueryError(requests.exceptions.HTTPError):
+    """A mirror rejected the query itself (4xx other than 429); other mirrors would too."""
+
+class RateLimitedError(requests.exceptions.HTTPError):
+    """A mirror answered 429; `retry_after` is how long it asked us to wait."""
+
+    def __init__(self, *args, retry_after=DEFAULT_RETRY_AFTER, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.retry_after = retry_after
+
+class OverpassClient:
+    """Pooled, hedged Overpass client; safe to share between threads."""
+
+    def __init__(self, mirrors=None, hedge_after=DEFAULT_HEDGE_AFTER, timeout=DEFAULT_TIMEOUT, pool_size=8,
+                 breaker_cooldown=DEFAULT_BREAKER_COOLDOWN):
+        self.mirrors = tuple(mirrors or configured_mirrors())
+        self.hedge_after = hedge_after
+        self.timeout = timeout
+        self.breaker_cooldown = breaker_cooldown
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=len(self.mirrors), pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update({
+            "Accept-Encoding": "gzip, deflate",
+            "User-Agent": "pso-project/1.0 (+https://github.com/Mirza-Abdul-Wasay5704/PSO-Project)",
+        })
+        self._executor = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix="overpass")
+
+        self._lock = threading.Lock()
+        self._latency = {url: 0.0 for url in self.mirrors}
+        self._stats = {url: {"requests": 0, "failures": 0, "wins": 0} for url in self.mirrors}
+        self._consecutive_failures = {url: 0 for url in self.mirrors}
+        self._open_until = {url: 0.0 for url in self.mirrors}
+        self.hedges = 0
+
+    # -----------------------------
+    # Mirror bookkeeping
+    # -----------------------------
+
+    def _ranked_mirrors(self):
+        """Mirrors with a closed (or cooled-down) breaker, ordered by recent latency."""
+        now = time.monotonic()
+        with self._lock:
+            available = [url for url in self.mirrors if self._open_until[url] <= now]
+            return sorted(available, key=lambda url: self._latency[url])
+
+    def retry_after(self):
+        """Seconds until the first open breaker lets a request through (0 if one is closed)."""
+        with self._lock:
+            return max(0.0, min(self._open_until.values()) - time.monotonic())
+
+    def _record(self, url, seconds, ok):
+        """Count a request; `seconds=None` leaves the latency average alone."""
+        with self._lock:
+            stats = self._stats[url]
+            stats["requests"] += 1
+            if ok:
+                self._consecutive_failures[url] = 0
+            else:
+                stats["failures"] += 1
+                # Push failing mirrors to the back until they recover
+                seconds = max(seconds, self.timeout)
+                self._consecutive_failures[url] += 1
+                if self._consecutive_failures[url] >= BREAKER_FAILURES:
+                    # Open (or re-open after a failed half-open try)
+                    self._open_until[url] = time.monotonic() + self.breaker_cooldown
+                    logger.warning("Circuit breaker open for %s", url)
+            if seconds is None:
+                return
+            previous = self._latency[url]
+            self._latency[url] = seconds if not previous else (1 - _EWMA_ALPHA) * previous + _EWMA_ALPHA * seconds
+
+    def stats(self):
+        """Per-mirror request/failure/win counts, latency average and breaker state, plus hedge count."""
+        now = time.monotonic()
+        with self._lock:
+            mirrors = {
+                url: dict(self._stats[url], latency=round(self._latency[url], 3),
+                          open=self._open_until[url] > now)
+                for url in self.mirrors
+            }
+            return {"mirrors": mirrors, "hedges": self.hedges}
+
+    def _rate_limited(self, url, retry_after):
+        """Keep a mirror that answered 429 out of rotation for `retry_after` seconds."""
+        with self._lock:
+            self._stats[url]["requests"] += 1
+            self._open_until[url] = max(self._open_until[url], time.monotonic() + retry_after)
+        logger.warning("Overpass mirror %s is rate limiting; retrying it in %.0fs", url, retry_after)
+
+    # -----------------------------
+    # Requests
+    # -----------------------------
+
+    def _post(self, url, query, spool=False, cancelled=None):
+        """One request to one mirror; returns (url, body bytes or a spooled file at offset 0).
+
+        The body is read in chunks; once `cancelled` is set (another mirror won)
+        the download stops and the body is None. A 429 raises `RateLimitedError`
+        and any other 4xx `QueryError`; neither counts against the breaker.
+        """
+        start = time.perf_counter()
+        body = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES) if spool else io.BytesIO()
+        try:
+            with self.session.post(url, data={"data": query}, timeout=self.timeout, stream=True) as response:
+                if response.status_code == 429:
+                    retry_after = _retry_after(response)
+                    self._rate_limited(url, retry_after)
+                    raise RateLimitedError(f"429 Too Many Requests from {url}", response=response,
+                                           retry_after=retry_after)
+                if 400 <= response.status_code < 500:
+                    # The mirror is healthy; the query is what failed
+                    self._record(url, None, ok=True)
+                    raise QueryError(f"{response.status_code} {response.reason} from {url}: "
+                                     f"{response.text.strip()[:300]}", response=response)
+                response.raise_for_status()
+                for chunk in response.iter_content(STREAM_CHUNK_BYTES):
+                    if cancelled is not None and cancelled.is_set():
+                        body.close()
+                        return url, None
+                    body.write(chunk)
+        except (QueryError, RateLimitedError):
+            body.close()
+            raise
+        except requests.exceptions.RequestException:
+            body.close()
+            self._record(url, time.perf_counter() - start, ok=False)
+            raise
+        except BaseException:
+            body.close()
+            raise
+        self._record(url, time.perf_counter() - start, ok=True)
+        if spool:
+            body.seek(0)
+            return url, body
+        return url, body.getvalue()
+
+    def fetch(self, query, spool=False):
+        """Raw response body for `query`; raises the last error if every mirror fails.
+
+        With `spool=True` the body is a temporary file object instead of bytes.
+        """
+        with span("overpass.fetch", bytes=0) as s:
+            body = self._fetch(query, spool)
+            if spool:
+                s.add(bytes=body.seek(0, os.SEEK_END))
+                body.seek(0)
+            else:
+                s.add(bytes=len(body))
+        return body
+
+    def _fetch(self, query, spool):
+        """Race the ranked mirrors for `query`, hedging on slow ones."""
+        mirrors = self._ranked_mirrors()
+        if not mirrors:
+            raise CircuitOpenError(f"All Overpass mirrors are unavailable; retrying in {self.retry_after():.0f}s")
+        cancelled = threading.Event()
+        pending = {self._executor.submit(self._post, mirrors.pop(0), query, spool, cancelled)}
+        last_error = None
+        while pending:
+            can_hedge = mirrors and len(pending) < MAX_IN_FLIGHT
+            done, pending = wait(pending, timeout=self.hedge_after if can_hedge else None,
+                                 return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    url, body = future.result()
+                except QueryError:
+                    # Every mirror would reject it the same way
+                    _abandon(cancelled, pending | (done - {future}))
+                    raise
+                except requests.exceptions.RequestException as e:
+                    logger.warning("Overpass mirror failed: %s", e)
+                    last_error = e
+                    continue
+                with self._lock:
+                    self._stats[url]["wins"] += 1
+                # Stop the losing hedges and release whatever they already downloaded
+                _abandon(cancelled, pending | (done - {future}))
+                return body
+
+            if mirrors and (done or len(pending) < MAX_IN_FLIGHT):
+                if not done:
+                    # Budget ran out with no answer: hedge on the next mirror
+                    with self._lock:
+                        self.hedges += 1
+                pending.add(self._executor.submit(self._post, mirrors.pop(0), query, spool, cancelled))
+        raise last_error
+
+    def fetch_json(self, query):
+        """Decoded JSON response for `query`."""
+        return _decode(self.fetch(query))
+
+    def iter_elements(self, query):
+        """Yield the response's elements one at a time without decoding the whole body."""
+        with self.fetch(query, spool=True) as body:
+            try:
+                yield from Span("overpass.parse").wrap(iter_elements(body))
+            except StreamDecodeError as e:
+                raise requests.exceptions.InvalidJSONError(f"Overpass returned invalid JSON: {e}") from e
+
+    async def afetch(self, query):
+        """Async `fetch`, for gathering several queries concurrently.
+
+        Not native async I/O: the blocking `fetch` runs on the event loop's default
+        thread pool executor, so concurrency is bounded by that pool.
+        """
+        return await asyncio.get_running_loop().run_in_executor(None, self.fetch, query)
+
+    async def afetch_json(self, query):
+        """Async `fetch_json`."""
+        return _decode(await self.afetch(query))
+
+    async def afetch_many(self, queries):
+        """JSON responses for several queries, fetched concurrently, in input order."""
+        return await asyncio.gather(*(self.afetch_json(query) for query in queries))
+
+@lru_cache(maxsize=None)
+def get_client():
+    """Process-wide client configured from the environment."""
+    return OverpassClient(
+        hedge_after=float(os.environ.get("OVERPASS_HEDGE_AFTER", DEFAULT_HEDGE_AFTER)),
+        breaker_cooldown=float(os.environ.get("OVERPASS_BREAKER_COOLDOWN", DEFAULT_BREAKER_COOLDOWN)),
+    )
@@ -0,0 +1,521 @@
+"""Local stand-in for the Overpass interpreter, for offline runs and load tests.
+
+Speaks the subset of Overpass QL both apps send: `node`/`way`/`relation`
+statements with tag filters (`["k"]`, `["k"="v"]`, `["k"~"regex"]`) and a bbox
+or `around:` filter, unioned, then `out center`, `out body` or `out geom`
+(optionally with `meta`). Answers come from recorded sessions or a local
+extract, with optional injected latency and errors:
+
+    python -m pso_common.overpass_server --extract lahore.osm.pbf
+    python -m pso_common.overpass_server --sessions recorded/ --upstream https://overpass-api.de/api/interpreter
+    python -m pso_common.overpass_server --sessions recorded/ --latency 2 --jitter 1 --error-rate 0.1
+
+Point both apps at it with
+`OVERPASS_MIRRORS=http://127.0.0.1:8765/api/interpreter`.
+"""
+import argparse
+import gzip
+import json
+import logging
+import math
+import random
+import re
+import sys
+import threading
+import time
+import xml.etree.ElementTree as ET
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+
+from pso_common.overpass_cache import query_key
+from pso_common.overpass_stream import iter_elements
+from pso_common.station_index import FUEL_AMENITIES, _open, _xml_tags
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PORT = 8765
+EARTH_RADIUS_M = 6_371_008.8
+GENERATOR = "pso_common.overpass_server"
+
+class QueryError(ValueError):
+    """Query uses Overpass QL outside the supported subset."""
+
+def wanted(tags):
+    """Elements the apps query for: fuel stations and land use."""
+    return tags.get("amenity") in FUEL_AMENITIES or "landuse" in tags
+
+# -----------------------------
+# Readers
+# -----------------------------
+
+def _meta(version, timestamp):
+    meta = {"version": int(version)} if version else {}
+    if timestamp:
+        meta["timestamp"] = timestamp
+    return meta
+
+def read_overpass_json(path):
+    """Elements of a saved Overpass JSON response (any `out` mode), as stored."""
+    with _open(path) as f:
+        return list(iter_elements(f))
+
+def read_osm_xml(path):
+    """Fuel and land use nodes, ways and relations with geometry from an OSM XML extract.
+
+    Three passes: relations first (to learn which member ways are needed),
+    then ways, then the coordinates of every node those ways use.
+    """
+    relations = []
+    member_ways = set()
+    with _open(path) as f:
+        for _, elem in ET.iterparse(f, events=("end",)):
+            if elem.tag == "relation":
+                tags = _xml_tags(elem)
+                if wanted(tags):
+                    members = [{"type": m.get("type"), "ref": int(m.get("ref")), "role": m.get("role", "")}
+                               for m in elem.iter("member")]
+                    member_ways.update(m["ref"] for m in members if m["type"] == "way")
+                    relations.append(dict({"type": "relation", "id": int(elem.get("id")), "members": members,
+                                           "tags": tags}, **_meta(elem.get("version"), elem.get("timestamp"))))
+                elem.clear()
+            elif elem.tag in ("node", "way"):
+                elem.clear()
+
+    ways = {}
+    with _open(path) as f:
+        for _, elem in ET.iterparse(f, events=("end",)):
+            if elem.tag == "way":
+                way_id = int(elem.get("id"))
+                tags = _xml_tags(elem)
+                if wanted(tags) or way_id in member_ways:
+                    ways[way_id] = dict({"type": "way", "id": way_id, "nodes": [int(nd.get("ref")) for nd in elem.iter("nd")],
+                                         "tags": tags}, **_meta(elem.get("version"), elem.get("timestamp")))
+                elem.clear()
+            elif elem.tag in ("node", "relation"):
+                elem.clear()
+
+    refs = {ref for way in ways.values() for ref in way["nodes"]}
+    coords = {}
+    elements = []
+    with _open(path) as f:
+        for _, elem in ET.iterparse(f, events=("end",)):
+            if elem.tag == "node":
+                node_id = int(elem.get("id"))
+                if node_id in refs:
+                    coords[node_id] = (float(elem.get("lat")), float(elem.get("lon")))
+                tags = _xml_tags(elem)
+                if wanted(tags):
+                    elements.append(dict({"type": "node", "id": node_id, "lat": float(elem.get("lat")),
+                                          "lon": float(elem.get("lon")), "tags": tags},
+                                         **_meta(elem.get("version"), elem.get("timestamp"))))
+                elem.clear()
+            elif elem.tag in ("way", "relation"):
+                elem.clear()
+
+    for way in ways.values():
+        way["geometry"] = [{"lat": coords[ref][0], "lon": coords[ref][1]} if ref in coords else None
+                           for ref in way["nodes"]]
+    return elements + _assemble(ways, relations)
+
+def read_osm_pbf(path):
+    """Like `read_osm_xml` for an OSM PBF extract (needs `osmium`)."""
+    import osmium
+
+    def timestamp(obj):
+        return obj.timestamp.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+    class RelationHandler(osmium.SimpleHandler):
+        def __init__(self):
+            super().__init__()
+            self.relations = []
+            self.member_ways = set()
+
+        def relation(self, r):
+            if wanted(r.tags):
+                members = [{"type": {"n": "node", "w": "way", "r": "relation"}[m.type], "ref": m.ref, "role": m.role}
+                           for m in r.members]
+                self.member_ways.update(m["ref"] for m in members if m["type"] == "way")
+                self.relations.append(dict({"type": "relation", "id": r.id, "members": members,
+                                            "tags": dict(r.tags)}, **_meta(r.version, timestamp(r))))
+
+    class ElementHandler(osmium.SimpleHandler):
+        def __init__(self, member_ways):
+            super().__init__()
+            self.member_ways = member_ways
+            self.nodes = []
+            self.ways = {}
+
+        def node(self, n):
+            if wanted(n.tags) and n.location.valid():
+                self.nodes.append(dict({"type": "node", "id": n.id, "lat": n.location.lat, "lon": n.location.lon,
+                                        "tags": dict(n.tags)}, **_meta(n.version, timestamp(n))))
+
+        def way(self, w):
+            if wanted(w.tags) or w.id in self.member_ways:
+                self.ways[w.id] = dict({
+                    "type": "way", "id": w.id, "nodes": [nd.ref for nd in w.nodes], "tags": dict(w.tags),
+                    "geometry": [{"lat": nd.lat, "lon": nd.lon} if nd.location.valid() else None for nd in w.nodes],
+                }, **_meta(w.version, timestamp(w)))
+
+    relations = RelationHandler()
+    relations.apply_file(str(path))
+    elements = ElementHandler(relations.member_ways)
+    elements.apply_file(str(path), locations=True)
+    return elements.nodes + _assemble(elements.ways, relations.relations)
+
+def _assemble(ways, relations):
+    """Tagged ways plus relations whose way members carry their geometry."""
+    for relation in relations:
+        for member in relation["members"]:
+            if member["type"] == "way" and member["ref"] in ways:
+                member["geometry"] = ways[member["ref"]]["geometry"]
+    return [way for way in ways.values() if wanted(way["tags"])] + relations
+
+def read_extract(path):
+    """Pick a reader from the file extension."""
+    name = str(path).lower()
+    if name.endswith(".pbf"):
+        return read_osm_pbf(path)
+    if name.endswith((".osm", ".osm.bz2", ".osm.gz", ".xml")):
+        return read_osm_xml(path)
+    return read_overpass_json(path)
+
+# -----------------------------
+# Spatial store
+# -----------------------------
+
+def _points(element):
+    """(lat, lon) array of every coordinate an element has."""
+    if "lat" in element and "lon" in element:
+        return np.array([[element["lat"], element["lon"]]])
+    points = [p for p in element.get("geometry") or [] if p]
+    for member in element.get("members", []):
+        points.extend(p for p in member.get("geometry") or [] if p)
+        if "lat" in member:
+            points.append(member)
+    if not points and element.get("center"):
+        points = [element["center"]]
+    return np.array([[p["lat"], p["lon"]] for p in points]).reshape(-1, 2)
+
+class OsmStore:
+    """Elements with vectorized bounding boxes for bbox and `around:` queries."""
+
+    def __init__(self, elements):
+        self.elements = []
+        self.points = []
+        bounds = []
+        for element in elements:
+            points = _points(element)
+            if not len(points):
+                continue
+            self.elements.append(element)
+            self.points.append(points)
+            bounds.append((*points.min(axis=0), *points.max(axis=0)))
+        self.bounds = np.array(bounds, dtype=np.float64).reshape(-1, 4)  # minlat, minlon, maxlat, maxlon
+        self.types = np.array([e["type"] for e in self.elements], dtype=object)
+
+    def __len__(self):
+        return len(self.elements)
+
+    def bbox_candidates(self, south, west, north, east):
+        b = self.bounds
+        return np.flatnonzero((b[:, 0] <= north) & (b[:, 2] >= south) & (b[:, 1] <= east) & (b[:, 3] >= west))
+
+    def select(self, element_type, tag_filters, spatial):
+        """Indices of elements of a type matching the tag filters and spatial filter."""
+        if spatial[0] == "bbox":
+            south, west, north, east = spatial[1]
+            candidates = self.bbox_candidates(south, west, north, east)
+        else:
+            radius, lat, lon = spatial[1]
+            dlat = math.degrees(radius / EARTH_RADIUS_M)
+            dlon = dlat / max(math.cos(math.radians(lat)), 0.01)
+            candidates = self.bbox_candidates(lat - dlat, lon - dlon, lat + dlat, lon + dlon)
+        if element_type != "nwr":
+            candidates = candidates[self.types[candidates] == element_type]
+
+        selected = []
+        for i in candidates:
+            if not all(match(self.elements[i].get("tags", {})) for match in tag_filters):
+                continue
+            if spatial[0] == "around" and _min_distance_m(self.points[i], lat, lon) > radius:
+                continue
+            selected.append(int(i))
+        return selected
+
+def _min_distance_m(points, lat, lon):
+    lat1, lon1 = math.radians(lat), math.radians(lon)
+    lat2, lon2 = np.radians(points[:, 0]), np.radians(points[:, 1])
+    a = np.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return float((2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.minimum(a, 1)))).min())
+
+# -----------------------------
+# Query language subset
+# -----------------------------
+
+_STATEMENT = re.compile(r"\b(node|way|relation|nwr)((?:\[[^\]]*\])*)\(([^)]*)\)\s*;")
+_TAG_FILTER = re.compile(r'\[\s*"?([^"=~!\]]+?)"?\s*(?:(=|!=|~)\s*"([^"]*)")?\s*\]')
+_OUT = re.compile(r"\bout\b(?!:)([^;]*);")
+_NUMBER = r"\s*(-?\d+(?:\.\d+)?)\s*"
+
+def _tag_matcher(key, op, value):
+    if op is None:
+        return lambda tags: key in tags
+    if op == "=":
+        return lambda tags: tags.get(key) == value
+    if op == "!=":
+        return lambda tags: tags.get(key) != value
+    pattern = re.compile(value)
+    return lambda tags: key in tags and pattern.search(tags[key]) is not None
+
+def parse_query(query):
+    """(statements, out mode set) for a supported query; raises QueryError otherwise."""
+    if "[out:json]" not in query.replace(" ", ""):
+        raise QueryError("only [out:json] is supported")
+    statements = []
+    for element_type, filters, spatial in _STATEMENT.findall(query):
+        tag_filters = [_tag_matcher(*f) for f in _TAG_FILTER.findall(filters)]
+        bbox = re.fullmatch(",".join([_NUMBER] * 4), spatial)
+        around = re.fullmatch(r"\s*around:" + ",".join([_NUMBER] * 3), spatial)
+        if bbox:
+            statements.append((element_type, tag_filters, ("bbox", tuple(map(float, bbox.groups())))))
+        elif around:
+            statements.append((element_type, tag_filters, ("around", tuple(map(float, around.groups())))))
+        else:
+            raise QueryError(f"unsupported filter ({spatial})")
+    out = _OUT.search(query)
+    if not statements or out is None:
+        raise QueryError("expected node/way/relation statements followed by out")
+    modes = set(out.group(1).split()) or {"body"}
+    unknown = modes - {"body", "center", "geom", "meta", "qt"}
+    if unknown:
+        raise QueryError(f"unsupported out mode: {' '.join(sorted(unknown))}")
+    return statements, modes
+
+def _bounds(points):
+    return {"minlat": float(points[:, 0].min()), "minlon": float(points[:, 1].min()),
+            "maxlat": float(points[:, 0].max()), "maxlon": float(points[:, 1].max())}
+
+def format_element(element, points, modes):
+    """Element as Overpass would print it for the given `out` modes."""
+    out = {"type": element["type"], "id": element["id"]}
+    if element["type"] == "node":
+        out.update(lat=element["lat"], lon=element["lon"])
+    elif "geom" in modes:
+        out["bounds"] = _bounds(points)
+    elif "center" in modes:
+        bounds = _bounds(points)
+        out["center"] = {"lat": (bounds["minlat"] + bounds["maxlat"]) / 2,
+                         "lon": (bounds["minlon"] + bounds["maxlon"]) / 2}
+    if "meta" in modes:
+        for key in ("version", "timestamp"):
+            if key in element:
+                out[key] = element[key]
+    if element["type"] == "way" and "nodes" in element:
+        out["nodes"] = element["nodes"]
+        if "geom" in modes and element.get("geometry"):
+            out["geometry"] = element["geometry"]
+    elif element["type"] == "relation":
+        members = []
+        for member in element.get("members", []):
+            item = {"type": member["type"], "ref": member["ref"], "role": member.get("role", "")}
+            if "geom" in modes and member.get("geometry"):
+                item["geometry"] = member["geometry"]
+            members.append(item)
+        out["members"] = members
+    if element.get("tags"):
+        out["tags"] = element["tags"]
+    return out
+
+def run_query(store, query, osm_base=None):
+    """Overpass JSON response body for a query against the store."""
+    statements, modes = parse_query(query)
+    selected = set()
+    for statement in statements:
+        selected.update(store.select(*statement))
+    order = {"node": 0, "way": 1, "relation": 2}
+    ordered = sorted(selected, key=lambda i: (order[store.elements[i]["type"]], store.elements[i]["id"]))
+    return json.dumps({
+        "version": 0.6,
+        "generator": GENERATOR,
+        "osm3s": {"timestamp_osm_base": osm_base or "",
+                  "copyright": "The data included in this document is from www.openstreetmap.org. "
+                               "The data is made available under ODbL."},
+        "elements": [format_element(store.elements[i], store.points[i], modes) for i in ordered],
+    }).encode("utf-8")
+
+# -----------------------------
+# Recorded sessions
+# -----------------------------
+
+class SessionStore:
+    """Recorded responses, one gzip file per normalized query."""
+
+    def __init__(self, directory):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def path(self, query):
+        return self.directory / f"{query_key(query)}.json.gz"
+
+    def get(self, query):
+        path = self.path(query)
+        return gzip.decompress(path.read_bytes()) if path.exists() else None
+
+    def put(self, query, body):
+        path = self.path(query)
+        path.with_suffix("").with_suffix(".ql").write_text(query.strip() + "\n", encoding="utf-8")
+        tmp = path.with_suffix(".tmp")
+        tmp.write_bytes(gzip.compress(body))
+        tmp.replace(path)
+
+# -----------------------------
+# Server
+# -----------------------------
+
+class Faults:
+    """Injected latency (normal, clipped at zero) and error responses."""
+
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0, error_status=504, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def draw(self):
+        """(delay seconds, error status or None) for one request."""
+        with self._lock:
+            delay = max(0.0, self._random.gauss(self.latency, self.jitter)) if self.latency or self.jitter else 0.0
+            failed = self._random.random() < self.error_rate
+        return delay, self.error_status if failed else None
+
+class OverpassStandIn:
+    """Answers queries from sessions, then the extract, then (recording) the upstream server."""
+
+    def __init__(self, store=None, sessions=None, upstream=None, faults=None, osm_base=None):
+        self.store = store
+        self.sessions = sessions
+        self.upstream = upstream
+        self.faults = faults or Faults()
+        self.osm_base = osm_base or datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+        self.counts = {"session": 0, "extract": 0, "upstream": 0, "error": 0}
+        self._lock = threading.Lock()
+
+    def answer(self, query):
+        """(status, body bytes, source) for a query."""
+        delay, error = self.faults.draw()
+        if delay:
+            time.sleep(delay)
+        if error:
+            return error, f"Injected error {error}".encode("utf-8"), "error"
+
+        body = self.sessions.get(query) if self.sessions is not None else None
+        if body is not None:
+            return 200, body, "session"
+        if self.store is not None:
+            try:
+                return 200, run_query(self.store, query, self.osm_base), "extract"
+            except QueryError as e:
+                if not self.upstream:
+                    return 400, f"Error: {e}".encode("utf-8"), "error"
+        if self.upstream:
+            import requests
+
+            response = requests.post(self.upstream, data={"data": query}, timeout=300)
+            if response.ok and self.sessions is not None:
+                self.sessions.put(query, response.content)
+            return response.status_code, response.content, "upstream"
+        return 404, b"Error: query was not recorded", "error"
+
+    def record_count(self, source):
+        with self._lock:
+            self.counts[source] = self.counts.get(source, 0) + 1
+
+def make_handler(stand_in):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def _query(self):
+            if self.command == "POST":
+                body = self.rfile.read(int(self.headers.get("Content-Length") or 0)).decode("utf-8")
+                form = parse_qs(body)
+                return form["data"][0] if "data" in form else body
+            return parse_qs(urlparse(self.path).query).get("data", [""])[0]
+
+        def _respond(self):
+            start = time.perf_counter()
+            query = self._query()
+            status, body, source = stand_in.answer(query)
+            stand_in.record_count(source)
+            content_type = "application/json" if status == 200 else "text/plain; charset=utf-8"
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            if "gzip" in self.headers.get("Accept-Encoding", ""):
+                body = gzip.compress(body, 5)
+                self.send_header("Content-Encoding", "gzip")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            logger.info("%s %s %d from %s, %d bytes in %.0f ms", self.command, query_key(query)[:12], status,
+                        source, len(body), (time.perf_counter() - start) * 1000)
+
+        do_GET = _respond
+        do_POST = _respond
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+def serve(stand_in, host="127.0.0.1", port=DEFAULT_PORT):
+    """Run the stand-in until interrupted."""
+    server = ThreadingHTTPServer((host, port), make_handler(stand_in))
+    server.daemon_threads = True
+    print(f"Overpass stand-in on http://{host}:{server.server_port}/api/interpreter "
+          f"(OVERPASS_MIRRORS=http://{host}:{server.server_port}/api/interpreter)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(f"Served: {stand_in.counts}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Local Overpass stand-in for offline runs and load tests")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--extract", nargs="+", default=[],
+                        help=".osm.pbf (needs osmium), .osm[.bz2|.gz] extract or saved Overpass JSON")
+    parser.add_argument("--sessions", help="Directory of recorded responses (replayed first)")
+    parser.add_argument("--upstream", help="Real Overpass URL; unanswered queries are fetched and recorded")
+    parser.add_argument("--latency", type=float, default=0.0, help="Mean added latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Standard deviation of the added latency")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with an error")
+    parser.add_argument("--error-status", type=int, default=504, help="HTTP status of injected errors")
+    parser.add_argument("--seed", type=int, help="Seed for reproducible latency and errors")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+
+    if args.upstream and not args.sessions:
+        parser.error("--upstream needs --sessions to record into")
+    store = None
+    if args.extract:
+        start = time.perf_counter()
+        store = OsmStore(element for path in args.extract for element in read_extract(path))
+        print(f"Loaded {len(store)} elements in {time.perf_counter() - start:.1f}s")
+    sessions = SessionStore(args.sessions) if args.sessions else None
+    if store is None and sessions is None:
+        parser.error("give --extract and/or --sessions")
+
+    faults = Faults(args.latency, args.jitter, args.error_rate, args.error_status, args.seed)
+    serve(OverpassStandIn(store, sessions, args.upstream, faults), args.host, args.port)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,29 @@
+"""Incremental parsing of Overpass JSON responses.
+
+`iter_elements` yields the objects of a response's `elements` array one at a
+time from a file-like body, so no full response dict or element list is ever
+built. It uses `ijson` when installed and falls back to `json.load`.
+"""
+import json
+
+try:
+    import ijson
+except ImportError:  # Fall back to decoding the whole body
+    ijson = None
+
+class StreamDecodeError(ValueError):
+    """Body is not a valid Overpass JSON response."""
+
+def iter_elements(body):
+    """Yield each element of an Overpass JSON response read from a binary file object."""
+    if ijson is None:
+        try:
+            data = json.load(body)
+        except ValueError as e:
+            raise StreamDecodeError(str(e)) from e
+        yield from data.get("elements", [])
+        return
+    try:
+        yield from ijson.items(body, "elements.item", use_float=True)
+    except ijson.JSONError as e:
+        raise StreamDecodeError(str(e)) from e
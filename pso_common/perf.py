@@ -0,0 +1,267 @@
+"""Lightweight per-stage timing spans.
+
+Wrap a stage in a span to record its wall time plus byte and element counts:
+
+    with span("fuel.dedupe", elements=len(records)) as s:
+        merged = merge_duplicates(records)
+        s.add(kept=len(merged))
+
+A span can also be entered several times and finished once, for work spread
+over a generator (`s = Span(...)`, `with s: ...` per item, `s.finish()`), or
+wrap an iterator so only the time spent producing each item counts
+(`for item in Span("overpass.parse").wrap(items): ...`). Spans measure self
+time: while a span is open on a thread, any span entered inside it pauses it,
+so chained generators each get only their own share.
+
+Every finished span is kept in a rolling window per stage (p50/p95), logged as
+one JSON line on the `pso_common.perf` logger (also appended to the file in
+`PSO_PERF_LOG`), and exported in Prometheus text format to the file in
+`PSO_METRICS_FILE` and/or on `http://0.0.0.0:$PSO_METRICS_PORT/metrics`.
+The apps show the spans of the current run in a sidebar *Performance* panel.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Samples kept per stage for the quantiles
+WINDOW = 1000
+QUANTILES = (0.5, 0.95)
+# Minimum seconds between rewrites of the metrics file
+METRICS_WRITE_INTERVAL = 5.0
+
+_local = threading.local()
+
+def _stack():
+    """Spans currently open on this thread, innermost last."""
+    if not hasattr(_local, "stack"):
+        _local.stack = []
+    return _local.stack
+
+class Span:
+    """Wall time and counts of one stage; may be entered several times before `finish`."""
+
+    def __init__(self, name, **counts):
+        self.name = name
+        self.seconds = 0.0
+        self.counts = dict(counts)
+        self._start = None
+        self._finished = False
+
+    def __enter__(self):
+        now = time.perf_counter()
+        stack = _stack()
+        if stack:
+            # Pause the enclosing span
+            stack[-1].seconds += now - stack[-1]._start
+        stack.append(self)
+        self._start = now
+        return self
+
+    def __exit__(self, *exc):
+        now = time.perf_counter()
+        self.seconds += now - self._start
+        stack = _stack()
+        if stack and stack[-1] is self:
+            stack.pop()
+            if stack:
+                stack[-1]._start = now
+        return False
+
+    def add(self, **counts):
+        """Add to the span's counts (bytes, elements, ...)."""
+        for key, value in counts.items():
+            self.counts[key] = self.counts.get(key, 0) + value
+
+    def wrap(self, iterable, count="elements"):
+        """Yield from `iterable`, timing each step and counting items; finishes when exhausted or closed."""
+        iterator = iter(iterable)
+        try:
+            while True:
+                with self:
+                    try:
+                        item = next(iterator)
+                    except StopIteration:
+                        return
+                self.counts[count] = self.counts.get(count, 0) + 1
+                yield item
+        finally:
+            self.finish()
+
+    def finish(self):
+        """Record the span once."""
+        if not self._finished:
+            self._finished = True
+            get_recorder().record(self)
+
+class span:
+    """Context manager for a one-shot span: `with span("stage", bytes=n) as s: ...`."""
+
+    def __init__(self, name, **counts):
+        self._span = Span(name, **counts)
+
+    def __enter__(self):
+        return self._span.__enter__()
+
+    def __exit__(self, *exc):
+        self._span.__exit__(*exc)
+        self._span.finish()
+        return False
+
+# -----------------------------
+# Recorder
+# -----------------------------
+
+class PerfRecorder:
+    """Rolling per-stage samples and totals, with JSON log and Prometheus export."""
+
+    def __init__(self, window=WINDOW, metrics_file=None, log_file=None):
+        self.window = window
+        self.metrics_file = metrics_file
+        self._samples = {}
+        self._totals = {}
+        self._lock = threading.Lock()
+        self._last_write = 0.0
+        if log_file:
+            handler = logging.FileHandler(log_file, encoding="utf-8")
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            logger.addHandler(handler)
+            logger.setLevel(logging.INFO)
+
+    def record(self, s):
+        """Store a finished span and hand it to any run collecting on this thread."""
+        with self._lock:
+            self._samples.setdefault(s.name, deque(maxlen=self.window)).append(s.seconds)
+            totals = self._totals.setdefault(s.name, {"count": 0, "seconds": 0.0})
+            totals["count"] += 1
+            totals["seconds"] += s.seconds
+            for key, value in s.counts.items():
+                if isinstance(value, (int, float)):
+                    totals[key] = totals.get(key, 0) + value
+        run = getattr(_local, "run", None)
+        if run is not None:
+            run.append(s)
+        logger.info(json.dumps({"ts": round(time.time(), 3), "stage": s.name,
+                                "seconds": round(s.seconds, 6), **s.counts}))
+        if self.metrics_file and time.monotonic() - self._last_write >= METRICS_WRITE_INTERVAL:
+            self.write_metrics()
+
+    def summary(self):
+        """{stage: {count, p50, p95, total seconds and counts}} over the rolling window."""
+        with self._lock:
+            samples = {name: np.array(values) for name, values in self._samples.items()}
+            totals = {name: dict(values) for name, values in self._totals.items()}
+        result = {}
+        for name, values in sorted(samples.items()):
+            p50, p95 = np.quantile(values, QUANTILES)
+            result[name] = dict(totals[name], p50=float(p50), p95=float(p95))
+        return result
+
+    def prometheus(self):
+        """All stages in Prometheus text exposition format."""
+        lines = [
+            "# HELP pso_stage_seconds Wall time per pipeline stage.",
+            "# TYPE pso_stage_seconds summary",
+        ]
+        counters = {}
+        for name, stats in self.summary().items():
+            label = f'stage="{name}"'
+            for q, key in zip(QUANTILES, ("p50", "p95")):
+                lines.append(f'pso_stage_seconds{{{label},quantile="{q}"}} {stats[key]:.6f}')
+            lines.append(f"pso_stage_seconds_sum{{{label}}} {stats['seconds']:.6f}")
+            lines.append(f"pso_stage_seconds_count{{{label}}} {stats['count']}")
+            for key, value in stats.items():
+                if key not in ("count", "seconds", "p50", "p95"):
+                    counters.setdefault(key, []).append(f"pso_stage_{key}_total{{{label}}} {value:g}")
+        for key, samples in sorted(counters.items()):
+            lines.append(f"# HELP pso_stage_{key}_total Total {key} handled per stage.")
+            lines.append(f"# TYPE pso_stage_{key}_total counter")
+            lines.extend(samples)
+        return "\n".join(lines) + "\n"
+
+    def write_metrics(self, path=None):
+        """Atomically rewrite the Prometheus metrics file."""
+        path = Path(path or self.metrics_file)
+        self._last_write = time.monotonic()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(path.suffix + ".tmp")
+        tmp.write_text(self.prometheus(), encoding="utf-8")
+        tmp.replace(path)
+
+def serve_metrics(recorder, port, host="0.0.0.0"):
+    """Serve `/metrics` from a daemon thread."""
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = recorder.prometheus().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, name="pso-metrics", daemon=True).start()
+    return server
+
+@lru_cache(maxsize=None)
+def get_recorder():
+    """Process-wide recorder configured from the environment."""
+    recorder = PerfRecorder(metrics_file=os.environ.get("PSO_METRICS_FILE"),
+                            log_file=os.environ.get("PSO_PERF_LOG"))
+    port = os.environ.get("PSO_METRICS_PORT")
+    if port:
+        try:
+            serve_metrics(recorder, int(port))
+        except OSError as e:  # Another process already serves the port
+            logger.warning("Metrics endpoint not started: %s", e)
+    return recorder
+
+# -----------------------------
+# Per-run capture
+# -----------------------------
+
+def start_run():
+    """Collect the spans finished on this thread from now on (one Streamlit script run)."""
+    _local.run = []
+    return _local.run
+
+def end_run():
+    """Spans collected since `start_run`; also flushes the metrics file."""
+    spans = getattr(_local, "run", None) or []
+    _local.run = None
+    recorder = get_recorder()
+    if recorder.metrics_file:
+        recorder.write_metrics()
+    return spans
+
+def span_rows(spans):
+    """Table rows (stage, ms, counts) for a list of spans, plus the window's p50/p95."""
+    summary = get_recorder().summary()
+    rows = []
+    for s in spans:
+        stats = summary.get(s.name, {})
+        counts = ", ".join(f"{key}={value:,}" if isinstance(value, int) else f"{key}={value}"
+                           for key, value in s.counts.items())
+        rows.append({
+            "Stage": s.name,
+            "ms": round(s.seconds * 1000, 1),
+            "p50 ms": round(stats.get("p50", 0) * 1000, 1),
+            "p95 ms": round(stats.get("p95", 0) * 1000, 1),
+            "Counts": counts,
+        })
+    return rows
@@ -0,0 +1,242 @@
+"""Gridded population data with constant-time radius sums.
+
+A population raster (e.g. WorldPop or GHS-POP counts per cell) is converted
+once into a summed-area table stored as a `.npy` file plus a JSON sidecar:
+
+    python -m pso_common.population import pak_ppp_2020_constrained.tif
+    python -m pso_common.population import pakistan_pop.asc
+    python -m pso_common.population query 31.5204 74.3587 2
+
+The table is memory-mapped, so only the few pages a query touches are read.
+Any rectangle's population is four lookups; a circle is summed as a bounded
+number of horizontal strips, independent of the radius.
+"""
+import argparse
+import json
+import math
+import os
+import sys
+import time
+from functools import lru_cache
+from pathlib import Path
+
+import numpy as np
+
+DEFAULT_POPULATION_PATH = os.environ.get(
+    "PSO_POPULATION_PATH",
+    str(Path.home() / ".cache" / "pso" / "population.npy"),
+)
+
+KM_PER_DEG_LAT = 110.574
+KM_PER_DEG_LON = 111.320
+
+# Upper bound on strips per circle query; larger circles use taller strips
+MAX_STRIPS = 256
+
+# Raster rows converted per block while building
+BLOCK_ROWS = 512
+
+def meta_path(path):
+    """JSON sidecar describing the grid of a table file."""
+    return Path(path).with_suffix(".json")
+
+# -----------------------------
+# Readers
+# -----------------------------
+
+def read_ascii_grid(path):
+    """Grid metadata and a generator of row blocks from an ESRI ASCII grid (.asc)."""
+    handle = open(path, "r", encoding="ascii")
+    header = {}
+    for _ in range(6):
+        position = handle.tell()
+        tokens = handle.readline().split()
+        if len(tokens) != 2 or not tokens[0].replace("_", "").isalpha():
+            handle.seek(position)
+            break
+        header[tokens[0].lower()] = float(tokens[1])
+    rows, cols, cell = int(header["nrows"]), int(header["ncols"]), header["cellsize"]
+    west = header.get("xllcorner", header.get("xllcenter", 0) - cell / 2)
+    south = header.get("yllcorner", header.get("yllcenter", 0) - cell / 2)
+    nodata = header.get("nodata_value")
+    meta = {"rows": rows, "cols": cols, "north": south + rows * cell, "west": west,
+            "cell_lat": cell, "cell_lon": cell}
+
+    def blocks():
+        with handle:
+            for start in range(0, rows, BLOCK_ROWS):
+                count = min(BLOCK_ROWS, rows - start)
+                block = np.loadtxt(handle, dtype=np.float64, max_rows=count, ndmin=2)
+                if nodata is not None:
+                    block[block == nodata] = 0
+                yield block
+
+    return meta, blocks()
+
+def read_geotiff(path):
+    """Grid metadata and a generator of row blocks from a GeoTIFF (needs `rasterio`)."""
+    import rasterio
+    from rasterio.windows import Window
+
+    dataset = rasterio.open(path)
+    transform = dataset.transform
+    meta = {"rows": dataset.height, "cols": dataset.width, "north": transform.f, "west": transform.c,
+            "cell_lat": -transform.e, "cell_lon": transform.a}
+    nodata = dataset.nodata
+
+    def blocks():
+        with dataset:
+            for start in range(0, dataset.height, BLOCK_ROWS):
+                count = min(BLOCK_ROWS, dataset.height - start)
+                block = dataset.read(1, window=Window(0, start, dataset.width, count)).astype(np.float64)
+                if nodata is not None:
+                    block[block == nodata] = 0
+                yield block
+
+    return meta, blocks()
+
+def read_raster(path):
+    """Pick a reader from the file extension."""
+    suffix = Path(path).suffix.lower()
+    if suffix in (".tif", ".tiff"):
+        return read_geotiff(path)
+    if suffix == ".asc":
+        return read_ascii_grid(path)
+    raise ValueError(f"Unsupported raster format: {path}")
+
+# -----------------------------
+# Build
+# -----------------------------
+
+def build_table(meta, blocks, out_path=DEFAULT_POPULATION_PATH):
+    """Write the (rows+1, cols+1) summed-area table block by block; returns the total population."""
+    Path(out_path).parent.mkdir(parents=True, exist_ok=True)
+    rows, cols = meta["rows"], meta["cols"]
+    table = np.lib.format.open_memmap(out_path, mode="w+", dtype=np.float64, shape=(rows + 1, cols + 1))
+    table[0] = 0
+    running = np.zeros(cols + 1)
+    row = 1
+    for block in blocks:
+        block = np.nan_to_num(block, nan=0.0)
+        block[block < 0] = 0
+        prefix = np.zeros((len(block), cols + 1))
+        np.cumsum(block, axis=1, out=prefix[:, 1:])
+        np.cumsum(prefix, axis=0, out=prefix)
+        table[row:row + len(block)] = prefix + running
+        running = table[row + len(block) - 1].copy()
+        row += len(block)
+    table.flush()
+    total = float(running[-1])
+    meta_path(out_path).write_text(json.dumps(dict(meta, total=total)), encoding="utf-8")
+    return total
+
+# -----------------------------
+# Queries
+# -----------------------------
+
+class PopulationGrid:
+    """Memory-mapped summed-area table over a lat/lon population grid."""
+
+    def __init__(self, path=DEFAULT_POPULATION_PATH):
+        self.table = np.load(path, mmap_mode="r")
+        meta = json.loads(meta_path(path).read_text(encoding="utf-8"))
+        self.rows, self.cols = meta["rows"], meta["cols"]
+        self.north, self.west = meta["north"], meta["west"]
+        self.cell_lat, self.cell_lon = meta["cell_lat"], meta["cell_lon"]
+        self.total = meta.get("total")
+
+    def rect_sum(self, row0, row1, col0, col1):
+        """Population of cells [row0, row1) x [col0, col1); arrays allowed."""
+        t = self.table
+        return t[row1, col1] - t[row0, col1] - t[row1, col0] + t[row0, col0]
+
+    def box_sums(self, south, west, north, east):
+        """Population of many lat/lon boxes at once (arrays; cells counted by their centers)."""
+        row0 = np.clip(np.ceil((self.north - np.asarray(north)) / self.cell_lat - 0.5), 0, self.rows).astype(np.int64)
+        row1 = np.clip(np.ceil((self.north - np.asarray(south)) / self.cell_lat - 0.5), 0, self.rows).astype(np.int64)
+        col0 = np.clip(np.ceil((np.asarray(west) - self.west) / self.cell_lon - 0.5), 0, self.cols).astype(np.int64)
+        col1 = np.clip(np.ceil((np.asarray(east) - self.west) / self.cell_lon - 0.5), 0, self.cols).astype(np.int64)
+        return self.rect_sum(row0, np.maximum(row0, row1), col0, np.maximum(col0, col1))
+
+    def population_within(self, latitude, longitude, radius_km):
+        """People living within `radius_km` of a point (cells counted by their centers)."""
+        km_per_deg_lon = KM_PER_DEG_LON * max(math.cos(math.radians(latitude)), 0.01)
+        row_centre = (self.north - latitude) / self.cell_lat - 0.5
+        row_span = radius_km / (KM_PER_DEG_LAT * self.cell_lat)
+        if row_span < 0.5:
+            return self._point_density(latitude, longitude, radius_km, km_per_deg_lon)
+        first = max(math.ceil(row_centre - row_span), 0)
+        last = min(math.floor(row_centre + row_span), self.rows - 1)
+        if last < first:
+            return 0.0
+
+        # Group rows into at most MAX_STRIPS strips; each uses the chord at its middle row
+        edges = np.unique(np.linspace(first, last + 1, min(last + 1 - first, MAX_STRIPS) + 1).astype(np.int64))
+        row0, row1 = edges[:-1], edges[1:]
+        middle = (row0 + row1 - 1) / 2
+        dy_km = (middle - row_centre) * self.cell_lat * KM_PER_DEG_LAT
+        half_km = np.sqrt(np.clip(radius_km ** 2 - dy_km ** 2, 0, None))
+        col_centre = (longitude - self.west) / self.cell_lon - 0.5
+        half_cols = half_km / (km_per_deg_lon * self.cell_lon)
+        col0 = np.clip(np.ceil(col_centre - half_cols), 0, self.cols).astype(np.int64)
+        col1 = np.clip(np.floor(col_centre + half_cols) + 1, 0, self.cols).astype(np.int64)
+        col1 = np.maximum(col0, col1)
+        return float(self.rect_sum(row0, row1, col0, col1).sum())
+
+    def _point_density(self, latitude, longitude, radius_km, km_per_deg_lon):
+        """Circle smaller than a cell: scale the containing cell by area."""
+        row = int((self.north - latitude) / self.cell_lat)
+        col = int((longitude - self.west) / self.cell_lon)
+        if not (0 <= row < self.rows and 0 <= col < self.cols):
+            return 0.0
+        cell_km2 = (self.cell_lat * KM_PER_DEG_LAT) * (self.cell_lon * km_per_deg_lon)
+        return float(self.rect_sum(row, row + 1, col, col + 1)) * min(math.pi * radius_km ** 2 / cell_km2, 1.0)
+
+@lru_cache(maxsize=4)
+def load_population(path=DEFAULT_POPULATION_PATH):
+    """Open a population table once per process."""
+    return PopulationGrid(path)
+
+def population_available(path=DEFAULT_POPULATION_PATH):
+    """True if a population table has been built."""
+    return Path(path).exists() and meta_path(path).exists()
+
+# -----------------------------
+# Command line
+# -----------------------------
+
+def _import(args):
+    start = time.perf_counter()
+    meta, blocks = read_raster(args.source)
+    total = build_table(meta, blocks, args.table)
+    size = Path(args.table).stat().st_size
+    print(f"Built {meta['rows']}x{meta['cols']} table ({size / 1e6:.0f} MB, {total:,.0f} people) "
+          f"into {args.table} in {time.perf_counter() - start:.1f}s")
+
+def _query(args):
+    grid = load_population(args.table)
+    start = time.perf_counter()
+    people = grid.population_within(args.lat, args.lon, args.radius_km)
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    print(f"{people:,.0f} people within {args.radius_km} km ({elapsed_ms:.2f} ms)")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Gridded population summed-area table")
+    parser.add_argument("--table", default=DEFAULT_POPULATION_PATH, help="Table file (.npy)")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    build = commands.add_parser("import", help="Build the table from a population raster")
+    build.add_argument("source", help=".tif/.tiff GeoTIFF (needs rasterio) or .asc ESRI ASCII grid")
+    build.set_defaults(func=_import)
+
+    query = commands.add_parser("query", help="Time a radius query")
+    query.add_argument("lat", type=float)
+    query.add_argument("lon", type=float)
+    query.add_argument("radius_km", type=float)
+    query.set_defaults(func=_query)
+
+    args = parser.parse_args(argv)
+    args.func(args)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,60 @@
+"""Stale-while-revalidate helpers.
+
+When Overpass fails (or every mirror's circuit breaker is open) the apps serve
+the last good cached response straight away and refresh it on a background
+thread, so the Streamlit script thread never waits on retries or backoff.
+"""
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Background refresh attempts and the pause between them
+REFRESH_ATTEMPTS = 5
+REFRESH_BACKOFF = 30.0
+
+_lock = threading.Lock()
+_in_flight = set()
+
+def refresh_in_background(key, refresh, attempts=REFRESH_ATTEMPTS, backoff=REFRESH_BACKOFF):
+    """Run `refresh()` on a daemon thread, retrying with backoff; one refresh per key at a time."""
+    with _lock:
+        if key in _in_flight:
+            return False
+        _in_flight.add(key)
+
+    def run():
+        try:
+            for attempt in range(attempts):
+                try:
+                    refresh()
+                    logger.info("Background refresh of %s succeeded", key)
+                    return
+                except Exception as e:
+                    logger.warning("Background refresh of %s failed (attempt %d): %s", key, attempt + 1, e)
+                    if attempt < attempts - 1:
+                        time.sleep(backoff * (attempt + 1))
+        finally:
+            with _lock:
+                _in_flight.discard(key)
+
+    threading.Thread(target=run, name=f"refresh-{key}", daemon=True).start()
+    return True
+
+def is_refreshing(key):
+    """True while a background refresh for `key` is running."""
+    with _lock:
+        return key in _in_flight
+
+def format_age(seconds):
+    """Human readable age, e.g. '12 minutes'."""
+    minutes = int(seconds // 60)
+    if minutes < 1:
+        return "less than a minute"
+    if minutes < 120:
+        return f"{minutes} minute{'s' if minutes != 1 else ''}"
+    hours = minutes // 60
+    if hours < 48:
+        return f"{hours} hours"
+    return f"{hours // 24} days"
@@ -0,0 +1,335 @@
+"""Offline fuel-station index with a KD-tree radius query.
+
+Build it once from a local OSM extract or a saved Overpass dump:
+
+    python -m pso_common.station_index dump pakistan_fuel.json
+    python -m pso_common.station_index import pakistan_fuel.json
+    python -m pso_common.station_index import pakistan-latest.osm.bz2
+    python -m pso_common.station_index query 24.8607 67.0011 50
+
+`query_radius` returns Overpass-shaped elements, so it can stand in for a live
+`get_overpass_data` call. Each station keeps its OSM version and timestamp so
+`pso_common.station_sync` can refresh the index incrementally.
+"""
+import argparse
+import bz2
+import gzip
+import json
+import math
+import os
+import sys
+import time
+import xml.etree.ElementTree as ET
+import zlib
+from datetime import datetime
+from functools import lru_cache
+from pathlib import Path
+
+import numpy as np
+
+from pso_common.overpass_stream import iter_elements
+
+try:
+    from scipy.spatial import cKDTree
+except ImportError:  # Fall back to a latitude-sorted scan
+    cKDTree = None
+
+EARTH_RADIUS_KM = 6371.0088
+FUEL_AMENITIES = {"fuel", "gas_station", "petrol_station"}
+TYPE_CODES = {"node": 0, "way": 1, "relation": 2}
+TYPE_NAMES = {code: name for name, code in TYPE_CODES.items()}
+
+DEFAULT_INDEX_PATH = os.environ.get(
+    "FUEL_INDEX_PATH",
+    str(Path.home() / ".cache" / "pso" / "fuel_index.npz"),
+)
+
+# Whole-country Overpass query used by the `dump` command
+PAKISTAN_DUMP_QUERY = """
+[out:json][timeout:600];
+area["ISO3166-1"="PK"][admin_level=2]->.pk;
+(
+  node["amenity"~"^(fuel|gas_station|petrol_station)$"](area.pk);
+  way["amenity"~"^(fuel|gas_station|petrol_station)$"](area.pk);
+);
+out center meta;
+"""
+
+# -----------------------------
+# Readers
+# -----------------------------
+
+def parse_osm_timestamp(value):
+    """Epoch seconds for an OSM timestamp like 2024-05-01T12:00:00Z (0 if missing)."""
+    if not value:
+        return 0.0
+    return datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp()
+
+def _open(path):
+    """Open a possibly compressed file for binary reading."""
+    path = str(path)
+    if path.endswith(".bz2"):
+        return bz2.open(path, "rb")
+    if path.endswith(".gz"):
+        return gzip.open(path, "rb")
+    return open(path, "rb")
+
+def read_overpass_dump(path):
+    """Yield (type, id, lat, lon, tags, version, timestamp) from a saved Overpass JSON response."""
+    with _open(path) as f:
+        for element in iter_elements(f):
+            tags = element.get("tags", {})
+            if tags.get("amenity") not in FUEL_AMENITIES:
+                continue
+            if "lat" in element and "lon" in element:
+                lat, lon = element["lat"], element["lon"]
+            elif "center" in element:
+                lat, lon = element["center"]["lat"], element["center"]["lon"]
+            else:
+                continue
+            yield (element["type"], element["id"], lat, lon, tags,
+                   element.get("version", 0), parse_osm_timestamp(element.get("timestamp")))
+
+def _xml_tags(elem):
+    return {tag.get("k"): tag.get("v") for tag in elem.iter("tag")}
+
+def read_osm_xml(path):
+    """Yield (type, id, lat, lon, tags, version, timestamp) from an OSM XML extract.
+
+    Two passes: the first collects fuel nodes and the node refs of fuel ways,
+    the second resolves those refs so each way gets the mean of its nodes.
+    """
+    way_refs = {}
+    way_tags = {}
+    with _open(path) as f:
+        for _, elem in ET.iterparse(f, events=("end",)):
+            if elem.tag == "node":
+                tags = _xml_tags(elem)
+                if tags.get("amenity") in FUEL_AMENITIES:
+                    yield ("node", int(elem.get("id")), float(elem.get("lat")), float(elem.get("lon")), tags,
+                           int(elem.get("version", 0)), parse_osm_timestamp(elem.get("timestamp")))
+                elem.clear()
+            elif elem.tag == "way":
+                tags = _xml_tags(elem)
+                if tags.get("amenity") in FUEL_AMENITIES:
+                    way_id = int(elem.get("id"))
+                    way_refs[way_id] = [int(nd.get("ref")) for nd in elem.iter("nd")]
+                    way_tags[way_id] = (tags, int(elem.get("version", 0)), parse_osm_timestamp(elem.get("timestamp")))
+                elem.clear()
+            elif elem.tag == "relation":
+                elem.clear()
+
+    if not way_refs:
+        return
+    wanted = {ref for refs in way_refs.values() for ref in refs}
+    coords = {}
+    with _open(path) as f:
+        for _, elem in ET.iterparse(f, events=("end",)):
+            if elem.tag == "node":
+                node_id = int(elem.get("id"))
+                if node_id in wanted:
+                    coords[node_id] = (float(elem.get("lat")), float(elem.get("lon")))
+            elif elem.tag in ("way", "relation"):
+                break
+            elem.clear()
+
+    for way_id, refs in way_refs.items():
+        points = [coords[ref] for ref in refs if ref in coords]
+        if not points:
+            continue
+        lat = sum(p[0] for p in points) / len(points)
+        lon = sum(p[1] for p in points) / len(points)
+        tags, version, timestamp = way_tags[way_id]
+        yield "way", way_id, lat, lon, tags, version, timestamp
+
+def read_osm_pbf(path):
+    """Yield (type, id, lat, lon, tags, version, timestamp) from an OSM PBF extract (needs `osmium`)."""
+    import osmium
+
+    class FuelHandler(osmium.SimpleHandler):
+        def __init__(self):
+            super().__init__()
+            self.rows = []
+
+        def node(self, n):
+            if n.tags.get("amenity") in FUEL_AMENITIES and n.location.valid():
+                self.rows.append(("node", n.id, n.location.lat, n.location.lon, dict(n.tags),
+                                  n.version, n.timestamp.timestamp()))
+
+        def way(self, w):
+            if w.tags.get("amenity") not in FUEL_AMENITIES:
+                return
+            points = [(nd.lat, nd.lon) for nd in w.nodes if nd.location.valid()]
+            if points:
+                lat = sum(p[0] for p in points) / len(points)
+                lon = sum(p[1] for p in points) / len(points)
+                self.rows.append(("way", w.id, lat, lon, dict(w.tags), w.version, w.timestamp.timestamp()))
+
+    handler = FuelHandler()
+    handler.apply_file(str(path), locations=True)
+    return handler.rows
+
+def read_source(path):
+    """Pick a reader from the file extension."""
+    name = str(path).lower()
+    if name.endswith(".pbf"):
+        return read_osm_pbf(path)
+    if name.endswith((".osm", ".osm.bz2", ".osm.gz", ".xml")):
+        return read_osm_xml(path)
+    return read_overpass_dump(path)
+
+# -----------------------------
+# Index
+# -----------------------------
+
+def _unit_vectors(lat, lon):
+    """3D unit vectors, so chord distance in the KD-tree is monotone in great-circle distance."""
+    lat_r = np.radians(lat)
+    lon_r = np.radians(lon)
+    cos_lat = np.cos(lat_r)
+    return np.column_stack((cos_lat * np.cos(lon_r), cos_lat * np.sin(lon_r), np.sin(lat_r)))
+
+def build_index(rows, out_path=DEFAULT_INDEX_PATH, synced=None):
+    """Write (type, id, lat, lon, tags[, version, timestamp]) rows to a compact .npz index.
+
+    `synced` is the OSM data time the index reflects (default: newest element timestamp).
+    """
+    rows = list(rows)
+    types = np.array([TYPE_CODES[r[0]] for r in rows], dtype=np.uint8)
+    ids = np.array([r[1] for r in rows], dtype=np.int64)
+    lat = np.array([r[2] for r in rows], dtype=np.float64)
+    lon = np.array([r[3] for r in rows], dtype=np.float64)
+    tags = zlib.compress(json.dumps([r[4] for r in rows], ensure_ascii=False).encode("utf-8"), 9)
+    versions = np.array([r[5] if len(r) > 5 else 0 for r in rows], dtype=np.int32)
+    timestamps = np.array([r[6] if len(r) > 6 else 0.0 for r in rows], dtype=np.float64)
+    if synced is None:
+        synced = float(timestamps.max()) if len(timestamps) else 0.0
+
+    Path(out_path).parent.mkdir(parents=True, exist_ok=True)
+    np.savez(out_path, types=types, ids=ids, lat=lat, lon=lon,
+             tags=np.frombuffer(tags, dtype=np.uint8), versions=versions, timestamps=timestamps,
+             built=np.array([time.time()]), synced=np.array([synced]))
+    load_index.cache_clear()
+    return len(rows)
+
+class StationIndex:
+    """In-memory radius-query engine over an on-disk station index."""
+
+    def __init__(self, path):
+        with np.load(path) as data:
+            self.types = data["types"]
+            self.ids = data["ids"]
+            self.lat = data["lat"]
+            self.lon = data["lon"]
+            self.tags = json.loads(zlib.decompress(data["tags"].tobytes()))
+            self.built = float(data["built"][0])
+            # Indexes built before incremental sync have no version data
+            self.versions = data["versions"] if "versions" in data else np.zeros(len(self.ids), dtype=np.int32)
+            self.timestamps = data["timestamps"] if "timestamps" in data else np.zeros(len(self.ids))
+            self.synced = float(data["synced"][0]) if "synced" in data else 0.0
+        self.tree = cKDTree(_unit_vectors(self.lat, self.lon)) if cKDTree and len(self.ids) else None
+        self._lat_order = np.argsort(self.lat)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def rows(self):
+        """All stations as (type, id, lat, lon, tags, version, timestamp) rows."""
+        for i in range(len(self.ids)):
+            yield (TYPE_NAMES[int(self.types[i])], int(self.ids[i]), float(self.lat[i]), float(self.lon[i]),
+                   self.tags[i], int(self.versions[i]), float(self.timestamps[i]))
+
+    def query_ids(self, latitude, longitude, radius_km):
+        """Row numbers of stations within `radius_km` of a point."""
+        if not len(self.ids):
+            return np.empty(0, dtype=np.int64)
+        if self.tree is not None:
+            chord = 2 * math.sin(min(radius_km / EARTH_RADIUS_KM, math.pi) / 2)
+            center = _unit_vectors(np.array([latitude]), np.array([longitude]))[0]
+            return np.asarray(self.tree.query_ball_point(center, chord), dtype=np.int64)
+
+        # Without scipy: latitude band from a sorted column, then exact haversine
+        band = radius_km / 111.0
+        sorted_lat = self.lat[self._lat_order]
+        lo, hi = np.searchsorted(sorted_lat, [latitude - band, latitude + band])
+        candidates = self._lat_order[lo:hi]
+        lat1, lon1 = math.radians(latitude), math.radians(longitude)
+        lat2, lon2 = np.radians(self.lat[candidates]), np.radians(self.lon[candidates])
+        a = np.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+        dist = 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
+        return candidates[dist <= radius_km]
+
+    def query_radius(self, latitude, longitude, radius_km):
+        """Overpass-shaped elements within `radius_km` of a point."""
+        elements = []
+        for i in self.query_ids(latitude, longitude, radius_km):
+            element_type = TYPE_NAMES[int(self.types[i])]
+            element = {"type": element_type, "id": int(self.ids[i]), "tags": self.tags[i]}
+            coords = {"lat": float(self.lat[i]), "lon": float(self.lon[i])}
+            if element_type == "node":
+                element.update(coords)
+            else:
+                element["center"] = coords
+            elements.append(element)
+        return elements
+
+@lru_cache(maxsize=4)
+def load_index(path=DEFAULT_INDEX_PATH):
+    """Load an index once per process."""
+    return StationIndex(path)
+
+def index_available(path=DEFAULT_INDEX_PATH):
+    """True if an index file has been built."""
+    return Path(path).exists()
+
+# -----------------------------
+# Command line
+# -----------------------------
+
+def _dump(args):
+    import requests
+
+    response = requests.post(args.url, data={"data": PAKISTAN_DUMP_QUERY}, timeout=900)
+    response.raise_for_status()
+    Path(args.out).write_bytes(response.content)
+    print(f"Saved {len(response.content) / 1e6:.1f} MB to {args.out}")
+
+def _import(args):
+    start = time.perf_counter()
+    count = build_index(read_source(args.source), args.index)
+    size = Path(args.index).stat().st_size
+    print(f"Indexed {count} stations into {args.index} ({size / 1024:.0f} KB) "
+          f"in {time.perf_counter() - start:.1f}s")
+
+def _query(args):
+    index = load_index(args.index)
+    start = time.perf_counter()
+    elements = index.query_radius(args.lat, args.lon, args.radius_km)
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    print(f"{len(elements)} of {len(index)} stations within {args.radius_km} km ({elapsed_ms:.2f} ms)")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline fuel-station index")
+    parser.add_argument("--index", default=DEFAULT_INDEX_PATH, help="Index file (.npz)")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    dump = commands.add_parser("dump", help="Save all Pakistani fuel stations from Overpass")
+    dump.add_argument("out", help="Output JSON file")
+    dump.add_argument("--url", default="https://overpass-api.de/api/interpreter")
+    dump.set_defaults(func=_dump)
+
+    build = commands.add_parser("import", help="Build the index from an Overpass dump or OSM extract")
+    build.add_argument("source", help=".json Overpass dump, .osm[.bz2|.gz] or .osm.pbf extract")
+    build.set_defaults(func=_import)
+
+    query = commands.add_parser("query", help="Time a radius query")
+    query.add_argument("lat", type=float)
+    query.add_argument("lon", type=float)
+    query.add_argument("radius_km", type=float)
+    query.set_defaults(func=_query)
+
+    args = parser.parse_args(argv)
+    args.func(args)
+
+if __name__ == "__main__":
+    sys.exit(main())
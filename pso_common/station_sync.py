@@ -0,0 +1,216 @@
+"""Incremental refresh of the offline station index.
+
+Instead of re-downloading every station, ask Overpass for an augmented diff of
+the fuel stations changed since the index was last synced (or read a local
+osmChange file from the OSM replication feed) and apply only those upserts and
+deletes:
+
+    python -m pso_common.station_sync                      # Overpass adiff since last sync
+    python -m pso_common.station_sync --osc 123.osc.gz     # local replication diff
+
+Each station's OSM version is kept, so replaying an older diff never overwrites
+newer data.
+"""
+import argparse
+import io
+import sys
+import time
+import xml.etree.ElementTree as ET
+from datetime import datetime, timezone
+
+from pso_common.overpass_client import get_client
+from pso_common.station_index import (
+    DEFAULT_INDEX_PATH,
+    FUEL_AMENITIES,
+    _open,
+    _xml_tags,
+    build_index,
+    load_index,
+    parse_osm_timestamp,
+)
+
+# Augmented diff of Pakistani fuel stations; matches elements that were fuel
+# stations before or after the change, so deletions and retags show up too
+PAKISTAN_ADIFF_QUERY = """
+[out:xml][timeout:600][adiff:"{since}"];
+area["ISO3166-1"="PK"][admin_level=2]->.pk;
+(
+  node["amenity"~"^(fuel|gas_station|petrol_station)$"](area.pk);
+  way["amenity"~"^(fuel|gas_station|petrol_station)$"](area.pk);
+);
+out center meta;
+"""
+
+# (south, west, north, east) around Pakistan. Replication diffs cover the whole
+# planet, so osmChange upserts outside it are dropped; the box also takes in
+# strips of neighbouring countries, which the area-based adiff never returns.
+PAKISTAN_BBOX = (23.5, 60.8, 37.2, 77.9)
+
+def format_osm_timestamp(epoch):
+    """OSM/Overpass timestamp string for epoch seconds."""
+    return datetime.fromtimestamp(epoch, tz=timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+# -----------------------------
+# Change readers
+# -----------------------------
+
+def _element_row(elem, coords=None):
+    """Station row for a node/way element; lat/lon are None if it has no location."""
+    element_type = elem.tag
+    if element_type == "node" and elem.get("lat") is not None:
+        lat, lon = float(elem.get("lat")), float(elem.get("lon"))
+    elif elem.find("center") is not None:
+        center = elem.find("center")
+        lat, lon = float(center.get("lat")), float(center.get("lon"))
+    else:
+        points = [coords[int(nd.get("ref"))] for nd in elem.iter("nd") if int(nd.get("ref")) in (coords or {})]
+        lat = sum(p[0] for p in points) / len(points) if points else None
+        lon = sum(p[1] for p in points) / len(points) if points else None
+    return (element_type, int(elem.get("id")), lat, lon, _xml_tags(elem),
+            int(elem.get("version", 0)), parse_osm_timestamp(elem.get("timestamp")))
+
+def _change(row):
+    """("upsert", row) for a fuel station, ("delete", key) for anything else."""
+    if row[4].get("amenity") in FUEL_AMENITIES:
+        return "upsert", row
+    return "delete", (row[0], row[1])
+
+def read_adiff(source, meta=None):
+    """Yield changes from an Overpass augmented diff; its osm_base time is stored in `meta`."""
+    for _, elem in ET.iterparse(source, events=("end",)):
+        if elem.tag == "meta" and meta is not None:
+            meta["osm_base"] = parse_osm_timestamp(elem.get("osm_base"))
+        elif elem.tag == "action":
+            action = elem.get("type")
+            new = elem.find("new")
+            current = new[0] if new is not None and len(new) else (elem[0] if len(elem) else None)
+            if current is None or current.tag not in ("node", "way"):
+                elem.clear()
+                continue
+            if action == "delete" or current.get("visible") == "false":
+                yield "delete", (current.tag, int(current.get("id")))
+            else:
+                yield _change(_element_row(current))
+            elem.clear()
+
+def _in_bbox(row, bbox):
+    """True if the row lies in `bbox`, or has no location of its own yet."""
+    south, west, north, east = bbox
+    return row[2] is None or (south <= row[2] <= north and west <= row[3] <= east)
+
+def _osc_elements(path):
+    """Yield the node/way elements of an osmChange file, clearing each once used."""
+    with _open(path) as f:
+        for _, elem in ET.iterparse(f, events=("end",)):
+            if elem.tag in ("node", "way"):
+                yield elem
+                elem.clear()
+            elif elem.tag in ("create", "modify", "delete"):
+                elem.clear()  # Drop the cleared children from the tree too
+
+def read_osc(path, bbox=PAKISTAN_BBOX):
+    """Yield changes from an osmChange (.osc[.gz]) replication file.
+
+    Ways are placed at the mean of their nodes when the diff contains them;
+    otherwise a modified way keeps its indexed location. Stations created or
+    moved outside `bbox` become deletes, so they never enter the index.
+    """
+    # Nodes referenced by fuel ways, then just those nodes' coordinates
+    refs = set()
+    for elem in _osc_elements(path):
+        if elem.tag == "way" and _xml_tags(elem).get("amenity") in FUEL_AMENITIES:
+            refs.update(int(nd.get("ref")) for nd in elem.iter("nd"))
+    coords = {}
+    if refs:
+        for elem in _osc_elements(path):
+            if elem.tag == "node" and elem.get("lat") is not None and int(elem.get("id")) in refs:
+                coords[int(elem.get("id"))] = (float(elem.get("lat")), float(elem.get("lon")))
+
+    with _open(path) as f:
+        section = None
+        for event, elem in ET.iterparse(f, events=("start", "end")):
+            if event == "start":
+                if elem.tag in ("create", "modify", "delete"):
+                    section = elem.tag
+                continue
+            if elem.tag in ("node", "way") and section:
+                row = _element_row(elem, coords) if section != "delete" else None
+                if row is None or not _in_bbox(row, bbox):
+                    yield "delete", (elem.tag, int(elem.get("id")))
+                else:
+                    yield _change(row)
+                elem.clear()
+            elif elem.tag in ("create", "modify", "delete"):
+                section = None
+                elem.clear()
+
+# -----------------------------
+# Apply
+# -----------------------------
+
+def apply_changes(index_path, changes, synced=None):
+    """Apply upserts/deletes to the index on disk; returns counts per outcome."""
+    index = load_index(index_path)
+    stations = {(row[0], row[1]): row for row in index.rows()}
+    counts = {"inserted": 0, "updated": 0, "deleted": 0, "skipped": 0}
+    newest = index.synced
+    for action, payload in changes:
+        if action == "delete":
+            if stations.pop(payload, None) is not None:
+                counts["deleted"] += 1
+            continue
+        row = payload
+        key = (row[0], row[1])
+        old = stations.get(key)
+        if old is not None and row[5] and row[5] < old[5]:
+            counts["skipped"] += 1  # Older than what we have
+            continue
+        if row[2] is None:
+            if old is None:
+                counts["skipped"] += 1  # New way without node locations
+                continue
+            row = (row[0], row[1], old[2], old[3]) + row[4:]
+        counts["updated" if old is not None else "inserted"] += 1
+        stations[key] = row
+        newest = max(newest, row[6])
+
+    build_index(stations.values(), index_path, synced=max(synced or 0.0, newest))
+    return counts
+
+def sync_from_overpass(index_path=DEFAULT_INDEX_PATH, since=None):
+    """Download the augmented diff since the last sync and apply it; returns (counts, bytes)."""
+    index = load_index(index_path)
+    since = since if since is not None else index.synced
+    if not since:
+        raise ValueError("Index has no sync time; rebuild it from a dump with `out center meta` or pass --since")
+    started = time.time()
+    body = get_client().fetch(PAKISTAN_ADIFF_QUERY.format(since=format_osm_timestamp(since)))
+    meta = {}
+    changes = list(read_adiff(io.BytesIO(body), meta))
+    counts = apply_changes(index_path, changes, synced=meta.get("osm_base") or started)
+    return counts, len(body)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Incrementally refresh the offline station index")
+    parser.add_argument("--index", default=DEFAULT_INDEX_PATH, help="Index file (.npz)")
+    parser.add_argument("--osc", help="Apply a local osmChange (.osc/.osc.gz) file instead of querying Overpass")
+    parser.add_argument("--bbox", type=float, nargs=4, default=PAKISTAN_BBOX,
+                        metavar=("SOUTH", "WEST", "NORTH", "EAST"),
+                        help="Keep --osc stations inside this box (default: Pakistan)")
+    parser.add_argument("--since", help="Override the last sync time (e.g. 2024-05-01T00:00:00Z)")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    if args.osc:
+        counts = apply_changes(args.index, read_osc(args.osc, tuple(args.bbox)))
+        size = None
+    else:
+        counts, size = sync_from_overpass(args.index, parse_osm_timestamp(args.since) if args.since else None)
+    index = load_index(args.index)
+    transferred = f", {size / 1024:.1f} KB downloaded" if size is not None else ""
+    print(f"{counts['inserted']} inserted, {counts['updated']} updated, {counts['deleted']} deleted, "
+          f"{counts['skipped']} skipped; {len(index)} stations synced to "
+          f"{format_osm_timestamp(index.synced)}{transferred} in {time.perf_counter() - start:.1f}s")
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,191 @@
+"""Columnar station store.
+
+Stations are kept as parallel NumPy arrays instead of a list of dicts: brands
+are categorical codes, fuel types a bitmask, and filter / sort / top-k / group
+counts are single vectorized operations. Records are only materialized for the
+rows actually displayed.
+"""
+import hashlib
+
+import numpy as np
+
+FUEL_TYPES = ("Diesel", "Octane 91", "Octane 95", "Octane 97", "LPG", "CNG")
+FUEL_BITS = {name: 1 << i for i, name in enumerate(FUEL_TYPES)}
+
+# Columns with a dedicated representation; any other record key is stored as text
+_CORE = ("lat", "lon", "distance", "brand", "fuel_types")
+
+def fuel_mask(fuel_types):
+    """Bitmask for a list of fuel type names."""
+    mask = 0
+    for name in fuel_types or ():
+        mask |= FUEL_BITS.get(name, 0)
+    return mask
+
+def fuel_names(mask):
+    """Fuel type names set in a bitmask."""
+    return [name for name, bit in FUEL_BITS.items() if mask & bit]
+
+class StationTable:
+    """Stations as NumPy columns with categorical brands and a fuel-type bitmask."""
+
+    def __init__(self, lat, lon, distance, brand_codes, brand_names, fuel, text, rows=None):
+        self.lat = lat
+        self.lon = lon
+        self.distance = distance
+        self.brand_codes = brand_codes
+        self.brand_names = brand_names
+        self.fuel = fuel
+        # Text columns are shared between derived tables; `rows` maps into them
+        self.text = text
+        self.rows = np.arange(len(lat)) if rows is None else rows
+
+    @classmethod
+    def from_records(cls, records):
+        """Build a table from station dicts (as produced by the apps' parsers)."""
+        records = list(records)
+        n = len(records)
+        brand_index = {}
+        codes = np.empty(n, dtype=np.int16)
+        for i, record in enumerate(records):
+            codes[i] = brand_index.setdefault(record.get("brand") or "Unknown", len(brand_index))
+
+        text_keys = []
+        for record in records[:1]:
+            text_keys = [key for key in record if key not in _CORE]
+        text = {key: np.array([r.get(key) for r in records], dtype=object) for key in text_keys}
+
+        return cls(
+            lat=np.fromiter((r["lat"] for r in records), dtype=np.float64, count=n),
+            lon=np.fromiter((r["lon"] for r in records), dtype=np.float64, count=n),
+            distance=np.fromiter(
+                (np.nan if r.get("distance") is None else r["distance"] for r in records),
+                dtype=np.float64, count=n,
+            ),
+            brand_codes=codes,
+            brand_names=np.array(list(brand_index), dtype=object),
+            fuel=np.fromiter((fuel_mask(r.get("fuel_types")) for r in records), dtype=np.uint8, count=n),
+            text=text,
+        )
+
+    def __len__(self):
+        return len(self.lat)
+
+    def __bool__(self):
+        return len(self) > 0
+
+    def __iter__(self):
+        return iter(self.to_records())
+
+    # -----------------------------
+    # Columns and records
+    # -----------------------------
+
+    @property
+    def brand(self):
+        """Brand name per row."""
+        return self.brand_names[self.brand_codes] if len(self.brand_names) else np.empty(0, dtype=object)
+
+    def column(self, name):
+        """Any column by record key."""
+        if name == "brand":
+            return self.brand
+        if name in ("lat", "lon", "distance"):
+            return getattr(self, name)
+        return self.text[name][self.rows]
+
+    def record(self, i):
+        """Row `i` as a station dict."""
+        distance = float(self.distance[i])
+        record = {
+            "lat": float(self.lat[i]),
+            "lon": float(self.lon[i]),
+            "distance": None if np.isnan(distance) else round(distance, 3),
+            "brand": self.brand_names[self.brand_codes[i]],
+            "fuel_types": fuel_names(int(self.fuel[i])),
+        }
+        row = self.rows[i]
+        for key, values in self.text.items():
+            record[key] = values[row]
+        return record
+
+    def to_records(self):
+        """All rows as station dicts (for display code that expects dicts)."""
+        return [self.record(i) for i in range(len(self))]
+
+    def take(self, indices):
+        """New table with the given rows (index array or boolean mask)."""
+        if getattr(indices, "dtype", None) == bool:
+            indices = np.flatnonzero(indices)
+        return StationTable(
+            lat=self.lat[indices],
+            lon=self.lon[indices],
+            distance=self.distance[indices],
+            brand_codes=self.brand_codes[indices],
+            brand_names=self.brand_names,
+            fuel=self.fuel[indices],
+            text=self.text,
+            rows=self.rows[indices],
+        )
+
+    # -----------------------------
+    # Vectorized operations
+    # -----------------------------
+
+    def filter(self, brand=None, max_distance=None, fuel_types=None):
+        """Rows matching a brand, a distance cap and all given fuel types."""
+        mask = np.ones(len(self), dtype=bool)
+        if brand is not None:
+            codes = np.flatnonzero(self.brand_names == brand)
+            mask &= self.brand_codes == (codes[0] if len(codes) else -1)
+        if max_distance is not None:
+            # Unknown distances are kept, as the list-based filters did
+            mask &= ~(self.distance > max_distance)
+        if fuel_types:
+            required = fuel_mask(fuel_types)
+            mask &= (self.fuel & required) == required
+        return self.take(mask)
+
+    def sort_order(self, by="distance"):
+        """Stable row order for a column; text columns sort case-insensitively."""
+        if by == "distance":
+            return np.argsort(self.distance, kind="stable")
+        if by == "brand":
+            lowered = np.array([str(b).lower() for b in self.brand_names])
+            rank = np.argsort(np.argsort(lowered, kind="stable"), kind="stable")
+            return np.argsort(rank[self.brand_codes], kind="stable") if len(self) else np.empty(0, dtype=np.int64)
+        values = self.column(by)
+        return np.argsort(np.array([str(v).lower() for v in values]), kind="stable")
+
+    def sort(self, by="distance"):
+        """Table sorted by a column."""
+        return self.take(self.sort_order(by))
+
+    def top_k(self, k, by="distance"):
+        """The `k` nearest rows (or smallest by another numeric column), in order."""
+        values = self.column(by)
+        if k >= len(self):
+            return self.sort(by)
+        nearest = np.argpartition(values, k)[:k]
+        return self.take(nearest[np.argsort(values[nearest], kind="stable")])
+
+    def brand_counts(self):
+        """{brand: count}, most common first."""
+        counts = np.bincount(self.brand_codes, minlength=len(self.brand_names))
+        order = np.argsort(-counts, kind="stable")
+        return {self.brand_names[i]: int(counts[i]) for i in order if counts[i]}
+
+    def fingerprint(self):
+        """Digest of every row's coordinates, brand, fuel types and text, for cache keys."""
+        digest = hashlib.blake2b(digest_size=16)
+        for column in (self.lat, self.lon, self.distance, self.fuel):
+            digest.update(np.ascontiguousarray(column).tobytes())
+        digest.update("\0".join(map(str, self.brand)).encode("utf-8"))
+        for key in sorted(self.text):
+            digest.update(key.encode("utf-8"))
+            digest.update("\0".join(map(str, self.column(key))).encode("utf-8"))
+        return digest.hexdigest()
+
+    def unique_brands(self):
+        """Brands present in the table."""
+        return list(self.brand_counts())
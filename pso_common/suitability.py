@@ -0,0 +1,227 @@
+"""City-wide site suitability grid.
+
+Every cell of a regular grid around a city is scored at once from one bulk load
+of stations, land use polygons and (optionally) the population grid:
+
+- competitor density: stations of each non-PSO brand within reach (KD-trees)
+- distance to the nearest PSO station (KD-tree), so new sites avoid cannibalizing
+- land use mix: demand-generating area per cell and its diversity (STRtree)
+- population per cell (summed-area table, or land use area if not installed)
+
+All work is in a local metric projection and vectorized over the grid.
+"""
+import math
+
+import numpy as np
+import shapely
+from shapely import STRtree
+
+try:
+    from scipy.spatial import cKDTree
+except ImportError:  # Fall back to brute-force distances (fine for city-sized grids)
+    cKDTree = None
+
+from pso_common.brands import match_brand
+from pso_common.land_use import POPULATION_PER_M2, landuse_polygons, metres_per_degree, to_local_metres
+from pso_common.population import load_population, population_available
+
+# Stations within this distance of a cell compete with a site there
+COMPETITION_RADIUS_M = 1000
+# Beyond this distance from the nearest PSO station a site adds full coverage
+PSO_SPACING_M = 3000
+
+# Brands weighted less as competitors than the national chains
+COMPETITOR_WEIGHTS = {"Generic Petrol Pump": 0.5, "Unknown": 0.5}
+OWN_BRAND = "PSO"
+
+# Land use classes that generate fuel demand
+DEMAND_CLASSES = ("residential", "commercial", "retail", "industrial")
+
+# Component weights of the 0-100 score
+WEIGHTS = {"population": 0.35, "pso_gap": 0.25, "land_use": 0.2, "competition": 0.2}
+
+def landuse_bbox_query(south, west, north, east):
+    """Overpass query for every landuse polygon in a bounding box."""
+    return f"""
+    [out:json][timeout:120];
+    (
+      way["landuse"]({south},{west},{north},{east});
+      relation["landuse"]({south},{west},{north},{east});
+    );
+    out geom;
+    """
+
+def nearest_distance(points, cells):
+    """Distance from each cell to the nearest point (all in metres)."""
+    if cKDTree is not None:
+        return cKDTree(points).query(cells)[0]
+    return np.min(np.hypot(*(cells[:, None, :] - points[None, :, :]).transpose(2, 0, 1)), axis=1)
+
+def count_within(points, cells, radius):
+    """Number of points within `radius` metres of each cell."""
+    if cKDTree is not None:
+        return cKDTree(points).query_ball_point(cells, radius, return_length=True)
+    return (np.hypot(*(cells[:, None, :] - points[None, :, :]).transpose(2, 0, 1)) <= radius).sum(axis=1)
+
+class SuitabilityGrid:
+    """Scored grid cells around a city center; 2D arrays are (rows north->south, cols west->east)."""
+
+    def __init__(self, latitude, longitude, half_size_km, cell_m):
+        self.latitude = latitude
+        self.longitude = longitude
+        self.cell_m = cell_m
+        n = max(int(round(2 * half_size_km * 1000 / cell_m)), 1)
+        offsets = (np.arange(n) - (n - 1) / 2) * cell_m
+        self.x, self.y = np.meshgrid(offsets, offsets[::-1])  # Metres east / north of the center
+        scale = metres_per_degree(latitude)
+        self.lon = longitude + self.x / scale[0]
+        self.lat = latitude + self.y / scale[1]
+        self.half_deg = (cell_m / 2) / scale
+        self.components = {}
+        self.brand_counts = {}
+        self.score = np.zeros(self.x.shape)
+
+    @property
+    def shape(self):
+        return self.x.shape
+
+    @property
+    def bounds(self):
+        """[[south, west], [north, east]] of the whole grid."""
+        return [
+            [float(self.lat.min() - self.half_deg[1]), float(self.lon.min() - self.half_deg[0])],
+            [float(self.lat.max() + self.half_deg[1]), float(self.lon.max() + self.half_deg[0])],
+        ]
+
+    def _cells_xy(self):
+        return np.column_stack((self.x.ravel(), self.y.ravel()))
+
+    def _stations_xy(self, stations):
+        scale = metres_per_degree(self.latitude)
+        lat = np.array([s["lat"] for s in stations], dtype=np.float64)
+        lon = np.array([s["lon"] for s in stations], dtype=np.float64)
+        return np.column_stack(((lon - self.longitude) * scale[0], (lat - self.latitude) * scale[1]))
+
+    # -----------------------------
+    # Components
+    # -----------------------------
+
+    def score_stations(self, stations):
+        """Competitor density per brand and distance to the nearest PSO station."""
+        cells = self._cells_xy()
+        brands = np.array([match_brand(s.get("brand") or s.get("name") or "") for s in stations], dtype=object)
+        xy = self._stations_xy(stations) if len(stations) else np.empty((0, 2))
+
+        own = brands == OWN_BRAND
+        if own.any():
+            distance = nearest_distance(xy[own], cells)
+        else:
+            distance = np.full(len(cells), np.inf)
+        self.components["nearest_pso_km"] = (distance / 1000).reshape(self.shape)
+
+        weighted = np.zeros(len(cells))
+        for brand in np.unique(brands[~own]) if (~own).any() else []:
+            counts = count_within(xy[brands == brand], cells, COMPETITION_RADIUS_M)
+            self.brand_counts[brand] = counts.reshape(self.shape)
+            weighted += counts * COMPETITOR_WEIGHTS.get(brand, 1.0)
+        self.components["competitors"] = weighted.reshape(self.shape)
+
+    def score_land_use(self, elements):
+        """Demand-generating land use area per cell and its mix."""
+        cell_area = self.cell_m ** 2
+        classes, polygons = landuse_polygons(elements)
+        demand = np.isin(classes, DEMAND_CLASSES)
+        areas = np.zeros((self.x.size, len(DEMAND_CLASSES)))
+        if demand.any():
+            geometries = to_local_metres(polygons[demand], self.latitude, self.longitude)
+            half = self.cell_m / 2
+            cells = shapely.box(self.x.ravel() - half, self.y.ravel() - half, self.x.ravel() + half, self.y.ravel() + half)
+            cell_idx, poly_idx = STRtree(geometries).query(cells, predicate="intersects")
+            overlap = shapely.area(shapely.intersection(cells[cell_idx], geometries[poly_idx]))
+            class_idx = np.array([DEMAND_CLASSES.index(c) for c in classes[demand][poly_idx]], dtype=np.int64)
+            np.add.at(areas, (cell_idx, class_idx), overlap)
+
+        areas = np.minimum(areas, cell_area)
+        self.components["class_area_m2"] = areas.reshape(self.shape + (len(DEMAND_CLASSES),))
+        share = np.minimum(areas.sum(axis=1) / cell_area, 1.0)
+        # Shannon evenness of the demand classes present (0 = one class, 1 = even mix)
+        p = areas / np.maximum(areas.sum(axis=1, keepdims=True), 1e-9)
+        entropy = -(p * np.log(np.where(p > 0, p, 1))).sum(axis=1)
+        evenness = entropy / math.log(len(DEMAND_CLASSES))
+        self.components["land_use"] = (0.7 * share + 0.3 * evenness).reshape(self.shape)
+
+    def score_population(self):
+        """People per cell from the population grid, or from land use area."""
+        if population_available():
+            grid = load_population()
+            people = grid.box_sums(
+                self.lat - self.half_deg[1], self.lon - self.half_deg[0],
+                self.lat + self.half_deg[1], self.lon + self.half_deg[0],
+            )
+        else:
+            areas = self.components.get("class_area_m2")
+            people = np.zeros(self.shape)
+            if areas is not None:
+                for i, landuse in enumerate(DEMAND_CLASSES):
+                    people = people + areas[..., i] * POPULATION_PER_M2.get(landuse, 0)
+        self.components["population"] = np.asarray(people, dtype=np.float64).reshape(self.shape)
+
+    def combine(self):
+        """Weighted 0-100 score from the normalized components."""
+        population = self.components["population"]
+        reference = np.percentile(population, 99) if population.any() else 1.0
+        parts = {
+            "population": np.minimum(population / max(reference, 1e-9), 1.0),
+            "pso_gap": np.minimum(self.components["nearest_pso_km"] * 1000 / PSO_SPACING_M, 1.0),
+            "land_use": self.components["land_use"],
+            "competition": 1.0 / (1.0 + self.components["competitors"] / 2),
+        }
+        self.score = 100 * sum(WEIGHTS[name] * part for name, part in parts.items())
+        return self.score
+
+    # -----------------------------
+    # Output
+    # -----------------------------
+
+    def top_sites(self, k=10, min_spacing_m=None):
+        """Best cells as dicts, at least `min_spacing_m` apart (default two cells)."""
+        spacing = min_spacing_m if min_spacing_m is not None else 2 * self.cell_m
+        order = np.argsort(-self.score, axis=None, kind="stable")
+        cells = self._cells_xy()
+        chosen = []
+        for flat in order:
+            if len(chosen) >= k:
+                break
+            if any(np.hypot(*(cells[flat] - cells[c])) < spacing for c in chosen):
+                continue
+            chosen.append(flat)
+        sites = []
+        for flat in chosen:
+            row, col = np.unravel_index(flat, self.shape)
+            sites.append({
+                "lat": round(float(self.lat[row, col]), 6),
+                "lon": round(float(self.lon[row, col]), 6),
+                "score": round(float(self.score[row, col]), 1),
+                "population": int(self.components["population"][row, col]),
+                "competitors": round(float(self.components["competitors"][row, col]), 1),
+                "nearest_pso_km": round(float(self.components["nearest_pso_km"][row, col]), 2),
+                "land_use": round(float(self.components["land_use"][row, col]), 2),
+            })
+        return sites
+
+    def rgba(self, opacity=0.55):
+        """Score as a red -> yellow -> green RGBA image for an overlay."""
+        value = np.clip(self.score / 100, 0, 1)
+        red = np.where(value < 0.5, 1.0, 2 * (1 - value))
+        green = np.where(value < 0.5, 2 * value, 1.0)
+        image = np.stack([red, green, np.zeros_like(value), np.full_like(value, opacity)], axis=-1)
+        return (image * 255).astype(np.uint8)
+
+def score_city(latitude, longitude, half_size_km, cell_m, stations, landuse_elements):
+    """Build and score a grid from already loaded stations and landuse elements."""
+    grid = SuitabilityGrid(latitude, longitude, half_size_km, cell_m)
+    grid.score_stations(stations)
+    grid.score_land_use(landuse_elements)
+    grid.score_population()
+    grid.combine()
+    return grid
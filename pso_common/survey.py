@@ -0,0 +1,180 @@
+"""Headless fuel-station survey across all configured cities.
+
+Runs the fuel finder pipeline (pso_common.fuel_stations) for every city in
+PAKISTAN_CITIES with a bounded worker pool and a global request rate limit,
+checkpointing each finished city so an interrupted sweep resumes where it left
+off. Results are consolidated into one Parquet (or CSV) file plus a per-city
+timing table.
+
+    python -m pso_common.survey --radius-km 15 --out survey/stations.parquet
+    python -m pso_common.survey --cities Lahore Karachi --backend local
+"""
+import argparse
+import json
+import logging
+import re
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+
+import pandas as pd
+
+from pso_common.cities import PAKISTAN_CITIES
+from pso_common.fuel_stations import LIVE_BACKEND, LOCAL_BACKEND, load_fuel_stations
+
+logger = logging.getLogger(__name__)
+
+# Overpass asks for no more than a couple of concurrent requests per client
+DEFAULT_WORKERS = 2
+DEFAULT_RATE = 1.0  # city fetches started per second, across all workers
+
+class RateLimiter:
+    """Thread-safe limiter spacing calls at least 1/rate seconds apart."""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until the caller may start its request."""
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next)
+            self._next = start + self.interval
+        if start > now:
+            time.sleep(start - now)
+
+def city_slug(city):
+    """File-name friendly city name."""
+    return re.sub(r"[^a-z0-9]+", "_", city.lower()).strip("_")
+
+def survey_city(city, radius_km, backend, limiter, checkpoint_dir):
+    """Fetch and parse one city, writing its checkpoint file."""
+    latitude, longitude = PAKISTAN_CITIES[city]
+    limiter.acquire()
+    start = time.perf_counter()
+    stations = load_fuel_stations(latitude, longitude, radius_km, backend)
+    elapsed = time.perf_counter() - start
+    result = {
+        "city": city,
+        "radius_km": radius_km,
+        "seconds": round(elapsed, 3),
+        "stations": [dict(s, city=city) for s in stations],
+    }
+    path = checkpoint_dir / f"{city_slug(city)}.json"
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps(result), encoding="utf-8")
+    tmp.replace(path)  # Atomic, so a killed run never leaves half a checkpoint
+    return result
+
+def load_checkpoints(checkpoint_dir, radius_km):
+    """Finished cities from earlier runs with the same radius."""
+    done = {}
+    for path in checkpoint_dir.glob("*.json"):
+        result = json.loads(path.read_text(encoding="utf-8"))
+        if result.get("radius_km") == radius_km:
+            done[result["city"]] = result
+    return done
+
+def consolidate(results, out_path):
+    """Write all stations (deduplicated across overlapping cities) and per-city timings."""
+    rows = [station for result in results for station in result["stations"]]
+    stations = pd.DataFrame(rows)
+    if not stations.empty:
+        stations["fuel_types"] = stations["fuel_types"].map(lambda types: ";".join(types or []))
+        # Neighbouring cities overlap; keep each station once, under its nearest city
+        stations = (stations.sort_values("distance")
+                    .drop_duplicates(subset=["lat", "lon"])
+                    .sort_values(["city", "distance"])
+                    .reset_index(drop=True))
+
+    timings = pd.DataFrame(
+        [(r["city"], r["seconds"], len(r["stations"])) for r in results],
+        columns=["city", "seconds", "stations"],
+    ).sort_values("city")
+
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    if out_path.suffix == ".parquet":
+        try:
+            stations.to_parquet(out_path, index=False)
+        except ImportError:
+            out_path = out_path.with_suffix(".csv")
+            logger.warning("pyarrow/fastparquet not installed, writing %s instead", out_path)
+            stations.to_csv(out_path, index=False)
+    else:
+        stations.to_csv(out_path, index=False)
+    timings_path = out_path.with_name(out_path.stem + "_timings.csv")
+    timings.to_csv(timings_path, index=False)
+    return out_path, timings_path, len(stations)
+
+def run_survey(cities, radius_km, out_path, checkpoint_dir, workers=DEFAULT_WORKERS,
+               rate=DEFAULT_RATE, backend=LIVE_BACKEND):
+    """Survey `cities`, resuming from checkpoints, and write the consolidated output."""
+    checkpoint_dir.mkdir(parents=True, exist_ok=True)
+    done = load_checkpoints(checkpoint_dir, radius_km)
+    pending = [city for city in cities if city not in done]
+    logger.info("%d cities already done, %d to survey", len(cities) - len(pending), len(pending))
+
+    limiter = RateLimiter(rate)
+    failures = {}
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            pool.submit(survey_city, city, radius_km, backend, limiter, checkpoint_dir): city
+            for city in pending
+        }
+        for future in as_completed(futures):
+            city = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:  # Keep going; the city is retried on the next run
+                failures[city] = str(e)
+                logger.error("%s failed: %s", city, e)
+                continue
+            done[city] = result
+            logger.info("%-18s %4d stations in %.1fs", city, len(result["stations"]), result["seconds"])
+
+    results = [done[city] for city in cities if city in done]
+    if not results:
+        logger.error("No city succeeded; nothing written")
+        return failures
+    out_path, timings_path, count = consolidate(results, out_path)
+    logger.info("Wrote %d stations to %s and timings to %s in %.1fs",
+                count, out_path, timings_path, time.perf_counter() - start)
+    return failures
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Survey fuel stations for every configured city")
+    parser.add_argument("--cities", nargs="+", default=list(PAKISTAN_CITIES),
+                        help="Subset of cities (default: all)")
+    parser.add_argument("--radius-km", type=float, default=10)
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+    parser.add_argument("--rate", type=float, default=DEFAULT_RATE,
+                        help="Max city fetches started per second")
+    parser.add_argument("--backend", choices=[LIVE_BACKEND, LOCAL_BACKEND], default=LIVE_BACKEND)
+    parser.add_argument("--out", type=Path, default=Path("survey") / "stations.parquet")
+    parser.add_argument("--checkpoints", type=Path, default=None,
+                        help="Checkpoint directory (default: <out dir>/checkpoints)")
+    args = parser.parse_args(argv)
+
+    unknown = [city for city in args.cities if city not in PAKISTAN_CITIES]
+    if unknown:
+        parser.error(f"Unknown cities: {', '.join(unknown)}")
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    failures = run_survey(
+        args.cities, args.radius_km, args.out,
+        args.checkpoints or args.out.parent / "checkpoints",
+        workers=args.workers, rate=args.rate, backend=args.backend,
+    )
+    if failures:
+        logger.error("%d cities failed (%s); rerun the same command to retry them",
+                     len(failures), ", ".join(sorted(failures)))
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
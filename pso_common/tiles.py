@@ -0,0 +1,211 @@
+"""Tile-based spatial fetch cache for Overpass bounding-box queries.
+
+The world is split into fixed lat/lon cells. Each cell's elements are cached on
+their own, so a bigger radius or a neighbouring city only downloads the cells
+that are not cached yet. Downloaded elements are written to a spooled file as
+they are parsed and read back one cell at a time, so memory follows the largest
+cell rather than the whole response.
+"""
+import json
+import math
+import os
+import tempfile
+from array import array
+
+from pso_common.overpass_cache import get_cache
+from pso_common.perf import Span
+from pso_common.revalidate import refresh_in_background
+
+# Cell size in degrees (~5.5 km north-south)
+TILE_DEG = 0.05
+
+# Downloaded cells larger than this in total are spooled to disk instead of memory
+SPOOL_MAX_BYTES = 1024 * 1024
+
+# -----------------------------
+# Tile geometry
+# -----------------------------
+
+def tile_for(lat, lon, tile_deg=TILE_DEG):
+    """Grid cell (row, col) containing a point."""
+    return (math.floor(lat / tile_deg), math.floor(lon / tile_deg))
+
+def tile_bbox(tile, tile_deg=TILE_DEG):
+    """(south, west, north, east) of a grid cell."""
+    row, col = tile
+    south, west = row * tile_deg, col * tile_deg
+    return (round(south, 6), round(west, 6), round(south + tile_deg, 6), round(west + tile_deg, 6))
+
+def tiles_for_bbox(south, west, north, east, tile_deg=TILE_DEG):
+    """All grid cells overlapping a bounding box."""
+    row0, col0 = tile_for(south, west, tile_deg)
+    row1, col1 = tile_for(north, east, tile_deg)
+    return [(row, col) for row in range(row0, row1 + 1) for col in range(col0, col1 + 1)]
+
+def merge_tiles(tiles, tile_deg=TILE_DEG):
+    """Merge cells into few bounding boxes: row runs, then identical runs stacked."""
+    runs_by_row = {}
+    for row, col in sorted(set(tiles)):
+        runs = runs_by_row.setdefault(row, [])
+        if runs and runs[-1][1] == col - 1:
+            runs[-1][1] = col
+        else:
+            runs.append([col, col])
+
+    rects = []   # [row0, row1, col0, col1]
+    active = {}  # column run -> rectangle still growing downwards
+    for row in sorted(runs_by_row):
+        next_active = {}
+        for col0, col1 in runs_by_row[row]:
+            rect = active.get((col0, col1))
+            if rect is not None and rect[1] == row - 1:
+                rect[1] = row
+            else:
+                rect = [row, row, col0, col1]
+                rects.append(rect)
+            next_active[(col0, col1)] = rect
+        active = next_active
+
+    bboxes = []
+    for row0, row1, col0, col1 in rects:
+        south, west, _, _ = tile_bbox((row0, col0), tile_deg)
+        _, _, north, east = tile_bbox((row1, col1), tile_deg)
+        bboxes.append((south, west, north, east))
+    return bboxes
+
+def element_coords(element):
+    """(lat, lon) of a node, or the center of a way/relation fetched with `out center` or `out geom`."""
+    if "lat" in element and "lon" in element:
+        return element["lat"], element["lon"]
+    center = element.get("center")
+    if center:
+        return center["lat"], center["lon"]
+    bounds = element.get("bounds")
+    if bounds:
+        return (bounds["minlat"] + bounds["maxlat"]) / 2, (bounds["minlon"] + bounds["maxlon"]) / 2
+    return None
+
+# -----------------------------
+# Tiled fetch
+# -----------------------------
+
+def tile_cache_key(layer, tile, tile_deg=TILE_DEG):
+    """Cache key for one layer's elements in one cell."""
+    return f"tile:{layer}:{tile_deg}:{tile[0]}:{tile[1]}"
+
+class TileSpool:
+    """Encoded elements of several cells appended to one spooled file, read back a cell at a time."""
+
+    def __init__(self, tiles, max_size=SPOOL_MAX_BYTES):
+        self.file = tempfile.SpooledTemporaryFile(max_size=max_size)
+        # Cell -> flat (offset, length) pairs of its elements in the file
+        self.segments = {tile: array("q") for tile in tiles}
+
+    def __contains__(self, tile):
+        return tile in self.segments
+
+    def add(self, tile, data):
+        """Append one encoded element to a cell."""
+        self.segments[tile].extend((self.file.tell(), len(data)))
+        self.file.write(data)
+
+    def payload(self, tile):
+        """A cell's elements as one encoded JSON array."""
+        segments = self.segments[tile]
+        parts = []
+        for i in range(0, len(segments), 2):
+            self.file.seek(segments[i])
+            parts.append(self.file.read(segments[i + 1]))
+        self.file.seek(0, os.SEEK_END)
+        return b"[" + b",".join(parts) + b"]"
+
+    def close(self):
+        self.file.close()
+
+def fetch_tiled(south, west, north, east, build_query, fetch, layer="fuel",
+                cache=None, tile_deg=TILE_DEG, on_stale=None):
+    """Iterate over all elements in a bbox, downloading only the cells not cached yet.
+
+    `build_query(bboxes)` turns a list of (south, west, north, east) boxes into
+    one Overpass query and `fetch(query)` returns (or yields) its elements. If `fetch`
+    raises and every missing cell has an expired cached copy, those copies are
+    served instead, `on_stale(age_seconds)` is called and the cells are
+    refreshed in the background; otherwise the error propagates.
+    """
+    cache = cache or get_cache()
+    tiles = tiles_for_bbox(south, west, north, east, tile_deg)
+
+    # Cells are held as their encoded JSON arrays and decoded one at a time while merging
+    tile_payloads = {}
+    missing = []
+    for tile in tiles:
+        cached = cache.get(tile_cache_key(layer, tile, tile_deg))
+        if cached is None:
+            missing.append(tile)
+        else:
+            tile_payloads[tile] = cached
+
+    def download():
+        """Spool the missing cells' elements as they are parsed, then cache each cell."""
+        spool = TileSpool(missing)
+        try:
+            for element in fetch(build_query(merge_tiles(missing, tile_deg))):
+                coords = element_coords(element)
+                if coords is None:
+                    continue
+                tile = tile_for(coords[0], coords[1], tile_deg)
+                if tile in spool:
+                    spool.add(tile, json.dumps(element, separators=(",", ":")).encode("utf-8"))
+            for tile in missing:
+                cache.put(tile_cache_key(layer, tile, tile_deg), spool.payload(tile), query_type=layer)
+        except BaseException:
+            spool.close()
+            raise
+        return spool
+
+    spool = None
+    if missing:
+        try:
+            spool = download()
+        except Exception:
+            stale = [cache.get_stale(tile_cache_key(layer, tile, tile_deg)) for tile in missing]
+            if any(entry is None for entry in stale):
+                raise
+            for tile, (payload, _) in zip(missing, stale):
+                tile_payloads[tile] = payload
+            if on_stale is not None:
+                on_stale(max(age for _, age in stale))
+            refresh_in_background(f"{layer}:{missing[0]}:{len(missing)}", lambda: download().close())
+
+    def load(tile):
+        return spool.payload(tile) if spool is not None and tile in spool else tile_payloads.get(tile)
+
+    def merged():
+        try:
+            yield from merge_tile_elements(tiles, load)
+        finally:
+            if spool is not None:
+                spool.close()
+
+    return merged()
+
+def merge_tile_elements(tiles, load):
+    """Yield the elements of each cell in turn; ways can be returned by several boxes so dedupe by OSM id.
+
+    `load(tile)` returns a cell's encoded JSON array (or None), and is called one cell at a time.
+    """
+    seen = set()
+    decode = Span("tiles.decode", bytes=0)
+    try:
+        for tile in tiles:
+            payload = load(tile)
+            with decode:
+                elements = json.loads(payload) if payload else ()
+            decode.add(bytes=len(payload or b""), elements=len(elements))
+            for element in elements:
+                key = (element.get("type"), element.get("id"))
+                if key not in seen:
+                    seen.add(key)
+                    yield element
+    finally:
+        decode.finish()
@@ -0,0 +1,309 @@
+"""Road-network traffic exposure per grid tile.
+
+OSM `highway` ways from a local extract are reduced once to two small grids:
+road-class-weighted road density (weighted km of road per km²) and distance to
+the nearest motorway/trunk/primary road. Both are stored in one compressed
+.npz, so a site's exposure score is an array lookup:
+
+    python -m pso_common.traffic import pakistan-latest.osm.pbf
+    python -m pso_common.traffic import lahore_roads.json     # Overpass `out geom` dump
+    python -m pso_common.traffic query 31.5204 74.3587
+
+The score is combined with a time-of-day curve to give a traffic level.
+"""
+import argparse
+import math
+import os
+import sys
+import time
+import xml.etree.ElementTree as ET
+from functools import lru_cache
+from pathlib import Path
+
+import numpy as np
+
+from pso_common.overpass_stream import iter_elements
+from pso_common.station_index import _open, _unit_vectors, _xml_tags
+
+try:
+    from scipy.spatial import cKDTree
+except ImportError:  # Distances fall back to a brute-force scan in blocks
+    cKDTree = None
+
+DEFAULT_TRAFFIC_PATH = os.environ.get(
+    "PSO_TRAFFIC_PATH",
+    str(Path.home() / ".cache" / "pso" / "traffic_index.npz"),
+)
+
+# Grid cell size in degrees (~1.1 km)
+TILE_DEG = 0.01
+
+KM_PER_DEG_LAT = 110.574
+KM_PER_DEG_LON = 111.320
+EARTH_RADIUS_KM = 6371.0088
+
+# Relative traffic carried per km of each road class; unlisted classes are ignored
+ROAD_WEIGHTS = {
+    "motorway": 5.0, "motorway_link": 2.5,
+    "trunk": 4.0, "trunk_link": 2.0,
+    "primary": 3.0, "primary_link": 1.5,
+    "secondary": 2.0, "secondary_link": 1.0,
+    "tertiary": 1.5, "tertiary_link": 0.75,
+    "unclassified": 0.5, "residential": 0.5, "living_street": 0.25, "service": 0.2,
+}
+MAJOR_ROADS = {"motorway", "trunk", "primary"}
+
+# Major roads are densified to a point every this many km for the distance search
+MAJOR_STEP_KM = 0.2
+# Distances are stored in 10 m units and capped
+MAX_MAJOR_KM = 100.0
+
+# Hourly demand relative to the rush-hour peak
+HOURLY_DEMAND = (
+    0.25, 0.2, 0.2, 0.2, 0.25, 0.35, 0.55,  # 00-06
+    1.0, 1.0, 1.0,                          # 07-09 morning rush
+    0.7, 0.7, 0.75, 0.75, 0.7, 0.7, 0.75,   # 10-16 business hours
+    1.0, 1.0, 1.0,                          # 17-19 evening rush
+    0.6, 0.5, 0.4, 0.3,                     # 20-23
+)
+
+# -----------------------------
+# Readers
+# -----------------------------
+
+def read_overpass_dump(path):
+    """Yield (highway, lats, lons) from a saved Overpass `out geom` response."""
+    with _open(path) as f:
+        for element in iter_elements(f):
+            highway = element.get("tags", {}).get("highway")
+            geometry = element.get("geometry")
+            if highway in ROAD_WEIGHTS and geometry and len(geometry) >= 2:
+                yield highway, [p["lat"] for p in geometry], [p["lon"] for p in geometry]
+
+def read_osm_xml(path):
+    """Yield (highway, lats, lons) from an OSM XML extract (two passes, like the station index)."""
+    ways = []
+    with _open(path) as f:
+        for _, elem in ET.iterparse(f, events=("end",)):
+            if elem.tag == "way":
+                highway = _xml_tags(elem).get("highway")
+                if highway in ROAD_WEIGHTS:
+                    ways.append((highway, [int(nd.get("ref")) for nd in elem.iter("nd")]))
+                elem.clear()
+            elif elem.tag in ("node", "relation"):
+                elem.clear()
+
+    wanted = {ref for _, refs in ways for ref in refs}
+    coords = {}
+    with _open(path) as f:
+        for _, elem in ET.iterparse(f, events=("end",)):
+            if elem.tag == "node":
+                node_id = int(elem.get("id"))
+                if node_id in wanted:
+                    coords[node_id] = (float(elem.get("lat")), float(elem.get("lon")))
+            elif elem.tag in ("way", "relation"):
+                break
+            elem.clear()
+
+    for highway, refs in ways:
+        points = [coords[ref] for ref in refs if ref in coords]
+        if len(points) >= 2:
+            yield highway, [p[0] for p in points], [p[1] for p in points]
+
+def read_osm_pbf(path):
+    """Yield (highway, lats, lons) from an OSM PBF extract (needs `osmium`)."""
+    import osmium
+
+    class RoadHandler(osmium.SimpleHandler):
+        def __init__(self):
+            super().__init__()
+            self.rows = []
+
+        def way(self, w):
+            highway = w.tags.get("highway")
+            if highway not in ROAD_WEIGHTS:
+                return
+            points = [(nd.lat, nd.lon) for nd in w.nodes if nd.location.valid()]
+            if len(points) >= 2:
+                self.rows.append((highway, [p[0] for p in points], [p[1] for p in points]))
+
+    handler = RoadHandler()
+    handler.apply_file(str(path), locations=True)
+    return handler.rows
+
+def read_source(path):
+    """Pick a reader from the file extension."""
+    name = str(path).lower()
+    if name.endswith(".pbf"):
+        return read_osm_pbf(path)
+    if name.endswith((".osm", ".osm.bz2", ".osm.gz", ".xml")):
+        return read_osm_xml(path)
+    return read_overpass_dump(path)
+
+# -----------------------------
+# Build
+# -----------------------------
+
+def _segments(ways):
+    """Concatenated segment midpoints, weighted lengths and densified major-road points."""
+    mid_lat, mid_lon, weighted = [], [], []
+    major_lat, major_lon = [], []
+    for highway, lats, lons in ways:
+        lat = np.asarray(lats, dtype=np.float64)
+        lon = np.asarray(lons, dtype=np.float64)
+        dy = np.diff(lat) * KM_PER_DEG_LAT
+        dx = np.diff(lon) * KM_PER_DEG_LON * np.cos(np.radians((lat[1:] + lat[:-1]) / 2))
+        length = np.hypot(dx, dy)
+        mid_lat.append((lat[1:] + lat[:-1]) / 2)
+        mid_lon.append((lon[1:] + lon[:-1]) / 2)
+        weighted.append(length * ROAD_WEIGHTS[highway])
+        if highway in MAJOR_ROADS:
+            # Interpolate along each segment so long straight roads still have nearby points
+            steps = np.maximum(np.ceil(length / MAJOR_STEP_KM).astype(np.int64), 1)
+            seg = np.repeat(np.arange(len(length)), steps)
+            frac = (np.arange(steps.sum()) - np.repeat(np.cumsum(steps) - steps, steps)) / steps[seg]
+            major_lat.append(lat[seg] + (lat[seg + 1] - lat[seg]) * frac)
+            major_lon.append(lon[seg] + (lon[seg + 1] - lon[seg]) * frac)
+
+    def cat(parts):
+        return np.concatenate(parts) if parts else np.empty(0)
+    return cat(mid_lat), cat(mid_lon), cat(weighted), cat(major_lat), cat(major_lon)
+
+def _nearest_km(points, targets):
+    """Great-circle km from each of `points` to the nearest of `targets` (unit vectors)."""
+    if len(targets) == 0:
+        return np.full(len(points), MAX_MAJOR_KM)
+    if cKDTree is not None:
+        chord, _ = cKDTree(targets).query(points, distance_upper_bound=2 * math.sin(MAX_MAJOR_KM / EARTH_RADIUS_KM / 2))
+    else:
+        chord = np.empty(len(points))
+        for start in range(0, len(points), 2048):
+            block = points[start:start + 2048]
+            chord[start:start + 2048] = np.sqrt(((block[:, None, :] - targets[None, :, :]) ** 2).sum(-1)).min(1)
+    chord = np.minimum(chord, 2.0)
+    return np.minimum(2 * EARTH_RADIUS_KM * np.arcsin(chord / 2), MAX_MAJOR_KM)
+
+def build_traffic_index(ways, out_path=DEFAULT_TRAFFIC_PATH, tile_deg=TILE_DEG):
+    """Reduce (highway, lats, lons) ways to per-tile density and major-road distance grids."""
+    mid_lat, mid_lon, weighted, major_lat, major_lon = _segments(ways)
+    if len(mid_lat) == 0:
+        raise ValueError("No highway ways found in the source")
+
+    south = math.floor(mid_lat.min() / tile_deg) * tile_deg
+    west = math.floor(mid_lon.min() / tile_deg) * tile_deg
+    rows = int((mid_lat.max() - south) // tile_deg) + 1
+    cols = int((mid_lon.max() - west) // tile_deg) + 1
+
+    row = ((mid_lat - south) // tile_deg).astype(np.int64)
+    col = ((mid_lon - west) // tile_deg).astype(np.int64)
+    road_km = np.bincount(row * cols + col, weights=weighted, minlength=rows * cols).reshape(rows, cols)
+    centre_lat = south + (np.arange(rows) + 0.5) * tile_deg
+    tile_km2 = (tile_deg * KM_PER_DEG_LAT) * (tile_deg * KM_PER_DEG_LON * np.cos(np.radians(centre_lat)))
+    density = (road_km / tile_km2[:, None]).astype(np.float32)
+
+    grid_lat = np.repeat(centre_lat, cols)
+    grid_lon = np.tile(west + (np.arange(cols) + 0.5) * tile_deg, rows)
+    major_km = _nearest_km(_unit_vectors(grid_lat, grid_lon), _unit_vectors(major_lat, major_lon))
+    major = np.round(major_km * 100).astype(np.uint16).reshape(rows, cols)  # 10 m units
+
+    # Density that counts as fully saturated: the 99th percentile of road-bearing tiles
+    reference = float(np.percentile(density[density > 0], 99))
+
+    Path(out_path).parent.mkdir(parents=True, exist_ok=True)
+    np.savez_compressed(
+        out_path, density=density, major=major,
+        meta=np.array([south, west, tile_deg, reference, time.time()]),
+    )
+    load_traffic_index.cache_clear()
+    return rows, cols
+
+# -----------------------------
+# Queries
+# -----------------------------
+
+def time_factor(hour):
+    """Relative demand for an hour of the day (1.0 at rush hour)."""
+    return HOURLY_DEMAND[int(hour) % 24]
+
+class TrafficIndex:
+    """Per-tile road exposure grids loaded into memory."""
+
+    def __init__(self, path=DEFAULT_TRAFFIC_PATH):
+        with np.load(path) as data:
+            self.density = data["density"]
+            self.major = data["major"]
+            self.south, self.west, self.tile_deg, self.reference, self.built = map(float, data["meta"])
+        self.rows, self.cols = self.density.shape
+
+    def exposure(self, latitude, longitude):
+        """{score 0-100, density, major_km} for a location; None outside the grid."""
+        row = int((latitude - self.south) // self.tile_deg)
+        col = int((longitude - self.west) // self.tile_deg)
+        if not (0 <= row < self.rows and 0 <= col < self.cols):
+            return None
+        # 3x3 neighbourhood so a site on a tile edge sees the roads next to it
+        window = self.density[max(row - 1, 0):row + 2, max(col - 1, 0):col + 2]
+        density = float(0.5 * self.density[row, col] + 0.5 * window.mean())
+        major_km = float(self.major[row, col]) / 100
+        density_score = min(density / self.reference, 1.0) if self.reference > 0 else 0.0
+        proximity_score = math.exp(-major_km / 1.0)
+        return {
+            "score": round(100 * (0.6 * density_score + 0.4 * proximity_score), 1),
+            "density": round(density, 2),
+            "major_km": round(major_km, 2),
+        }
+
+    def traffic_level(self, latitude, longitude, hour):
+        """(score, exposure) where score is exposure scaled by the time-of-day curve."""
+        exposure = self.exposure(latitude, longitude)
+        if exposure is None:
+            return None, None
+        return round(exposure["score"] * time_factor(hour), 1), exposure
+
+@lru_cache(maxsize=4)
+def load_traffic_index(path=DEFAULT_TRAFFIC_PATH):
+    """Load the traffic grids once per process."""
+    return TrafficIndex(path)
+
+def traffic_available(path=DEFAULT_TRAFFIC_PATH):
+    """True if a traffic index has been built."""
+    return Path(path).exists()
+
+# -----------------------------
+# Command line
+# -----------------------------
+
+def _import(args):
+    start = time.perf_counter()
+    rows, cols = build_traffic_index(read_source(args.source), args.index)
+    size = Path(args.index).stat().st_size
+    print(f"Built {rows}x{cols} traffic grid into {args.index} ({size / 1024:.0f} KB) "
+          f"in {time.perf_counter() - start:.1f}s")
+
+def _query(args):
+    index = load_traffic_index(args.index)
+    start = time.perf_counter()
+    score, exposure = index.traffic_level(args.lat, args.lon, args.hour)
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    print(f"score {score} at {args.hour}:00, exposure {exposure} ({elapsed_ms:.3f} ms)")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Road-network traffic exposure grid")
+    parser.add_argument("--index", default=DEFAULT_TRAFFIC_PATH, help="Index file (.npz)")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    build = commands.add_parser("import", help="Build the grid from an OSM extract or Overpass dump")
+    build.add_argument("source", help=".osm.pbf, .osm[.bz2|.gz] extract or .json Overpass `out geom` dump")
+    build.set_defaults(func=_import)
+
+    query = commands.add_parser("query", help="Time a location lookup")
+    query.add_argument("lat", type=float)
+    query.add_argument("lon", type=float)
+    query.add_argument("--hour", type=int, default=time.localtime().tm_hour)
+    query.set_defaults(func=_query)
+
+    args = parser.parse_args(argv)
+    args.func(args)
+
+if __name__ == "__main__":
+    sys.exit(main())
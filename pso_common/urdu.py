@@ -0,0 +1,81 @@
+"""Single-pass Urdu -> English translation of place and station names.
+
+The gazetteer (pso_common/data/urdu_gazetteer.tsv, or the file in
+PSO_URDU_GAZETTEER) is loaded into a character trie once per process. A name is
+then translated in one left-to-right pass, taking the longest entry that starts
+and ends on a word boundary, so lookup cost does not grow with the gazetteer.
+"""
+import os
+from functools import lru_cache
+from pathlib import Path
+
+DEFAULT_GAZETTEER_PATH = os.environ.get(
+    "PSO_URDU_GAZETTEER",
+    str(Path(__file__).resolve().parent / "data" / "urdu_gazetteer.tsv"),
+)
+
+_END = ""  # Trie key holding the translation of the path so far
+
+def load_gazetteer(path=DEFAULT_GAZETTEER_PATH):
+    """Read `urdu<TAB>english` lines, skipping blanks and # comments."""
+    entries = {}
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.rstrip("\n")
+            if not line.strip() or line.lstrip().startswith("#"):
+                continue
+            urdu, _, english = line.partition("\t")
+            if urdu.strip() and english.strip():
+                entries[urdu.strip()] = english.strip()
+    return entries
+
+def build_trie(entries):
+    """Nested-dict character trie of the gazetteer."""
+    root = {}
+    for urdu, english in entries.items():
+        node = root
+        for char in urdu:
+            node = node.setdefault(char, {})
+        node[_END] = english
+    return root
+
+class UrduTranslator:
+    """Longest-match trie translator with a bounded LRU of recent names."""
+
+    def __init__(self, entries, cache_size=4096):
+        self.trie = build_trie(entries)
+        self.size = len(entries)
+        self.translate = lru_cache(maxsize=cache_size)(self._translate)
+
+    def _translate(self, text):
+        out = []
+        i = 0
+        n = len(text)
+        while i < n:
+            match = None
+            if i == 0 or not text[i - 1].isalnum():
+                node = self.trie
+                j = i
+                while j < n and text[j] in node:
+                    node = node[text[j]]
+                    j += 1
+                    if _END in node and (j == n or not text[j].isalnum()):
+                        match = (j, node[_END])
+            if match:
+                i, english = match
+                out.append(english)
+            else:
+                out.append(text[i])
+                i += 1
+        return "".join(out)
+
+@lru_cache(maxsize=None)
+def get_translator(path=DEFAULT_GAZETTEER_PATH):
+    """Build the trie once per process."""
+    return UrduTranslator(load_gazetteer(path))
+
+def translate(text):
+    """Translate Urdu names/terms in `text` to English; other text is kept."""
+    if not text or not isinstance(text, str):
+        return text
+    return get_translator().translate(text)
@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# The apps import pso_common from the repository root the same way
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
@@ -0,0 +1,67 @@
+import pytest
+
+from pso_common.brands import BrandMatcher, brand_style, match_brand
+
+@pytest.mark.parametrize("name, brand", [
+    ("PSO Petrol Pump", "PSO"),
+    ("pakistan  state oil", "PSO"),
+    ("Shell Select", "Shell"),
+    ("Attock Petroleum", "Attock"),
+    ("APL Filling Station", "Attock"),
+    ("Hi Octane Lahore", "Hi-Octane"),
+])
+def test_aliases_match_case_and_spacing_insensitively(name, brand):
+    assert match_brand(name) == brand
+
+@pytest.mark.parametrize("name, brand", [
+    ("Al Madina Go Petroleum", "GO"),
+    ("GO", "GO"),
+    ("Go-Green Traders", "GO"),  # The old " go " substring check missed this
+    ("(GO) Motorway Services", "GO"),
+    ("Gojra Road Filling Station", "Generic Petrol Pump"),
+    ("Cargo Terminal", "Unknown"),
+    ("Maple Leaf Cement", "Unknown"),
+    ("Chapli Kebab House", "Unknown"),
+])
+def test_aliases_only_match_whole_words(name, brand):
+    assert match_brand(name) == brand
+
+def test_total_wins_over_parco():
+    assert match_brand("Total Parco Karachi") == "Total"
+    assert match_brand("Parco Total Service Station") == "Total"
+    assert match_brand("Parco Mid Country") == "Parco"
+
+def test_real_brand_wins_over_generic_terms():
+    assert match_brand("Shell Petrol Pump") == "Shell"
+    assert match_brand("Petrol Pump Shell") == "Shell"
+
+def test_generic_and_unknown_fallbacks():
+    assert match_brand("Bismillah Filling Station") == "Generic Petrol Pump"
+    assert match_brand("پیٹرول پمپ") == "Generic Petrol Pump"
+    assert match_brand("Bismillah Traders") == "Unknown"
+    assert match_brand("") == "Unknown"
+    assert match_brand(None) == "Unknown"
+
+@pytest.mark.parametrize("name, brand", [
+    ("پی ایس او پمپ", "PSO"),
+    ("شیل", "Shell"),
+    ("ٹوٹل پارکو", "Total"),
+    ("اٹک پیٹرولیم", "Attock"),
+])
+def test_urdu_aliases(name, brand):
+    assert match_brand(name) == brand
+
+def test_priority_follows_table_order():
+    table = {
+        "brands": [
+            {"name": "Parco", "aliases": ["parco"], "emoji": "", "color": "red"},
+            {"name": "Total", "aliases": ["total"], "emoji": "", "color": "blue"},
+        ],
+        "generic": {"name": "Generic", "aliases": ["petrol pump"]},
+        "unknown": {"name": "Unknown", "emoji": "", "color": "gray"},
+    }
+    assert BrandMatcher(table).match("Total Parco") == "Parco"
+
+def test_style_of_unmatched_brand_is_unknown_style():
+    assert brand_style("Maple Leaf Cement") == brand_style("")
+    assert brand_style("PSO") != brand_style("")
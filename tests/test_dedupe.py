@@ -0,0 +1,42 @@
+from pso_common.dedupe import merge_duplicates
+
+LAT, LON = 31.5, 74.3
+M_PER_DEG_LON = 111_320.0 * 0.8526  # At LAT
+
+def station(name, brand, east_m=0.0, **fields):
+    return dict({"name": name, "brand": brand, "lat": LAT, "lon": LON + east_m / M_PER_DEG_LON,
+                 "address": "N/A", "phone": "N/A", "fuel_types": []}, **fields)
+
+def test_node_and_way_of_one_station_merge():
+    node = station("PSO Model Town", "PSO", fuel_types=["Diesel"])
+    way = station("PSO Model Town", "PSO", east_m=20, address="Link Road", fuel_types=["Octane 95"])
+    merged = merge_duplicates([node, way])
+    assert len(merged) == 1
+    assert merged[0]["address"] == "Link Road"
+    assert sorted(merged[0]["fuel_types"]) == ["Diesel", "Octane 95"]
+
+def test_richer_record_wins():
+    poor = station("Shell", "Shell")
+    rich = station("Shell", "Shell", east_m=10, address="Mall Road", phone="042")
+    merged = merge_duplicates([poor, rich])
+    assert merged[0]["lon"] == rich["lon"]
+
+def test_different_brands_are_not_merged():
+    assert len(merge_duplicates([station("Fuel Stop", "PSO"), station("Fuel Stop", "Shell", east_m=5)])) == 2
+
+def test_unbranded_station_merges_with_branded():
+    assert len(merge_duplicates([station("Total Parco", "Total Parco"), station("", "", east_m=5)])) == 1
+
+def test_different_names_are_not_merged():
+    assert len(merge_duplicates([station("PSO Gulberg", "PSO"), station("PSO Johar", "PSO", east_m=5)])) == 2
+
+def test_stations_beyond_the_distance_are_kept():
+    assert len(merge_duplicates([station("PSO", "PSO"), station("PSO", "PSO", east_m=80)])) == 2
+
+def test_merge_chain_follows_the_winner_to_its_new_cell():
+    # The richer middle record moves the kept station 45 m east; the third is 45 m further
+    for offset in range(0, 50, 5):
+        records = [station("PSO", "PSO", east_m=offset),
+                   station("PSO", "PSO", east_m=offset + 45, address="Ferozepur Road", phone="042"),
+                   station("PSO", "PSO", east_m=offset + 90)]
+        assert len(merge_duplicates(records)) == 1
@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+import shapely
+
+from pso_common.land_use import landuse_areas, metres_per_degree, to_local_metres
+
+LAT, LON = 31.5, 74.3
+
+def square(landuse, east_m, north_m, size_m, id=1):
+    """Closed landuse way whose south-west corner is (east_m, north_m) from the centre."""
+    m_lon, m_lat = metres_per_degree(LAT)
+    corners = [(0, 0), (size_m, 0), (size_m, size_m), (0, size_m), (0, 0)]
+    return {
+        "type": "way", "id": id, "tags": {"landuse": landuse},
+        "geometry": [{"lat": LAT + (north_m + y) / m_lat, "lon": LON + (east_m + x) / m_lon}
+                     for x, y in corners],
+    }
+
+def test_polygon_inside_the_circle_counts_in_full():
+    areas = landuse_areas([square("residential", -100, -100, 200)], LAT, LON, 1000)
+    assert areas["residential"] == pytest.approx(40_000, rel=1e-3)
+
+def test_polygon_is_clipped_to_the_circle():
+    # Straddles the eastern edge of a 1 km circle: roughly half is inside
+    areas = landuse_areas([square("industrial", 900, -100, 200)], LAT, LON, 1000)
+    assert 15_000 < areas["industrial"] < 20_000
+
+def test_polygon_outside_the_circle_is_ignored():
+    assert landuse_areas([square("farmland", 2000, 2000, 200)], LAT, LON, 1000) == {}
+
+def test_classes_are_summed_and_ordered_by_area():
+    elements = [
+        square("commercial", 0, 0, 100, id=1),
+        square("residential", -300, -300, 200, id=2),
+        square("commercial", 200, 200, 100, id=3),
+    ]
+    areas = landuse_areas(elements, LAT, LON, 1000)
+    assert list(areas) == ["residential", "commercial"]
+    assert areas["commercial"] == pytest.approx(20_000, rel=1e-3)
+
+def test_unclosed_way_is_skipped():
+    way = square("retail", 0, 0, 100)
+    way["geometry"] = way["geometry"][:-1]
+    assert landuse_areas([way], LAT, LON, 1000) == {}
+
+# Two outer rings that cross; polygonize nests one as a hole crossing its shell
+CROSSING_RINGS = [
+    [(74.3680164, 31.4623495), (74.3671198, 31.4627293), (74.3661097, 31.4632496), (74.3659533, 31.463348),
+     (74.3654643, 31.4629421), (74.3652095, 31.4627401), (74.3645586, 31.4626355), (74.3646442, 31.4625218),
+     (74.3646956, 31.4624087), (74.3648068, 31.4605153), (74.3655117, 31.4603815), (74.3662452, 31.4598953),
+     (74.366334, 31.4604091), (74.3667682, 31.4601846), (74.3668773, 31.4602485), (74.3674281, 31.4603743),
+     (74.36749, 31.4603995), (74.3677295, 31.4607434), (74.3673493, 31.4611773), (74.3680164, 31.4623495)],
+    [(74.3680339, 31.4637143), (74.3685967, 31.4639342), (74.3669168, 31.4646086), (74.3607206, 31.4652578),
+     (74.3604834, 31.46387), (74.3606457, 31.463712), (74.3620372, 31.4597645), (74.3628795, 31.459184),
+     (74.3641261, 31.4600285), (74.3654913, 31.4593981), (74.3656635, 31.459951), (74.3674698, 31.4604191),
+     (74.3683139, 31.4607286), (74.3673283, 31.4615774), (74.368315, 31.4620957), (74.3680339, 31.4637143)],
+]
+
+def test_relation_with_crossing_outer_rings_is_their_union():
+    members = [{"type": "way", "role": "outer", "geometry": [{"lat": lat, "lon": lon} for lon, lat in ring]}
+               for ring in CROSSING_RINGS]
+    relation = {"type": "relation", "id": 9, "tags": {"landuse": "residential"}, "members": members}
+    union = shapely.union_all(shapely.make_valid(np.array([shapely.Polygon(r) for r in CROSSING_RINGS])))
+    expected = shapely.area(to_local_metres(np.array([union]), 31.462, 74.365))[0]
+    assert landuse_areas([relation], 31.462, 74.365, 1000)["residential"] == pytest.approx(expected, rel=1e-4)
@@ -0,0 +1,95 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+from pso_common.overpass_client import (
+    BREAKER_FAILURES,
+    CircuitOpenError,
+    OverpassClient,
+    QueryError,
+    RateLimitedError,
+)
+
+@pytest.fixture
+def mirror():
+    """Start local mirrors answering with a fixed status; yields a factory returning (url, hit counter)."""
+    servers = []
+
+    def start(status, body=b'{"elements": []}', headers=()):
+        hits = []
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                hits.append(status)
+                self.send_response(status)
+                for name, value in headers:
+                    self.send_header(name, value)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True).start()
+        servers.append(server)
+        return f"http://127.0.0.1:{server.server_port}/api/interpreter", hits
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+def client(*mirrors):
+    return OverpassClient(mirrors=mirrors, hedge_after=5, timeout=5)
+
+def test_bad_query_is_raised_without_failover(mirror):
+    bad, bad_hits = mirror(400, b"parse error: line 1")
+    good, good_hits = mirror(200)
+    c = client(bad, good)
+    for _ in range(BREAKER_FAILURES + 1):
+        with pytest.raises(QueryError, match="parse error"):
+            c.fetch("[out:json];garbage")
+    assert good_hits == []
+    stats = c.stats()["mirrors"][bad]
+    assert stats["failures"] == 0 and not stats["open"]
+    assert bad in c._ranked_mirrors()
+
+def test_rate_limited_mirror_is_skipped_for_retry_after(mirror):
+    limited, limited_hits = mirror(429, b"", headers=[("Retry-After", "120")])
+    good, good_hits = mirror(200)
+    c = client(limited, good)
+    assert c.fetch("q") == b'{"elements": []}'
+    assert c.fetch("q") == b'{"elements": []}'
+    assert len(limited_hits) == 1 and len(good_hits) == 2
+    stats = c.stats()["mirrors"][limited]
+    assert stats["failures"] == 0 and stats["open"]
+    assert c._ranked_mirrors() == [good]
+
+def test_every_mirror_rate_limited(mirror):
+    limited, _ = mirror(429, b"", headers=[("Retry-After", "Wed, 21 Oct 2099 07:28:00 GMT")])
+    c = client(limited)
+    with pytest.raises(RateLimitedError) as info:
+        c.fetch("q")
+    assert info.value.retry_after == 600
+    with pytest.raises(CircuitOpenError):
+        c.fetch("q")
+
+def test_server_errors_fail_over_and_open_the_breaker(mirror):
+    broken, broken_hits = mirror(504)
+    good, _ = mirror(200)
+    c = client(broken, good)
+    # Force the broken mirror to be tried first every time
+    for _ in range(BREAKER_FAILURES):
+        c._latency[broken], c._latency[good] = 0.0, 1.0
+        assert c.fetch("q") == b'{"elements": []}'
+    assert len(broken_hits) == BREAKER_FAILURES
+    assert c.stats()["mirrors"][broken]["open"]
+
+    with pytest.raises(requests.exceptions.HTTPError) as info:
+        client(broken).fetch("q")
+    assert not isinstance(info.value, QueryError)
@@ -0,0 +1,49 @@
+import io
+import json
+
+import pytest
+
+from pso_common import overpass_stream
+from pso_common.overpass_stream import StreamDecodeError, iter_elements
+
+ELEMENTS = [
+    {"type": "node", "id": 1, "lat": 31.5, "lon": 74.3, "tags": {"amenity": "fuel", "name": "PSO پ"}},
+    {"type": "way", "id": 2, "center": {"lat": 31.6, "lon": 74.4}, "tags": {"amenity": "fuel"}},
+]
+BODY = json.dumps({"version": 0.6, "osm3s": {"copyright": "x"}, "elements": ELEMENTS}).encode("utf-8")
+
+class ChunkedBody(io.RawIOBase):
+    """File object that hands out a few bytes per read, like a slow socket."""
+
+    def __init__(self, data, size=7):
+        self.data, self.size, self.pos = data, size, 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        chunk = self.data[self.pos:self.pos + min(self.size, len(buffer))]
+        buffer[:len(chunk)] = chunk
+        self.pos += len(chunk)
+        return len(chunk)
+
+@pytest.fixture(params=["ijson", "json"])
+def backend(request, monkeypatch):
+    if request.param == "json":
+        monkeypatch.setattr(overpass_stream, "ijson", None)
+    elif overpass_stream.ijson is None:
+        pytest.skip("ijson not installed")
+
+def test_whole_body(backend):
+    assert list(iter_elements(io.BytesIO(BODY))) == ELEMENTS
+
+def test_body_split_into_small_reads(backend):
+    # Chunk boundaries fall inside keys, numbers and multi-byte characters
+    assert list(iter_elements(ChunkedBody(BODY))) == ELEMENTS
+
+def test_truncated_body_raises(backend):
+    with pytest.raises(StreamDecodeError):
+        list(iter_elements(io.BytesIO(BODY[:len(BODY) // 2])))
+
+def test_response_without_elements(backend):
+    assert list(iter_elements(io.BytesIO(b'{"remark": "runtime error"}'))) == []
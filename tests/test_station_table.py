@@ -0,0 +1,43 @@
+import math
+
+from pso_common.station_table import StationTable
+
+def station(name, brand, distance, fuel_types=()):
+    return {"name": name, "brand": brand, "distance": distance, "lat": 31.5, "lon": 74.3,
+            "fuel_types": list(fuel_types), "address": "N/A"}
+
+TABLE = StationTable.from_records([
+    station("Zeta", "PSO", 3.0, ["Diesel", "Octane 95"]),
+    station("alpha", "Shell", None),
+    station("Beta", "PSO", 0.5, ["Diesel"]),
+    station("gamma", "Attock", 8.0, ["CNG"]),
+])
+
+def names(table):
+    return [s["name"] for s in table]
+
+def test_filter_by_brand():
+    assert names(TABLE.filter(brand="PSO")) == ["Zeta", "Beta"]
+    assert names(TABLE.filter(brand="Total")) == []
+
+def test_filter_by_distance_keeps_unknown_distances():
+    assert names(TABLE.filter(max_distance=3.0)) == ["Zeta", "alpha", "Beta"]
+
+def test_filter_requires_every_fuel_type():
+    assert names(TABLE.filter(fuel_types=["Diesel"])) == ["Zeta", "Beta"]
+    assert names(TABLE.filter(fuel_types=["Diesel", "Octane 95"])) == ["Zeta"]
+
+def test_filters_combine():
+    assert names(TABLE.filter(brand="PSO", max_distance=1, fuel_types=["Diesel"])) == ["Beta"]
+
+def test_sort_by_distance_puts_unknown_last():
+    table = TABLE.sort("distance")
+    assert names(table) == ["Beta", "Zeta", "gamma", "alpha"]
+    assert table.record(3)["distance"] is None and math.isnan(table.distance[3])
+
+def test_sort_by_text_ignores_case():
+    assert names(TABLE.sort("name")) == ["alpha", "Beta", "gamma", "Zeta"]
+    assert [s["brand"] for s in TABLE.sort("brand")] == ["Attock", "PSO", "PSO", "Shell"]
+
+def test_records_round_trip():
+    assert TABLE.filter(brand="Attock").to_records()[0]["fuel_types"] == ["CNG"]
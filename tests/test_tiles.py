@@ -0,0 +1,73 @@
+from pso_common.overpass_cache import OverpassCache
+from pso_common.tiles import (
+    TileSpool,
+    fetch_tiled,
+    merge_tile_elements,
+    merge_tiles,
+    tile_bbox,
+    tile_cache_key,
+    tile_for,
+    tiles_for_bbox,
+)
+
+def node(id, lat, lon):
+    return {"type": "node", "id": id, "lat": lat, "lon": lon}
+
+def test_tile_for_and_bbox_contain_the_point():
+    tile = tile_for(31.52, 74.33)
+    south, west, north, east = tile_bbox(tile)
+    assert south <= 31.52 < north and west <= 74.33 < east
+
+def test_tile_for_floors_negative_coordinates():
+    assert tile_for(-0.01, -0.01) == (-1, -1)
+
+def test_tile_cache_key_includes_layer_size_and_cell():
+    assert tile_cache_key("fuel", (630, 1487)) == "tile:fuel:0.05:630:1487"
+    assert tile_cache_key("landuse", (630, 1487)) != tile_cache_key("fuel", (630, 1487))
+
+def test_tiles_for_bbox_covers_every_overlapping_cell():
+    assert len(tiles_for_bbox(31.51, 74.31, 31.59, 74.39)) == 4
+
+def test_merge_tiles_joins_a_block_into_one_box():
+    assert merge_tiles([(0, 0), (0, 1), (1, 0), (1, 1)]) == [(0.0, 0.0, 0.1, 0.1)]
+
+def test_merge_tiles_keeps_an_l_shape_in_two_boxes():
+    assert len(merge_tiles([(0, 0), (0, 1), (1, 0)])) == 2
+
+def test_merge_tile_elements_dedupes_by_osm_id():
+    way = b'{"type":"way","id":7,"center":{"lat":0.01,"lon":0.01}}'
+    payloads = {
+        (0, 0): b'[{"type":"node","id":7,"lat":0.01,"lon":0.01},' + way + b"]",
+        (0, 1): b"[" + way + b"]",
+        (1, 0): None,
+    }
+    elements = list(merge_tile_elements([(0, 0), (0, 1), (1, 0)], payloads.get))
+    assert [(e["type"], e["id"]) for e in elements] == [("node", 7), ("way", 7)]
+
+def test_tile_spool_reads_each_cell_back_after_rolling_to_disk():
+    spool = TileSpool([(0, 0), (0, 1), (1, 1)], max_size=16)
+    for i in range(20):
+        spool.add((0, i % 2), b'{"id":%d}' % i)
+    assert spool.file._rolled
+    assert spool.payload((0, 1)) == b"[" + b",".join(b'{"id":%d}' % i for i in range(1, 20, 2)) + b"]"
+    assert spool.payload((1, 1)) == b"[]"
+    spool.close()
+
+def test_fetch_tiled_only_downloads_missing_cells(tmp_path):
+    cache = OverpassCache(tmp_path / "cache.sqlite")
+    queries = []
+
+    def fetch(query):
+        queries.append(query)
+        return [node(1, 0.01, 0.01), node(2, 0.01, 0.06)]
+
+    def build_query(bboxes):
+        return repr(bboxes)
+
+    first = list(fetch_tiled(0.001, 0.001, 0.049, 0.049, build_query, fetch, cache=cache))
+    assert [e["id"] for e in first] == [1]
+
+    second = list(fetch_tiled(0.001, 0.001, 0.049, 0.099, build_query, fetch, cache=cache))
+    assert [e["id"] for e in second] == [1, 2]
+    # The second call asked only for the new cell
+    assert queries[1] == repr([tile_bbox((0, 1))])
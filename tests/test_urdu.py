@@ -0,0 +1,46 @@
+from pso_common.urdu import UrduTranslator, get_translator, load_gazetteer, translate
+
+def test_translates_place_and_station_names():
+    assert translate("پی ایس او پیٹرول پمپ کراچی") == "PSO Petrol Pump Karachi"
+
+def test_longest_entry_wins():
+    translator = UrduTranslator({"اسلام": "Islam", "آباد": "Abad", "اسلام آباد": "Islamabad"})
+    assert translator.translate("اسلام آباد") == "Islamabad"
+    assert translator.translate("اسلام") == "Islam"
+
+def test_longest_match_falls_back_to_shorter_entry():
+    translator = UrduTranslator({"پیٹرول": "Petrol", "پیٹرول پمپ": "Petrol Pump"})
+    assert translator.translate("پیٹرول اسٹیشن") == "Petrol اسٹیشن"
+
+def test_entries_only_match_whole_words():
+    translator = UrduTranslator({"مال": "Mall"})
+    assert translator.translate("شمال") == "شمال"
+    assert translator.translate("مالی") == "مالی"
+    assert translator.translate("مال روڈ") == "Mall روڈ"
+    assert translator.translate("(مال)") == "(Mall)"
+
+def test_shipped_gazetteer_keeps_mall_out_of_north():
+    assert translate("شمال") == "North"
+    assert translate("مال") == "Mall"
+
+def test_other_text_is_kept():
+    assert translate("Shell کراچی 24/7") == "Shell Karachi 24/7"
+    assert translate("") == ""
+    assert translate(None) is None
+
+def test_load_gazetteer_skips_comments_blanks_and_bad_lines(tmp_path):
+    path = tmp_path / "gazetteer.tsv"
+    path.write_text(
+        "# urdu<TAB>english\n"
+        "\n"
+        "لاہور\tLahore\n"
+        "  ملتان \t Multan \n"
+        "no tab here\n"
+        "سکھر\t\n",
+        encoding="utf-8",
+    )
+    assert load_gazetteer(path) == {"لاہور": "Lahore", "ملتان": "Multan"}
+    assert get_translator(str(path)).translate("لاہور ملتان") == "Lahore Multan"
+
+def test_shipped_gazetteer_loads():
+    assert get_translator().size == len(load_gazetteer()) > 50